@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "accounts.User"
 
 MIDDLEWARE = [
+    'core.middlewares.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,3 +111,19 @@ LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Кэш. Кэши количеств строк и HTML-фрагментов сбрасываются версиями в нём, поэтому при нескольких воркерах
+# он должен быть общим (Redis/Memcached/DatabaseCache); с LocMem они выключены (core/shared_cache.py,
+# проверка — manage.py check --deploy).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SHARED_CACHE = None  # None — определить по BACKEND; True — процесс приложения один, LocMem тоже годится
+
+# Счётчик SQL / детектор N+1 на каждый запрос (core.middlewares.QueryBudgetMiddleware) — для staging
+QUERY_BUDGET_ENABLED = False
+QUERY_BUDGET_MAX_QUERIES = 50
+QUERY_BUDGET_N1_THRESHOLD = 5  # один и тот же SQL столько раз за запрос — N+1
+QUERY_BUDGET_LOG = BASE_DIR / 'logs' / 'query_budget.jsonl'
@@ -0,0 +1,55 @@
+# core/conditional.py
+"""
+Условные GET (ETag / Last-Modified) для AJAX-фрагментов: если данные не менялись,
+отвечаем 304 без выборки строк и рендера шаблона.
+
+Состояние данных — queryset_state(): max(updated_at) и число строк одним агрегатом
+(число ловит удаления, которые max(updated_at) не видит). Сверху — любые дополнительные части
+(версии справочников из core/fragments.py и т.п.). В ETag входят пользователь и CSRF-секрет:
+во фрагментах есть {% csrf_token %}, и чужой (или до перелогина) HTML отдавать нельзя.
+
+Ответ помечается "Cache-Control: private, no-cache" — браузер хранит его, но каждый раз
+переспрашивает сервер; fetch() шлёт If-None-Match сам и на 304 отдаёт сохранённое тело.
+"""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def queryset_state(qs, field="updated_at"):
+    """(последнее изменение, число строк) — одним агрегатным запросом, без ORDER BY."""
+    row = qs.order_by().aggregate(last=Max(field), count=Count("pk"))
+    return row["last"], row["count"]
+
+
+def make_etag(request, *parts) -> str:
+    user = getattr(request, "user", None)
+    scope = (getattr(user, "pk", None), request.META.get("CSRF_COOKIE"))
+    return quote_etag(hashlib.md5(repr((scope,) + parts).encode()).hexdigest())
+
+
+def conditional_response(request, state, render, *parts):
+    """
+    state — (last_modified, count) из queryset_state(); render() строит ответ только если
+    у клиента устаревшая копия. 304/412 — через штатную проверку Django (If-None-Match важнее
+    If-Modified-Since, поэтому удаления и смена справочников Last-Modified не «прячет»).
+    """
+    last, count = state
+    etag = make_etag(request, last, count, *parts)
+    last_ts = timegm(last.utctimetuple()) if last else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_ts)
+    if response is not None:
+        if response.status_code == 304:
+            response["ETag"] = etag
+        return response
+
+    response = render()
+    if request.method in ("GET", "HEAD") and response.status_code == 200:
+        response["ETag"] = etag
+        if last_ts:
+            response["Last-Modified"] = http_date(last_ts)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
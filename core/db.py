@@ -0,0 +1,31 @@
+# core/db.py
+from django.db import transaction
+
+
+def on_commit_once(key, fn, items=(), using=None):
+    """
+    Копит items в общий набор key и вызывает fn(набор) один раз после коммита текущей транзакции
+    (вне atomic — сразу). Повторные вызовы с тем же key внутри транзакции только дополняют набор.
+    """
+    conn = transaction.get_connection(using)
+    registry = conn.__dict__.setdefault("_on_commit_once", {})
+    entry = registry.get(key)
+    if entry is not None and _scheduled(conn, entry[1]):
+        entry[0].update(items)
+        return
+
+    # набора ещё нет, либо его колбэк ушёл вместе с откатом — начинаем заново
+    pending = set(items)
+
+    def flush():
+        if registry.get(key, (None, None))[1] is flush:
+            del registry[key]
+        fn(pending)
+
+    registry[key] = (pending, flush)
+    transaction.on_commit(flush, using=using)
+
+
+def _scheduled(conn, callback) -> bool:
+    # колбэки текущей транзакции; при откате (в т.ч. savepoint) Django сам выкидывает их из списка
+    return any(item[1] is callback for item in conn.run_on_commit)
@@ -1,6 +1,44 @@
 # core/filters.py
 import django_filters as df
-from django.db.models import Q, ForeignKey, OneToOneField
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ForeignKey, OneToOneField
+from django_select2.forms import ModelSelect2Widget
+
+from .search import SearchSelect2Mixin, search
+
+# по каким полям связанной модели искать в FK-фильтре (какие есть)
+FK_SEARCH_FIELDS = ("name", "title", "code", "vendor_code", "username")
+
+
+class FKFilterSelect2(SearchSelect2Mixin, ModelSelect2Widget):
+    """
+    FK-фильтр списка: рендерит только выбранное значение, варианты — AJAX через django_select2
+    (/select2/fields/auto.json) страницами по max_results.
+    """
+    max_results = 20
+
+
+def fk_filter_widget(related_model):
+    """Select2-виджет для FK-фильтра или None, если у модели нет полей для поиска."""
+    names = []
+    for name in FK_SEARCH_FIELDS:
+        try:
+            related_model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        names.append(name)
+    if not names:
+        return None
+    return FKFilterSelect2(
+        queryset=related_model.objects.order_by(names[0], "pk"),
+        search_fields=[f"{name}__icontains" for name in names],
+        attrs={
+            "data-minimum-input-length": 0,
+            "data-placeholder": "Все",
+            "data-allow-clear": "true",
+            "style": "min-width: 220px;",
+        },
+    )
 
 
 def make_filterset_class(
@@ -34,12 +72,7 @@ def make_filterset_class(
                     w.attrs.setdefault("class", "form-check-input")
 
         def filter_search(self, qs, name, value):
-            if not value:
-                return qs
-            q = Q()
-            for f in search_fields:
-                q |= Q(**{f"{f}__icontains": value})
-            return qs.filter(q)
+            return search(qs, search_fields, value)
 
     # PyCharm-friendly Meta
     AutoFilter.Meta = type("Meta", (), {"model": model, "fields": []})
@@ -49,12 +82,16 @@ def make_filterset_class(
         field = model._meta.get_field(fname)
         if isinstance(field, (ForeignKey, OneToOneField)):
             qs = field.remote_field.model.objects.all()
+            # варианты не грузим в <option>: select2 подтягивает их по мере ввода,
+            # а проверка значения — один get(pk=...) в ModelChoiceField
+            widget = fk_filter_widget(field.remote_field.model)
             # ВАЖНО: указать field_name=fname (иначе будет ошибка "Cannot resolve keyword 'None'")
             AutoFilter.base_filters[fname] = df.ModelChoiceFilter(
                 field_name=fname,
                 queryset=qs,
                 label=getattr(field, "verbose_name", None) or fname.capitalize(),
                 required=False,
+                **({"widget": widget} if widget else {}),
             )
 
     # Доп. фильтры (булевые и пр.)
@@ -0,0 +1,115 @@
+# core/fragments.py
+"""
+Кэш отрендеренных HTML-фрагментов (таблицы справочников, модалки варианта) с версиями
+вместо явного удаления: ключ = имя фрагмента + версии данных, из которых он собран.
+
+- версия модели — та же, что у кэша количеств строк (core.pagination.count_version):
+  растёт после коммита любого save/delete строки модели (core/signals.py);
+- версия объекта — object_version(model, pk), для фрагментов «одного объекта» (строки варианта).
+  Растёт через touch_objects(): из сигналов дочерних строк и вручную после bulk_create/update().
+
+Устаревшие записи никто не удаляет — их ключи просто больше не строятся, запись истекает по таймауту.
+Версии живут в кэше, поэтому кэш фрагментов работает только с общим для воркеров кэшем
+(core/shared_cache.py); с LocMem фрагмент рендерится каждый раз.
+CSRF-токен в кэш не попадает: фрагмент рендерится с заглушкой, токен подставляется при отдаче.
+Статистика попаданий/промахов — fragment_stats() и manage.py fragment_cache_stats.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .db import on_commit_once
+from .pagination import count_version as model_version
+from .shared_cache import bump_versions, cache_is_shared, get_version
+
+FRAGMENT_TIMEOUT = 600  # сек
+CSRF_PLACEHOLDER = "__fragment_csrf_token__"
+
+_STATS_NAMES_KEY = "fragstats:names"
+
+
+# ---------------------- Версии объектов ----------------------
+
+def _object_key(model, pk):
+    return f"fragver:{model._meta.concrete_model._meta.label_lower}:{pk}"
+
+
+def object_version(model, pk):
+    return get_version(_object_key(model, pk))
+
+
+def touch_objects(model, pks, using=None):
+    """
+    Новая версия объектов — после коммита, одним проходом на транзакцию (вне atomic — сразу).
+    Сигналы save/delete строк варианта вызывают это сами; bulk-пути — вручную.
+    """
+    keys = {_object_key(model, pk) for pk in pks if pk}
+    if not keys:
+        return
+    on_commit_once("core.fragment_versions", bump_versions, keys, using=using)
+
+
+# ---------------------- Фрагменты ----------------------
+
+def _count(name, outcome):
+    key = f"fragstats:{name}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+    if outcome == "misses":  # имя фрагмента — в общий список (промах и так дорогой)
+        names = cache.get(_STATS_NAMES_KEY) or set()
+        if name not in names:
+            cache.set(_STATS_NAMES_KEY, names | {name}, timeout=None)
+
+
+def cached_fragment(name, parts, render, timeout=FRAGMENT_TIMEOUT) -> str:
+    """
+    HTML фрагмента name для ключа parts (версии, язык, querystring…) — из кэша или render().
+    Исключение из render() (напр. Http404) ничего не кэширует. Без общего кэша — всегда render().
+    """
+    if not cache_is_shared():
+        return render()
+    digest = hashlib.md5(repr(tuple(parts)).encode()).hexdigest()
+    key = f"fragment:{name}:{digest}"
+    html = cache.get(key)
+    if html is not None:
+        _count(name, "hits")
+        return html
+    _count(name, "misses")
+    html = render()
+    cache.set(key, html, timeout)
+    return html
+
+
+def render_cached(request, name, parts, template_name, get_context, timeout=FRAGMENT_TIMEOUT):
+    """
+    HttpResponse с фрагментом template_name; get_context() вызывается только при промахе.
+    Шаблон рендерится без request (контекст-процессоры не участвуют), {% csrf_token %} —
+    заглушка, которая заменяется токеном текущего пользователя.
+    """
+    def render():
+        return render_to_string(template_name, {**get_context(), "csrf_token": CSRF_PLACEHOLDER})
+
+    html = cached_fragment(name, parts, render, timeout)
+    return HttpResponse(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def fragment_stats() -> dict:
+    """{имя: {"hits": n, "misses": n, "ratio": доля попаданий}} по всем фрагментам."""
+    stats = {}
+    for name in sorted(cache.get(_STATS_NAMES_KEY) or ()):
+        hits = cache.get(f"fragstats:{name}:hits") or 0
+        misses = cache.get(f"fragstats:{name}:misses") or 0
+        total = hits + misses
+        stats[name] = {"hits": hits, "misses": misses, "ratio": round(hits / total, 3) if total else 0.0}
+    return stats
+
+
+def reset_fragment_stats():
+    for name in cache.get(_STATS_NAMES_KEY) or ():
+        cache.delete_many([f"fragstats:{name}:hits", f"fragstats:{name}:misses"])
+    cache.delete(_STATS_NAMES_KEY)
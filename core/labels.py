@@ -0,0 +1,118 @@
+# core/labels.py
+"""
+Подписи значений Choice/ModelChoice-полей для шаблонов (фильтр choice_label).
+
+ModelChoice: объекты ищутся не get() на каждое значение, а пачкой через in_bulk() по всем
+значениям, заявленным заранее (prime_choice_labels — напр. по всем формам formset'а), и
+кэшируются на время запроса (core.middlewares.get_request_cache). Ключ — SQL queryset'а поля
++ to_field_name, так что ограничения queryset'а соблюдаются, как и раньше.
+Обычные choices — словарь значение → подпись, один раз на поле.
+"""
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.forms import ModelChoiceField
+
+from .middlewares import get_request_cache
+
+_CACHE_KEY = "choice_labels"
+
+
+class LabelResolver:
+    def __init__(self):
+        self.objects = {}  # ключ queryset'а → {значение-строка: объект | None}
+        self.pending = {}  # ключ queryset'а → значения, которые попросили заранее
+
+    @staticmethod
+    def _key(queryset, to_field):
+        try:
+            sql = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            sql = None
+        return queryset.model._meta.label_lower, to_field, repr(sql)
+
+    def want(self, queryset, to_field, values):
+        key = self._key(queryset, to_field)
+        known = self.objects.get(key, {})
+        self.pending.setdefault(key, set()).update(
+            str(v) for v in values if v not in (None, "") and str(v) not in known
+        )
+
+    def get(self, queryset, to_field, value):
+        key = self._key(queryset, to_field)
+        known = self.objects.setdefault(key, {})
+        if value not in known:
+            wanted = (self.pending.pop(key, set()) | {value}) - known.keys()
+            known.update(self._fetch(queryset, to_field, wanted))
+        return known[value]
+
+    @staticmethod
+    def _fetch(queryset, to_field, values):
+        field = queryset.model._meta.get_field(to_field) if to_field else queryset.model._meta.pk
+        ids = {}
+        for value in values:
+            try:
+                ids[value] = field.to_python(value)
+            except ValidationError:
+                pass
+        found = {}
+        if ids:
+            if queryset.query.is_sliced:  # in_bulk() не работает со срезом
+                name = field.attname
+                found = {getattr(o, name): o for o in queryset.filter(**{f"{name}__in": ids.values()})}
+            else:
+                found = queryset.in_bulk(ids.values(), field_name=to_field or "pk")
+        return {value: found.get(ids[value]) if value in ids else None for value in values}
+
+
+def get_resolver() -> LabelResolver:
+    """Резолвер текущего запроса; вне запроса — новый (без кэша между вызовами)."""
+    cache = get_request_cache()
+    if cache is None:
+        return LabelResolver()
+    resolver = cache.get(_CACHE_KEY)
+    if resolver is None:
+        resolver = cache[_CACHE_KEY] = LabelResolver()
+    return resolver
+
+
+def _is_model_choice(field):
+    return isinstance(field, ModelChoiceField) or getattr(field, "queryset", None) is not None
+
+
+def prime_choice_labels(forms, *names):
+    """Заявить значения полей names во всех forms (formset) — потом они подтянутся одним in_bulk на модель."""
+    resolver = get_resolver()
+    for form in forms:
+        for name in names:
+            if name not in form.fields:
+                continue
+            bf = form[name]
+            field = bf.field
+            if not _is_model_choice(field):
+                continue
+            value = bf.value()
+            values = value if isinstance(value, (list, tuple)) else [value]
+            resolver.want(field.queryset, getattr(field, "to_field_name", None), values)
+    return resolver
+
+
+def choice_label(field, value: str):
+    """Подпись для значения value (строка) или None, если такого значения нет."""
+    if _is_model_choice(field):
+        if value == "":
+            return getattr(field, "empty_label", None)
+        obj = get_resolver().get(field.queryset, getattr(field, "to_field_name", None), value)
+        if obj is None:
+            return None
+        label_from_instance = getattr(field, "label_from_instance", str)
+        return label_from_instance(obj)
+
+    labels = field.__dict__.get("_choice_labels")
+    if labels is None:
+        labels = {}
+        for v, label in getattr(field, "choices", []):
+            if isinstance(label, (list, tuple)):  # группа: (название, [(v, label), ...])
+                labels.update((str(sv), sl) for sv, sl in label)
+            else:
+                labels[str(v)] = label
+        field.__dict__["_choice_labels"] = labels
+    return labels.get(value)
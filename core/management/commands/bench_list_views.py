@@ -0,0 +1,69 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from core import views as core_views
+
+DEFAULT_LISTS = ("info:materials-list", "info:colors-list", "sewing:orders-list")
+
+
+class Command(BaseCommand):
+    help = ("Замер списков BaseModelListView: сборка классов таблицы/фильтра на каждый запрос "
+            "(пустой реестр) против реестра сгенерированных классов.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="*", default=DEFAULT_LISTS, help="Имена URL списков")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(is_superuser=True).first() or AnonymousUser()
+        factory = RequestFactory()
+        registry = core_views._generated_classes
+        n = options["repeat"]
+
+        for name in options["urls"]:
+            path = reverse(name)
+            match = resolve(path)
+
+            def request():
+                req = factory.get(path)
+                req.user = user
+                match.func(req, *match.args, **match.kwargs).render()
+
+            view = match.func.view_class()
+            view.setup(factory.get(path))
+
+            def classes():
+                view.get_table_class()
+                view.get_filterset_class()
+
+            request()  # прогрев: шаблоны, кэш количества
+            # сколько классов собирается за запрос без реестра и сколько запросов к БД у страницы
+            registry.clear()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            builds = len(registry)
+
+            build_ms = self._ms(lambda: (registry.clear(), classes()), n)
+            lookup_ms = self._ms(classes, n)
+            cold_ms = self._ms(lambda: (registry.clear(), request()), n)
+            warm_ms = self._ms(request, n)
+
+            self.stdout.write(
+                f"{name:<22} сборок за запрос: {builds}, запросов к БД: {len(queries)}; "
+                f"классы: {build_ms:6.3f} мс → из реестра {lookup_ms:6.3f} мс; "
+                f"запрос целиком: {cold_ms:7.2f} мс → {warm_ms:7.2f} мс ({warm_ms - cold_ms:+.2f} мс)"
+            )
+
+    @staticmethod
+    def _ms(fn, n):
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - started) * 1000 / n
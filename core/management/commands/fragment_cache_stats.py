@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.fragments import fragment_stats, reset_fragment_stats
+from core.shared_cache import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = "Попадания/промахи кэша HTML-фрагментов (списки-справочники, модалки варианта)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счётчики после вывода")
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stdout.write("Кэш фрагментов выключен: кэш локальный для процесса (см. manage.py check --deploy).")
+        stats = fragment_stats()
+        if not stats:
+            self.stdout.write("Статистики нет (кэш пуст или фрагменты ещё не запрашивались).")
+        else:
+            self.stdout.write(f"{'фрагмент':40} {'попаданий':>10} {'промахов':>10} {'доля':>6}")
+            for name, row in stats.items():
+                self.stdout.write(f"{name[:40]:40} {row['hits']:>10} {row['misses']:>10} {row['ratio']:>6.0%}")
+        if options["reset"]:
+            reset_fragment_stats()
+            self.stdout.write("Счётчики обнулены.")
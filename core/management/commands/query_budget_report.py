@@ -0,0 +1,70 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0
+
+
+class Command(BaseCommand):
+    help = ("Сводка лога QueryBudgetMiddleware по view: запросы, SQL/время, N+1 — "
+            "чтобы видеть, какие списки и модалки деградируют.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=None, help="Путь к логу (по умолчанию QUERY_BUDGET_LOG)")
+        parser.add_argument("--top", type=int, default=10, help="Сколько N+1 шаблонов показать")
+        parser.add_argument("--view", default=None, help="Только этот view_name")
+
+    def handle(self, *args, **options):
+        path = Path(options["log"] or getattr(settings, "QUERY_BUDGET_LOG", "") or "")
+        if not path.is_file():
+            raise CommandError(f"Лог не найден: {path}")
+
+        views = defaultdict(list)
+        n1 = defaultdict(lambda: {"requests": 0, "max": 0, "views": set(), "where": None})
+        with path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                name = entry.get("view") or entry.get("path")
+                if options["view"] and name != options["view"]:
+                    continue
+                views[name].append(entry)
+                for item in entry.get("n_plus_one") or ():
+                    agg = n1[item["sql"]]
+                    agg["requests"] += 1
+                    agg["max"] = max(agg["max"], item["count"])
+                    agg["views"].add(name)
+                    agg["where"] = agg["where"] or item.get("where")
+
+        if not views:
+            self.stdout.write("Записей нет.")
+            return
+
+        self.stdout.write(f"{'view':40} {'запр.':>6} {'SQL ср.':>8} {'SQL max':>8} {'БД мс':>8} "
+                          f"{'p95 мс':>8} {'дубли':>6} {'N+1':>5}")
+        rows = sorted(views.items(), key=lambda kv: -sum(e["queries"] for e in kv[1]) / len(kv[1]))
+        for name, entries in rows:
+            n = len(entries)
+            self.stdout.write(
+                f"{name[:40]:40} {n:>6} {sum(e['queries'] for e in entries) / n:>8.1f} "
+                f"{max(e['queries'] for e in entries):>8} {sum(e['db_ms'] for e in entries) / n:>8.1f} "
+                f"{_p95([e['total_ms'] for e in entries]):>8.1f} "
+                f"{sum(e.get('duplicates', 0) for e in entries) / n:>6.1f} "
+                f"{sum(1 for e in entries if e.get('n_plus_one')):>5}"
+            )
+
+        if n1:
+            self.stdout.write("\nПовторяющиеся запросы (N+1):")
+            top = sorted(n1.items(), key=lambda kv: (-kv[1]["requests"], -kv[1]["max"]))[:options["top"]]
+            for sql, agg in top:
+                self.stdout.write(f"- {agg['requests']} запр., до {agg['max']} раз за запрос; "
+                                  f"{agg['where'] or '?'}; {', '.join(sorted(agg['views']))}")
+                self.stdout.write(f"  {sql}")
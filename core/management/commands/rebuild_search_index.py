@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.search import fts_table, rebuild_fts, registered_models
+
+
+class Command(BaseCommand):
+    help = ("Пересоздаёт поисковые FTS5-таблицы (SQLite) по моделям из core.search.register() — "
+            "после bulk_create/update() индексируемых полей или изменения набора полей.")
+
+    def handle(self, *args, **options):
+        for model in registered_models():
+            rows = rebuild_fts(model)
+            if rows is None:
+                self.stdout.write(f"{model._meta.label}: не SQLite, пропущено.")
+            else:
+                self.stdout.write(f"{fts_table(model)}: {rows} строк.")
+        self.stdout.write(self.style.SUCCESS("Готово!"))
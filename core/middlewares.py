@@ -1,19 +1,162 @@
+import json
+import logging
+import re
 import threading
+import time
+import traceback
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 
 _thread_locals = threading.local()
 
+logger = logging.getLogger("core.querybudget")
+
 
 def get_current_user():
     return getattr(_thread_locals, "user", None)
 
 
+def get_request_cache():
+    """dict на время текущего запроса (None вне запроса) — для мемоизации в шаблонных фильтрах и т.п."""
+    return getattr(_thread_locals, "cache", None)
+
+
 class CurrentUserMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         _thread_locals.user = getattr(request, "user", None)
+        _thread_locals.cache = {}
         try:
             return self.get_response(request)
         finally:
             _thread_locals.user = None
+            _thread_locals.cache = None
+
+
+# ---------------------- Бюджет запросов / N+1 ----------------------
+
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_log_lock = threading.Lock()
+
+
+def fingerprint(sql: str) -> str:
+    """SQL без параметров; IN (%s, %s, …) любой длины — одно и то же."""
+    return _IN_LIST.sub("(%s…)", " ".join(sql.split()))
+
+
+def _app_frame():
+    """Первое место в коде проекта (не Django, не этот модуль), откуда пошёл запрос."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        name = frame.filename
+        if name.startswith(base) and "site-packages" not in name and not name.endswith("middlewares.py"):
+            return f"{Path(name).relative_to(base)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class QueryCollector:
+    """execute_wrapper: считает запросы, время SQL и повторы одного и того же SQL (N+1)."""
+
+    def __init__(self, n1_threshold):
+        self.n1_threshold = n1_threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = {}  # fingerprint → сколько раз
+        self.exact = {}  # (sql, params) → сколько раз — полные дубли
+        self.origins = {}  # fingerprint → откуда (стек снимаем один раз, на пороге)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            key = fingerprint(sql)
+            seen = self.fingerprints[key] = self.fingerprints.get(key, 0) + 1
+            if seen == self.n1_threshold:
+                self.origins[key] = _app_frame()
+            exact = (sql, repr(params))
+            self.exact[exact] = self.exact.get(exact, 0) + 1
+
+    @property
+    def duplicates(self) -> int:
+        return sum(n - 1 for n in self.exact.values() if n > 1)
+
+    def n_plus_one(self):
+        return sorted(
+            ({"sql": sql[:300], "count": n, "where": self.origins.get(sql)}
+             for sql, n in self.fingerprints.items() if n >= self.n1_threshold),
+            key=lambda item: -item["count"],
+        )
+
+
+class QueryBudgetMiddleware:
+    """
+    Для staging: на каждый запрос — число SQL, их время, полные дубли и повторяющиеся шаблоны
+    (N+1, напр. str(variant) по строкам таблицы). Пишет заголовок Server-Timing, строку JSON в
+    QUERY_BUDGET_LOG (сводка — manage.py query_budget_report) и warning в лог core.querybudget
+    при превышении QUERY_BUDGET_MAX_QUERIES или найденном N+1. Выключен, пока QUERY_BUDGET_ENABLED=False.
+    Для потоковых ответов учитывается только работа до начала отдачи.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = getattr(settings, "QUERY_BUDGET_MAX_QUERIES", 50)
+        self.n1_threshold = getattr(settings, "QUERY_BUDGET_N1_THRESHOLD", 5)
+        self.log_path = getattr(settings, "QUERY_BUDGET_LOG", None)
+
+    def __call__(self, request):
+        collector = QueryCollector(self.n1_threshold)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(collector))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        n_plus_one = collector.n_plus_one()
+        db_ms, total_ms = collector.seconds * 1000, total * 1000
+        timing = (f'db;dur={db_ms:.1f};desc="{collector.count} SQL", '
+                  f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}')
+        if n_plus_one:
+            timing += f', n1;desc="{len(n_plus_one)} N+1"'
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        match = getattr(request, "resolver_match", None)
+        entry = {
+            "ts": round(time.time(), 3),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": collector.count,
+            "db_ms": round(db_ms, 1),
+            "total_ms": round(total_ms, 1),
+            "duplicates": collector.duplicates,
+            "n_plus_one": n_plus_one,
+        }
+        if collector.count > self.max_queries or n_plus_one:
+            logger.warning("%s %s: %s SQL (%.1f мс), N+1: %s", request.method, request.path,
+                           collector.count, db_ms, [(i["count"], i["where"]) for i in n_plus_one])
+        self._write(entry)
+        return response
+
+    def _write(self, entry):
+        if not self.log_path:
+            return
+        path = Path(self.log_path)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with _log_lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as fh:
+                fh.write(line)
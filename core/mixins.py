@@ -1,11 +1,11 @@
 from base64 import b64encode
 
 from django.db import models
-from django.db.models import Q
 from django.db.models.constants import LOOKUP_SEP
 from django.http import HttpResponse
 
 from .middlewares import get_current_user
+from .search import search
 
 
 class AuditUserSaveMixin(models.Model):
@@ -52,13 +52,8 @@ class SearchOrderingMixin:
     default_ordering = None  # напр.: ("-created_at",) или "title"
 
     def apply_search(self, qs):
-        term = self.request.GET.get("search")
-        if term and self.search_fields:
-            q = Q()
-            for field in self.search_fields:
-                q |= Q(**{f"{field}__icontains": term})
-            qs = qs.filter(q)
-        return qs
+        # без ?o= результаты идут по релевантности (если apply_ordering не задаст default_ordering)
+        return search(qs, self.search_fields, self.request.GET.get("search"), rank=True)
 
     def apply_ordering(self, qs):
         param = self.request.GET.get("o") or self.request.GET.get("ordering")
@@ -0,0 +1,296 @@
+# core/pagination.py
+"""
+Пагинаторы для таблиц django-tables2.
+
+CachedCountPaginator — обычные номера страниц, но COUNT(*) кэшируется по (модель, SQL фильтра)
+на короткое время; кэш сбрасывается при изменении строк модели (версия в кэше, см. core/signals.py).
+Только с общим для воркеров кэшем (core/shared_cache.py), иначе COUNT(*) считается каждый раз.
+Для больших таблиц без фильтров количество берётся из статистики СУБД (оценка).
+
+KeysetPaginator — keyset (seek) пагинация: вместо OFFSET + COUNT(*) страница выбирается условием
+«после ключа последней строки» по текущей сортировке таблицы (+ id как тай-брейк).
+Стоимость страницы не зависит от её «номера», общего количества нет.
+Курсор — base64 от JSON {"o": сортировка, "k": ключ строки, "d": направление}. Если сортировка
+поменялась (клик по заголовку) или курсор битый — показываем первую страницу.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from django.db.models.fields.related import RelatedField
+from django.utils.functional import cached_property
+from django_tables2.rows import BoundRows
+
+from .db import on_commit_once
+from .shared_cache import bump_versions, cache_is_shared, get_version
+
+CURSOR_PARAM = "cursor"
+
+COUNT_CACHE_TIMEOUT = 60  # сек
+ESTIMATE_MIN_ROWS = 100_000  # меньше — считаем точно
+
+
+# ---------------------- Кэш количества строк ----------------------
+
+def _version_key(model):
+    return f"listcount:v:{model._meta.label_lower}"
+
+
+def count_version(model):
+    return get_version(_version_key(model))
+
+
+def invalidate_counts(model, using=None):
+    """
+    Сбрасывает закэшированные количества по модели — после коммита, по разу на модель за транзакцию
+    (вне atomic — сразу). Сигналы save/delete вызывают это сами; после bulk_create/update() — вручную.
+    """
+    on_commit_once("core.count_versions", _bump_versions, {model._meta.concrete_model}, using=using)
+
+
+def _bump_versions(models):
+    bump_versions(_version_key(model) for model in models)
+
+
+def estimated_count(model, using="default"):
+    """Оценка числа строк из статистики СУБД (PostgreSQL: pg_class.reltuples) или None."""
+    conn = connections[using]
+    if conn.vendor != "postgresql":
+        return None
+    with conn.cursor() as cur:
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cur.fetchone()
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator с кэшированным count. Ключ — модель + версия модели + хэш SQL запроса без сортировки,
+    то есть ровно текущие поиск и фильтры. estimated=True — количество приблизительное.
+    """
+
+    def __init__(self, object_list, per_page, cache_timeout=COUNT_CACHE_TIMEOUT,
+                 estimate_min_rows=ESTIMATE_MIN_ROWS, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_timeout = cache_timeout
+        self.estimate_min_rows = estimate_min_rows
+        self.estimated = False
+
+    def _queryset(self):
+        data = getattr(self.object_list, "data", None)  # BoundRows → TableQuerysetData → QuerySet
+        qs = getattr(data, "data", None)
+        return qs if hasattr(qs, "query") else None
+
+    @cached_property
+    def count(self):
+        qs = self._queryset()
+        if qs is None:
+            return super().count
+
+        if not qs.query.where and self.estimate_min_rows:
+            estimate = estimated_count(qs.model, qs.db)
+            if estimate and estimate >= self.estimate_min_rows:
+                self.estimated = True
+                return estimate
+
+        if not cache_is_shared():
+            return super().count
+
+        try:
+            sql, params = qs.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        digest = hashlib.md5(repr((sql, params)).encode()).hexdigest()
+        key = f"listcount:{qs.model._meta.label_lower}:{count_version(qs.model)}:{digest}"
+        value = cache.get(key)
+        if value is None:
+            value = qs.count()
+            cache.set(key, value, self.cache_timeout)
+        return value
+
+
+# ---------------------- Keyset ----------------------
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """dict или None, если курсор пустой/битый."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _resolve(model, path):
+    """Поле для пути вида "group__name": (путь для ORM, может ли быть NULL). FK в конце → его *_id."""
+    parts = path.split("__")
+    nullable = False
+    for i, name in enumerate(parts):
+        if name == "pk":
+            name = parts[i] = model._meta.pk.name
+        field = model._meta.get_field(name)
+        nullable = nullable or field.null
+        if isinstance(field, RelatedField):
+            if i == len(parts) - 1:
+                parts[i] = field.attname
+                break
+            model = field.related_model
+    return "__".join(parts), nullable
+
+
+def keyset_ordering(qs, default_order_by=()):
+    """[(поле, desc, nullable)] по order_by запроса (иначе — default_order_by / Meta.ordering); id в конце."""
+    model = qs.model
+    pk_name = model._meta.pk.name
+    raw = list(qs.query.order_by) or list(default_order_by) or list(model._meta.ordering)
+    keys, seen = [], set()
+    for item in raw:
+        if isinstance(item, OrderBy) and isinstance(item.expression, F):
+            name, desc = item.expression.name, item.descending
+        elif isinstance(item, str) and item != "?":
+            name, desc = item.lstrip("-"), item.startswith("-")
+        else:
+            raise ValueError(f"Keyset-пагинация не поддерживает сортировку {item!r}")
+        try:
+            path, nullable = _resolve(model, name)
+        except FieldDoesNotExist:
+            raise ValueError(f"Keyset-пагинация: неизвестное поле сортировки {name!r}")
+        if path in {pk_name, "pk"}:
+            path, nullable = pk_name, False
+        if path not in seen:
+            seen.add(path)
+            keys.append((path, desc, nullable))
+        if path == pk_name:
+            break  # после уникального ключа остальное не влияет
+    if pk_name not in seen:
+        keys.append((pk_name, keys[-1][1] if keys else False, False))
+    return keys
+
+
+def _order_expressions(keys):
+    # NULL считаем «самым большим» значением (как в PostgreSQL) и явно задаём это в ORDER BY,
+    # чтобы порядок совпадал с условием выборки на любой СУБД
+    out = []
+    for path, desc, nullable in keys:
+        if not nullable:
+            out.append(f"-{path}" if desc else path)
+        else:
+            out.append(F(path).desc(nulls_first=True) if desc else F(path).asc(nulls_last=True))
+    return out
+
+
+def _after(keys, values):
+    """Q «строго после строки с ключом values» в порядке keys."""
+    terms, prefix = [], []
+    for (path, desc, nullable), value in zip(keys, values):
+        if value is None:
+            step = Q(**{f"{path}__isnull": False}) if desc else None
+            same = Q(**{f"{path}__isnull": True})
+        else:
+            step = Q(**{f"{path}__lt" if desc else f"{path}__gt": value})
+            if nullable and not desc:
+                step |= Q(**{f"{path}__isnull": True})
+            same = Q(**{path: value})
+        if step is not None:
+            terms.append(reduce(and_, prefix + [step]))
+        prefix.append(same)
+    return reduce(or_, terms) if terms else Q(pk__in=[])
+
+
+def _row_key(obj, keys):
+    values = []
+    for path, _desc, _nullable in keys:
+        value = obj
+        for attr in path.split("__"):
+            value = getattr(value, attr, None) if value is not None else None
+        values.append(value)
+    return values
+
+
+class KeysetPage:
+    """Совместим с тем, что нужно шаблонам таблицы: object_list, has_next/has_previous."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    paginator_class для Table.paginate(): RequestConfig(paginate={"paginator_class": KeysetPaginator,
+    "per_page": 20, "cursor": request.GET.get("cursor")}). Номер страницы игнорируется.
+    Работает только с данными-queryset'ом (сортировка таблицы уже применена к нему);
+    default_order_by — если таблица не задала сортировку (нет такой колонки).
+    """
+
+    def __init__(self, rows, per_page, cursor=None, default_order_by=(), **kwargs):
+        self.rows = rows
+        self.per_page = int(per_page)
+        self.cursor = cursor
+        self.default_order_by = default_order_by
+
+    def page(self, number=None):
+        table = self.rows.table
+        qs = self.rows.data.data
+        keys = keyset_ordering(qs, self.default_order_by)
+        signature = [[path, desc] for path, desc, _ in keys]
+
+        state = decode_cursor(self.cursor)
+        if not state or state.get("o") != signature or len(state.get("k") or ()) != len(keys):
+            state = None
+        backwards = bool(state) and state.get("d") == "prev"
+
+        if backwards:
+            keys_run = [(path, not desc, nullable) for path, desc, nullable in keys]
+        else:
+            keys_run = keys
+        qs = qs.order_by(*_order_expressions(keys_run))
+        if state:
+            qs = qs.filter(_after(keys_run, state["k"]))
+
+        objects = list(qs[:self.per_page + 1])
+        more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+
+        def cursor(obj, direction):
+            return encode_cursor({"o": signature, "k": _row_key(obj, keys), "d": direction})
+
+        has_next = more if not backwards else True
+        has_prev = bool(state) and (more if backwards else True)
+        return KeysetPage(
+            BoundRows(data=objects, table=table),
+            next_cursor=cursor(objects[-1], "next") if objects and has_next else None,
+            previous_cursor=cursor(objects[0], "prev") if objects and has_prev else None,
+        )
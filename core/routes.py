@@ -0,0 +1,147 @@
+# core/routes.py
+"""
+Реестр маршрутов по моделям: (app_label, model_name, action) → URL.
+
+Раньше теги url_for / fk_list_url на каждой строке перебирали кандидатов через reverse() и ловили
+NoReverseMatch. Теперь перебор делается один раз на процесс (при первом обращении, для всех моделей):
+для действий над объектом (view/edit/delete) запоминается готовый URL с «заглушкой» вместо pk —
+на строку остаётся только подставить pk; для списков (action="list") — готовый URL целиком.
+
+Явные маршруты — ROUTE_MAP и FK_LIST_ROUTES ниже; без них имя маршрута угадывается по шаблонам.
+Реестр привязан к текущему URL-резолверу Django: после clear_url_caches() / смены ROOT_URLCONF
+(override_settings в тестах) он строится заново. Префикс скрипта (SCRIPT_NAME) в кэш не попадает.
+"""
+import uuid
+from urllib.parse import quote
+
+from django.apps import apps
+from django.db import models
+from django.urls import NoReverseMatch, get_resolver, get_script_prefix, get_urlconf, reverse
+from django.utils.http import RFC3986_SUBDELIMS
+
+OBJECT_ACTIONS = ("view", "edit", "delete")
+LIST_ACTION = "list"
+
+# ------- Явные маршруты действий над объектом -------
+# Ключ: (app_label, model_name) в нижнем регистре
+# Значение: словарь action -> route_name ("#" — маршрута нет, угадываем по шаблону)
+ROUTE_MAP = {
+    ("sewing", "sewingproductmodel"): {
+        "view": "#",
+        "edit": "sewing:model-edit",
+        "delete": "#",
+    },
+    ("sewing", "sewingorder"): {
+        "view": "#",
+        "edit": "sewing:orders-edit",
+        "delete": "#",
+    },
+    # ("info","material"): {"view":"info:material-detail","edit":"info:material-edit","delete":"info:material-delete"},
+}
+
+# ------- Явные маршруты списков (для FK-полей форм) -------
+FK_LIST_ROUTES = {
+    ("info", "material"): "materials-list",
+    ("info", "materialgroup"): "material-groups",
+    ("info", "color"): "color-list",
+    ("sewing", "operation"): "operation-list",
+    ("info", "size"): "size-list",
+}
+
+_INT_SENTINEL = "990099009900990099"
+_UUID_SENTINEL = str(uuid.UUID(int=0x9900990099009900990099009900990))
+_PK_SAFE = RFC3986_SUBDELIMS + "/~:@"  # как quote() в URLResolver.reverse
+
+_registry = None  # (резолвер, {(app, model, action): маршрут | None})
+
+
+def _candidates(app, model, action):
+    if action == LIST_ACTION:
+        explicit = FK_LIST_ROUTES.get((app, model))
+        guessed = [f"{app}:{model}-list", f"{model}-list", f"{app}:{model}s", f"{app}:{model}list"]
+    else:
+        explicit = ROUTE_MAP.get((app, model), {}).get(action)
+        guessed = [f"{app}:{model}-{action}", f"{model}-{action}"]
+    if explicit and explicit != "#":
+        return [explicit, *guessed]
+    return guessed
+
+
+def _strip_prefix(url):
+    prefix = get_script_prefix()
+    return url[len(prefix) - 1:] if url.startswith(prefix) else url
+
+
+def _sentinel(model):
+    return _UUID_SENTINEL if isinstance(model._meta.pk, models.UUIDField) else _INT_SENTINEL
+
+
+def _resolve(model, action):
+    """
+    Маршрут для (model, action) или None:
+    ("url", путь) — список; ("pk", до, после) — объект, pk вставляется между частями;
+    ("name", route_name) — объектный маршрут, для которого заглушка не подошла (reverse на строку).
+    """
+    app, name = model._meta.app_label.lower(), model._meta.model_name.lower()
+    for route in _candidates(app, name, action):
+        if action == LIST_ACTION:
+            try:
+                return "url", _strip_prefix(reverse(route))
+            except NoReverseMatch:
+                continue
+        sentinel = _sentinel(model)
+        try:
+            url = _strip_prefix(reverse(route, kwargs={"pk": sentinel}))
+        except NoReverseMatch:
+            continue
+        if url.count(sentinel) != 1:  # заглушка совпала с чем-то в пути — без шаблона
+            return "name", route
+        before, after = url.split(sentinel)
+        return "pk", before, after
+    return None
+
+
+def _table():
+    global _registry
+    resolver = get_resolver(get_urlconf())
+    if _registry is None or _registry[0] is not resolver:
+        table = {}
+        for model in apps.get_models():
+            key = (model._meta.app_label.lower(), model._meta.model_name.lower())
+            for action in (*OBJECT_ACTIONS, LIST_ACTION):
+                table[(*key, action)] = _resolve(model, action)
+        _registry = (resolver, table)
+    return _registry[1]
+
+
+def _route(model, action):
+    key = (model._meta.app_label.lower(), model._meta.model_name.lower(), action)
+    table = _table()
+    if key not in table:  # нестандартное действие — разрешаем один раз и запоминаем
+        table[key] = _resolve(model, action)
+    return table[key]
+
+
+def object_url(obj, action: str) -> str:
+    """URL действия action для объекта obj или "#"."""
+    meta = getattr(obj, "_meta", None)
+    if meta is None or obj.pk is None:
+        return "#"
+    route = _route(meta.model, action)
+    if route is None:
+        return "#"
+    if route[0] == "name":
+        try:
+            return reverse(route[1], kwargs={"pk": obj.pk})
+        except NoReverseMatch:
+            return "#"
+    _kind, before, after = route
+    return get_script_prefix()[:-1] + before + quote(str(obj.pk), safe=_PK_SAFE) + after
+
+
+def list_url(model) -> str:
+    """URL списка для модели или "#"."""
+    route = _route(model, LIST_ACTION)
+    if route is None:
+        return "#"
+    return get_script_prefix()[:-1] + route[1]
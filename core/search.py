@@ -0,0 +1,201 @@
+# core/search.py
+"""
+Поиск по search_fields с выбором способа по СУБД — вместо цепочек OR из __icontains
+(последовательное сканирование).
+
+- PostgreSQL: ILIKE '%…%' по самим колонкам — его подхватывают GIN-индексы gin_trgm_ops
+  (__icontains даёт UPPER(col) LIKE UPPER(…), мимо индекса); ранжирование — pg_trgm similarity.
+- SQLite: теневая FTS5-таблица с токенайзером trigram (<db_table>_fts, rowid = pk) по моделям
+  из register(); синхронизируется сигналами save/delete (core/signals.py), пересобирается командой
+  rebuild_search_index. Ранжирование — bm25 (скрытая колонка rank).
+- Иначе, а также для полей вне индекса и слов короче 3 символов, — прежний __icontains.
+
+Семантика везде одна: подстрока без учёта регистра в любом из полей; при words=True — каждое
+слово запроса в каком-нибудь из полей (как в select2).
+"""
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connections
+from django.db.models import F, FloatField, Lookup, Q, Value
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import RawSQL
+
+TRIGRAM_MIN = 3
+
+# модель → поля в поисковом индексе (для SQLite — колонки FTS5-таблицы)
+_indexes = {}
+
+
+def register(model, fields):
+    """Включить индекс для модели (вызывается из AppConfig.ready())."""
+    _indexes[model._meta.concrete_model] = tuple(fields)
+
+
+def registered_models():
+    return list(_indexes)
+
+
+def indexed_fields(model):
+    return _indexes.get(model._meta.concrete_model, ())
+
+
+def fts_table(model) -> str:
+    return f"{model._meta.db_table}_fts"
+
+
+def field_names(lookups):
+    """("title__icontains", "code") → ["title", "code"]."""
+    return [lk[:-len("__icontains")] if lk.endswith("__icontains") else lk for lk in lookups]
+
+
+def search(qs, fields, term, words=False, rank=False):
+    """
+    qs, отфильтрованный по term в fields. rank=True — ещё и отсортированный по релевантности
+    (если СУБД умеет; последующий order_by() её перебивает).
+    """
+    term = (term or "").strip()
+    fields = field_names(fields)
+    if not term or not fields:
+        return qs
+    bits = term.split() if words else [term]
+    vendor = connections[qs.db].vendor
+    if vendor == "postgresql":
+        return _pg_search(qs, fields, bits, rank)
+    if vendor == "sqlite" and set(fields) <= set(indexed_fields(qs.model)):
+        return _fts_search(qs, fields, bits, rank)
+    return qs.filter(_icontains(fields, bits))
+
+
+def _icontains(fields, bits):
+    return reduce(and_, (reduce(or_, (Q(**{f"{f}__icontains": bit}) for f in fields)) for bit in bits))
+
+
+# ---------------------- PostgreSQL ----------------------
+
+class _ILike(Lookup):
+    lookup_name = "ilike"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs}::text ILIKE {rhs}", lhs_params + rhs_params
+
+
+def _like_pattern(bit):
+    escaped = bit.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _pg_search(qs, fields, bits, rank):
+    cond = reduce(and_, (
+        reduce(or_, (Q(_ILike(F(f), Value(_like_pattern(bit)))) for f in fields))
+        for bit in bits
+    ))
+    qs = qs.filter(cond)
+    if rank:
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+
+        term = " ".join(bits)
+        scores = [TrigramSimilarity(f, term) for f in fields if LOOKUP_SEP not in f]
+        if scores:
+            qs = qs.annotate(search_rank=scores[0] if len(scores) == 1 else Greatest(*scores))
+            qs = qs.order_by("-search_rank", "pk")
+    return qs
+
+
+# ---------------------- SQLite FTS5 ----------------------
+
+def _fts_query(fields, bits):
+    columns = " ".join(fields)
+    return " AND ".join('{%s} : "%s"' % (columns, bit.replace('"', '""')) for bit in bits)
+
+
+def _fts_search(qs, fields, bits, rank):
+    short = [b for b in bits if len(b) < TRIGRAM_MIN]  # trigram их не находит
+    long = [b for b in bits if len(b) >= TRIGRAM_MIN]
+    if short:
+        qs = qs.filter(_icontains(fields, short))
+    if not long:
+        return qs
+
+    table, match = fts_table(qs.model), _fts_query(fields, long)
+    qs = qs.filter(pk__in=RawSQL(f'SELECT rowid FROM "{table}" WHERE "{table}" MATCH %s', [match]))
+    if not rank:
+        return qs
+    # bm25 (скрытая колонка rank) — подзапросом по rowid, только для уже отобранных строк
+    pk_col = f'"{qs.model._meta.db_table}"."{qs.model._meta.pk.column}"'
+    rank_sql = f'SELECT rank FROM "{table}" WHERE "{table}" MATCH %s AND rowid = {pk_col}'
+    return qs.annotate(search_rank=RawSQL(rank_sql, [match], output_field=FloatField())).order_by("search_rank")
+
+
+def _fts_row(instance, fields):
+    return [instance.pk] + ["" if getattr(instance, f) is None else str(getattr(instance, f)) for f in fields]
+
+
+def sync_instance(model, instance, using="default", deleted=False, update_fields=None):
+    """Обновить строку FTS-индекса после save/delete (только SQLite и только для register()-моделей)."""
+    fields = indexed_fields(model)
+    conn = connections[using]
+    if not fields or conn.vendor != "sqlite":
+        return
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    table = fts_table(model)
+    with conn.cursor() as cur:
+        cur.execute(f'DELETE FROM "{table}" WHERE rowid = %s', [instance.pk])
+        if not deleted:
+            cols = ", ".join(f'"{f}"' for f in fields)
+            marks = ", ".join(["%s"] * (len(fields) + 1))
+            cur.execute(f'INSERT INTO "{table}" (rowid, {cols}) VALUES ({marks})', _fts_row(instance, fields))
+
+
+def _fts_statements(model, fields):
+    """SQL (пере)создания FTS-таблицы модели и её заполнения из основной таблицы: [(sql, params)]."""
+    table, src = fts_table(model), model._meta.db_table
+    columns = [model._meta.get_field(f).column for f in fields]
+    return [
+        (f'DROP TABLE IF EXISTS "{table}"', None),
+        (f"CREATE VIRTUAL TABLE \"{table}\" USING fts5({', '.join(fields)}, tokenize='trigram')", None),
+        (f'INSERT INTO "{table}" (rowid, {", ".join(fields)}) '
+         f'SELECT "{model._meta.pk.column}", {", ".join(f"COALESCE({c}, %s)" for c in columns)} FROM "{src}"',
+         [""] * len(columns)),
+    ]
+
+
+def rebuild_fts(model, using="default"):
+    """Пересоздать FTS-таблицу модели по текущему register() и заполнить из основной таблицы."""
+    fields = indexed_fields(model)
+    conn = connections[using]
+    if not fields or conn.vendor != "sqlite":
+        return None
+    with conn.cursor() as cur:
+        for sql, params in _fts_statements(model, fields):
+            cur.execute(sql, params)
+        cur.execute(f'SELECT count(*) FROM "{fts_table(model)}"')
+        return cur.fetchone()[0]
+
+
+def create_fts(schema_editor, model, fields):
+    """Для миграций (RunPython): FTS-таблица исторической модели model по fields; только SQLite."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql, params in _fts_statements(model, fields):
+        schema_editor.execute(sql, params)
+
+
+def drop_fts(schema_editor, model):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{fts_table(model)}"')
+
+
+class SearchSelect2Mixin:
+    """Для ModelSelect2-виджетов: поиск по search_fields через search() с ранжированием."""
+
+    def filter_queryset(self, request, term, queryset=None, **dependent_fields):
+        if queryset is None:
+            queryset = self.get_queryset()
+        if dependent_fields:
+            queryset = queryset.filter(**dependent_fields)
+        return search(queryset, self.get_search_fields(), term, words=True, rank=True)
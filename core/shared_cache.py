@@ -0,0 +1,59 @@
+# core/shared_cache.py
+"""
+Версии в кэше для кэшей «с версией» (COUNT(*) списков — core.pagination, HTML-фрагменты —
+core.fragments, а через них и ETag'и core.conditional): запись сбрасывается не удалением, а подъёмом
+версии, от которой строится ключ.
+
+Это работает, только если кэш общий для всех процессов (Redis, Memcached, БД, файлы на одном хосте).
+У LocMemCache он свой в каждом воркере: save в одном процессе не поднимает версию в других, и те
+отдают устаревшее до таймаута. Поэтому с кэшем внутри процесса такие кэши выключены: версия каждый
+раз новая (ключи и ETag'и не совпадают), кэширующий код идёт мимо кэша. SHARED_CACHE = True в settings
+включает их и с LocMem — когда процесс заведомо один (runserver, тесты).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache,)
+
+
+def _process_local() -> bool:
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_BACKENDS)
+
+
+def cache_is_shared() -> bool:
+    """Можно ли кэшировать по версиям: SHARED_CACHE из settings, а если не задан — по бэкенду кэша."""
+    shared = getattr(settings, "SHARED_CACHE", None)
+    return not _process_local() if shared is None else bool(shared)
+
+
+def get_version(key):
+    """Текущая версия по ключу; без общего кэша — каждый раз новая (ничего, что по ней строится, не совпадёт)."""
+    if not cache_is_shared():
+        return f"local:{uuid.uuid4().hex}"
+    return caches[DEFAULT_CACHE_ALIAS].get_or_set(key, 1, timeout=None)
+
+
+def bump_versions(keys):
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:  # ключа ещё нет — записей по нему тоже
+            cache.add(key, 1, timeout=None)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if not _process_local():
+        return []
+    hint = ("Задайте в CACHES общий бэкенд (Redis, Memcached, DatabaseCache). "
+            "SHARED_CACHE = True — только если процесс приложения один.")
+    if getattr(settings, "SHARED_CACHE", None):
+        return [Warning("SHARED_CACHE = True, но кэш локальный для процесса (LocMemCache): при нескольких "
+                        "воркерах списки, счётчики строк и ответы 304 будут устаревать.", hint=hint, id="core.W001")]
+    return [Warning("Кэш локальный для процесса (LocMemCache): кэш количеств строк и HTML-фрагментов выключен.",
+                    hint=hint, id="core.W002")]
@@ -0,0 +1,25 @@
+# core/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .pagination import invalidate_counts
+from .search import sync_instance
+
+
+# любое изменение строк модели (в т.ч. смена полей, по которым фильтруют списки)
+# сбрасывает закэшированные количества её списков
+@receiver([post_save, post_delete])
+def _rows_changed(sender, using=None, raw=False, **kwargs):
+    if not raw:
+        invalidate_counts(sender, using=using)
+
+
+# строка поискового индекса (SQLite FTS5) — в той же транзакции, что и сама запись
+@receiver(post_save)
+def _search_row_saved(sender, instance, using=None, update_fields=None, **kwargs):
+    sync_instance(sender, instance, using=using, update_fields=update_fields)
+
+
+@receiver(post_delete)
+def _search_row_deleted(sender, instance, using=None, **kwargs):
+    sync_instance(sender, instance, using=using, deleted=True)
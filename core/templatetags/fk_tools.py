@@ -1,20 +1,11 @@
 # core/templatetags/fk_tools.py
 from django import template
-from django.urls import reverse, NoReverseMatch
 
-register = template.Library()
+from core import routes
+from core.routes import FK_LIST_ROUTES  # noqa: F401 — реестр теперь в core/routes.py
 
-# Явные маршруты списков для моделей (app_label, model_name) -> route_name
-FK_LIST_ROUTES = {
-    ("info", "material"): "materials-list",
-    ("info", "materialgroup"): "material-groups",
-    ("info", "color"): "color-list",            # подставь свой name
-    ("sewing", "operation"): "operation-list",  # подставь свой name
-    ("info", "size"): "size-list",              # подставь свой name
-    # добавляй по мере необходимости
-}
+register = template.Library()
 
-#
 
 @register.simple_tag
 def fk_list_url(bound_field):
@@ -22,6 +13,7 @@ def fk_list_url(bound_field):
     Возвращает URL списка справочника для FK-поля формы.
     Если явного маппинга нет — пробует угадать по шаблонам имен.
     Если ничего не получилось — вернёт "#".
+    Маршрут ищется один раз на процесс (core/routes.py).
     """
     # Достаём модель из queryset поля формы
     field = getattr(bound_field, "field", None)
@@ -29,29 +21,4 @@ def fk_list_url(bound_field):
     model = getattr(qs, "model", None)
     if not model:
         return "#"
-
-    app = model._meta.app_label.lower()
-    name = model._meta.model_name.lower()
-
-    # 1) Явная карта
-    route = FK_LIST_ROUTES.get((app, name))
-    if route:
-        try:
-            return reverse(route)
-        except NoReverseMatch:
-            pass
-
-    # 2) Эвристика по распространённым паттернам
-    candidates = [
-        f"{app}:{name}-list",
-        f"{name}-list",
-        f"{app}:{name}s",        # иногда делают во мн. числе
-        f"{app}:{name}list",     # запасной вариант
-    ]
-    for r in candidates:
-        try:
-            return reverse(r)
-        except NoReverseMatch:
-            continue
-
-    return "#"
\ No newline at end of file
+    return routes.list_url(model)
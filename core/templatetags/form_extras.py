@@ -1,6 +1,8 @@
 # core/templatetags/form_extras.py
 from django import template
 
+from core import labels
+
 register = template.Library()
 
 
@@ -10,16 +12,15 @@ def choice_label(bf, raw_value):
     if not bf:
         return raw_value
     value = "" if raw_value is None else str(raw_value)
-    # ModelChoice: берём queryset и ищем по pk
-    qs = getattr(getattr(bf.field, "queryset", None), "all", None)
-    if callable(qs):
-        try:
-            obj = bf.field.queryset.get(pk=value)
-            return str(obj)
-        except Exception:
-            pass
-    # Обычные choices
-    for v, label in getattr(bf.field, "choices", []):
-        if str(v) == value:
-            return label
-    return raw_value
+    label = labels.choice_label(bf.field, value)
+    return raw_value if label is None else label
+
+
+@register.simple_tag
+def prime_choice_labels(forms, *names):
+    """
+    {% prime_choice_labels formset "size" "operation" %} перед циклом по формам — подписи
+    ModelChoice-полей всех строк подтянутся одним запросом на модель.
+    """
+    labels.prime_choice_labels(forms, *names)
+    return ""
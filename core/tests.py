@@ -1,3 +1,338 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+import openpyxl
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django import forms
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from info.models import Color, Material, MaterialGroup, MeasurementUnit
+from info.views import ColorListCreateView, MaterialListView
+from . import views
+from .views import list_queryset_plan
+from .filters import FKFilterSelect2
+from .middlewares import QueryBudgetMiddleware, _thread_locals, fingerprint
+from .db import on_commit_once
+from .pagination import CachedCountPaginator, count_version, invalidate_counts
+from .search import fts_table, rebuild_fts, search
+from .shared_cache import check_shared_cache
+
+
+class OnCommitOnceTests(TestCase):
+    def test_calls_collapse_into_one_flush(self):
+        calls = []
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for ids in ({1}, {2, 3}, {3}):
+                on_commit_once("test", calls.append, ids)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, [{1, 2, 3}])
+
+    def test_rolled_back_savepoint_starts_a_new_set(self):
+        calls = []
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    on_commit_once("test", calls.append, {1})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            on_commit_once("test", calls.append, {2})
+        self.assertEqual(calls, [{2}])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_invalidate_counts_bumps_version_once_per_transaction(self):
+        before = count_version(Color)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_counts(Color)
+            invalidate_counts(Color)
+        self.assertEqual(count_version(Color), before + 1)
+
+
+@override_settings(SHARED_CACHE=True)  # процесс тестов один — LocMem общий
+class CountCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self, qs):
+        table = ColorListCreateView().get_table_class()(qs)
+        table.paginate(paginator_class=CachedCountPaginator, per_page=5)
+        return table.paginator
+
+    def test_count_is_cached_until_rows_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Color.objects.create(code="C1", name="Красный")
+        self.assertEqual(self.paginator(Color.objects.all()).count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.paginator(Color.objects.all()).count, 1)
+        self.assertEqual(self.paginator(Color.objects.filter(name="Синий")).count, 0)  # другой фильтр — свой ключ
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Color.objects.create(code="C2", name="Синий")
+        self.assertEqual(self.paginator(Color.objects.all()).count, 2)
+
+    @override_settings(SHARED_CACHE=None)
+    def test_process_local_cache_counts_every_time(self):
+        Color.objects.create(code="C1", name="Красный")
+        self.assertEqual(self.paginator(Color.objects.all()).count, 1)
+        with self.assertNumQueries(1):  # версия у каждого воркера своя — кэшу не доверяем
+            self.assertEqual(self.paginator(Color.objects.all()).count, 1)
+        self.assertNotEqual(count_version(Color), count_version(Color))
+
+    def test_deploy_check_flags_process_local_cache(self):
+        with override_settings(SHARED_CACHE=None):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ["core.W002"])
+        self.assertEqual([w.id for w in check_shared_cache(None)], ["core.W001"])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class GeneratedClassRegistryTests(TestCase):
+    def view(self):
+        view = ColorListCreateView()
+        view.setup(RequestFactory().get("/"))
+        return view
+
+    def test_classes_are_built_once_per_view_config(self):
+        views._generated_classes.clear()
+        first, second = self.view(), self.view()
+        self.assertIs(first.get_table_class(), second.get_table_class())
+        self.assertIs(first.get_filterset_class(), second.get_filterset_class())
+        self.assertEqual(len(views._generated_classes), 2)
+
+    def test_bench_command_runs(self):
+        out = io.StringIO()
+        call_command("bench_list_views", "info:colors-list", repeat=1, stdout=out)
+        self.assertIn("сборок за запрос: 2", out.getvalue())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        # повторяющиеся title — курсор обязан различать строки по id
+        Material.objects.bulk_create(Material(code=f"M{i:02d}", title="ABC"[i % 3], m_unit=mu) for i in range(30))
+
+    def page(self, cursor=None):
+        params = {"sort": "title", **({"cursor": cursor} if cursor else {})}
+        page = self.client.get(reverse("info:materials-list"), params).context["table"].page
+        return [row.record for row in page.object_list], page
+
+    def test_walk_forward_and_back(self):
+        pages, cursor = [], None
+        while True:
+            records, page = self.page(cursor)
+            pages.append([m.pk for m in records])
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        seen = [pk for ids in pages for pk in ids]
+        self.assertEqual([len(ids) for ids in pages], [12, 12, 6])
+        self.assertEqual(sorted(seen), sorted(Material.objects.values_list("pk", flat=True)))
+        titles = list(Material.objects.in_bulk(seen).values())
+        self.assertEqual([m.title for m in sorted(titles, key=lambda m: seen.index(m.pk))],
+                         sorted(m.title for m in titles))
+
+        _records, last = self.page(self.page(self.page()[1].next_cursor)[1].next_cursor)
+        back, _page = self.page(last.previous_cursor)
+        self.assertEqual([m.pk for m in back], pages[1])
+
+    def test_garbage_cursor_starts_from_the_beginning(self):
+        first = [m.pk for m in self.page()[0]]
+        self.assertEqual([m.pk for m in self.page("not-a-cursor")[0]], first)
+
+    def test_page_runs_no_count(self):
+        cursor = self.page()[1].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.page(cursor)
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"].upper()])
+
+
+class FKFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        cls.groups = MaterialGroup.objects.bulk_create(MaterialGroup(name=f"Группа {i}", code=f"G{i}") for i in range(40))
+        cls.material = Material.objects.create(code="M1", title="Ткань", m_unit=mu, group=cls.groups[7])
+        Material.objects.create(code="M2", title="Нить", m_unit=mu, group=cls.groups[8])
+
+    def test_filter_renders_only_selected_option_and_filters(self):
+        response = self.client.get(reverse("info:materials-list"), {"group": self.groups[7].pk})
+        field = response.context["filter"].form["group"]
+        self.assertIsInstance(field.field.widget, FKFilterSelect2)
+        html = str(field)
+        self.assertEqual(html.count("<option"), 2)  # пустой + выбранный
+        self.assertIn("Группа 7", html)
+        self.assertEqual([row.record.pk for row in response.context["table"].page.object_list], [self.material.pk])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        cls.cotton = Material.objects.create(code="M1", title="Ткань хлопковая", m_unit=mu)
+        cls.thread = Material.objects.create(code="M2", title="Нить хлопковая", m_unit=mu, barcode="4600001")
+
+    def found(self, term, **kwargs):
+        return set(search(Material.objects.all(), ("code", "title", "barcode"), term, **kwargs))
+
+    def test_substring_in_any_field(self):
+        self.assertEqual(self.found("ХЛОПК"), {self.cotton, self.thread})
+        self.assertEqual(self.found("600"), {self.thread})
+        self.assertEqual(self.found("M1"), {self.cotton})  # короче триграммы — через icontains
+        self.assertEqual(self.found("нить 4600", words=True), {self.thread})
+        self.assertEqual(self.found("нить ткань", words=True), set())
+
+    def test_index_follows_save_and_delete(self):
+        self.cotton.title = "Ткань льняная"
+        self.cotton.save()
+        self.assertEqual(self.found("хлопк"), {self.thread})
+        self.assertEqual(self.found("льнян"), {self.cotton})
+        self.thread.delete()
+        self.assertEqual(self.found("хлопк"), set())
+        self.assertEqual(rebuild_fts(Material), 1)
+        self.assertEqual(self.found("льнян"), {self.cotton})
+
+    def test_rank_orders_by_relevance(self):
+        found = list(search(Material.objects.all(), ("code", "title", "barcode"), "хлопк", rank=True))
+        self.assertEqual(set(found), {self.cotton, self.thread})
+        self.assertEqual([m.search_rank for m in found], sorted(m.search_rank for m in found))
+
+    def test_migration_creates_the_table_search_reads(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [fts_table(Material)])
+            self.assertEqual(cur.fetchall(), [(fts_table(Material),)])
+
+    def test_list_view_uses_search(self):
+        response = self.client.get(reverse("info:materials-list"), {"search": "нить"})
+        self.assertEqual([row.record.pk for row in response.context["table"].page.object_list], [self.thread.pk])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        group = MaterialGroup.objects.create(name="Ткани", code="G1")
+        Material.objects.create(code="M1", title="Ткань; хлопок", m_unit=mu, group=group)
+        Material.objects.create(code="M2", title="Нить", m_unit=mu)
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse("info:materials-list"), {"format": fmt, "sort": "code", **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_keeps_filters_and_fk_labels(self):
+        response, body = self.export("csv", search="ткань")
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        lines = body.decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].split(";")[:1], ["M1"])
+        self.assertIn('"Ткань; хлопок";Ткани', lines[1])
+
+    def test_xlsx_opens_in_openpyxl(self):
+        _response, body = self.export("xlsx")
+        rows = list(openpyxl.load_workbook(io.BytesIO(body)).active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row[0] for row in rows[1:]], ["M1", "M2"])
+        self.assertEqual(rows[1][2], "Ткани")
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.colors = Color.objects.bulk_create(Color(code=f"C{i}", name=f"Цвет {i}") for i in range(6))
+
+    def view(self, request):
+        # N+1: по запросу на строку
+        names = [Color.objects.get(pk=c.pk).name for c in Color.objects.all()]
+        return HttpResponse(", ".join(names))
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(self.view)
+
+    def test_fingerprint_ignores_in_list_length(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE id IN (%s, %s)"),
+                         fingerprint("SELECT  *\nFROM t WHERE id IN (%s,%s,%s)"))
+
+    def test_reports_queries_and_n_plus_one(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = Path(tmp) / "budget.jsonl"
+            with override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_N1_THRESHOLD=5, QUERY_BUDGET_LOG=str(log)):
+                middleware = QueryBudgetMiddleware(self.view)
+                with self.assertLogs("core.querybudget", "WARNING"):
+                    response = middleware(RequestFactory().get("/colors/"))
+            self.assertIn('desc="7 SQL"', response["Server-Timing"])
+            self.assertIn('desc="1 N+1"', response["Server-Timing"])
+            entry = json.loads(log.read_text(encoding="utf-8"))
+            self.assertEqual((entry["queries"], entry["n_plus_one"][0]["count"]), (7, 6))
+            self.assertIn("core/tests.py", entry["n_plus_one"][0]["where"])
+
+            out = io.StringIO()
+            call_command("query_budget_report", log=str(log), stdout=out)
+            self.assertIn("Повторяющиеся запросы (N+1)", out.getvalue())
+
+
+class ListQuerysetPlanTests(TestCase):
+    def test_plan_from_list_fields_and_sort_paths(self):
+        related, only = list_queryset_plan(Material, MaterialListView.list_fields, ["-id", "group__name"])
+        self.assertEqual(related, ["color", "group", "m_unit", "special_group"])
+        self.assertEqual(only, ["code", "color", "group", "id", "m_unit", "special_group", "title"])
+        self.assertEqual(list_queryset_plan(Material, ("code", "no_such_property"))[1], None)
+
+    def queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("info:materials-list"), {"sort": "group"})
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        mu = MeasurementUnit.objects.create(name="kg")
+        # color — FK, которого нет в get_queryset() списка: его select_related выводится из list_fields
+        colors = Color.objects.bulk_create(Color(code=f"C{i}", name=f"Цвет {i}") for i in range(12))
+        Material.objects.bulk_create(Material(code=f"M{i}", title="Ткань", m_unit=mu, color=colors[i]) for i in range(2))
+        few = self.queries()
+        Material.objects.bulk_create(Material(code=f"N{i}", title="Нить", m_unit=mu, color=colors[i]) for i in range(10))
+        self.assertEqual(self.queries(), few)
+
+
+class LabelRowForm(forms.Form):
+    color = forms.ModelChoiceField(Color.objects.all())
+    tone = forms.ChoiceField(choices=[("Тёплые", [("1", "Светлый"), ("2", "Тёмный")])])
+
+
+class ChoiceLabelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.colors = Color.objects.bulk_create(Color(code=f"C{i}", name=f"Цвет {i}") for i in range(5))
+
+    def setUp(self):
+        _thread_locals.cache = {}  # как в CurrentUserMiddleware на время запроса
+        self.addCleanup(setattr, _thread_locals, "cache", None)
+
+    def render(self, template):
+        formset = forms.formset_factory(LabelRowForm, extra=0)(
+            initial=[{"color": c.pk, "tone": "2"} for c in self.colors] + [{"color": 999999, "tone": "3"}])
+        return Template("{% load form_extras %}" + template).render(Context({"formset": formset}))
+
+    def test_formset_labels_in_one_query(self):
+        template = ('{% prime_choice_labels formset "color" %}{% for f in formset %}'
+                    '{{ f.color|choice_label:f.color.value }}/{{ f.tone|choice_label:f.tone.value }};{% endfor %}')
+        with self.assertNumQueries(1):
+            html = self.render(template)
+        self.assertEqual(html.split(";")[:-1], [f"{c}/Тёмный" for c in self.colors] + ["999999/3"])
+
+    def test_without_priming_each_value_is_fetched_once(self):
+        template = "{% for f in formset %}{{ f.color|choice_label:f.color.value }}{{ f.color|choice_label:f.color.value }}{% endfor %}"
+        with self.assertNumQueries(6):
+            self.render(template)
+        with self.assertNumQueries(0):  # тот же запрос — из кэша
+            self.render(template)
@@ -1,17 +1,79 @@
 # core/views_list.py
 from django.contrib import messages
+from django.core.exceptions import FieldDoesNotExist
 from django.forms import modelform_factory
 from django.http import Http404
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from django.views.generic.edit import FormMixin
 from django_filters.views import FilterView
+from django_tables2 import RequestConfig
 from django_tables2.views import SingleTableMixin
 
+from .export import EXPORT_CHUNK_SIZE, display_field, export_response, export_values
 from .filters import make_filterset_class
+from .fragments import FRAGMENT_TIMEOUT, cached_fragment, model_version
+from .pagination import CURSOR_PARAM, CachedCountPaginator, KeysetPaginator
 from .tables import make_table_class
 
+# сгенерированные классы таблиц/фильтров: (вид, класс view, конфиг) → класс
+_generated_classes = {}
+
+
+def _freeze(value):
+    """Конфиг view → hashable ключ (dict/list → tuple); объекты фильтров сравниваются по identity."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def list_queryset_plan(model, fields, paths=()):
+    """
+    Что грузить для строк списка: (select_related, only). fields — колонки (list_fields),
+    paths — прочие пути ORM, которые читаются у строк (сортировка, order_by_map, export_map).
+    FK (в т.ч. цепочки a__b) → select_related, связанные модели целиком (их __str__ может
+    читать любое поле); у самой модели — только нужные колонки. only=None, если среди колонок
+    есть свойство модели: от каких полей оно зависит, не узнать.
+    """
+    related, only = set(), {model._meta.pk.name}
+    for name in fields:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            only = None
+            continue
+        if not field.concrete or field.many_to_many:
+            continue
+        if only is not None:
+            only.add(name)
+        if field.is_relation:
+            related.add(name)
+    for path in paths:
+        current, chain = model, []
+        for part in path.lstrip("-").split("__"):
+            try:
+                field = current._meta.get_field(model._meta.pk.name if part == "pk" and not chain else part)
+            except FieldDoesNotExist:
+                break  # lookup/transform или не поле
+            if not field.concrete or field.many_to_many:
+                break
+            if not chain and only is not None:
+                only.add(field.name)
+            if not field.is_relation:
+                break
+            chain.append(part)
+            current = field.related_model
+        if chain:
+            related.add("__".join(chain))
+    return sorted(related), (sorted(only) if only is not None else None)
+
 
 class BaseModelListView(SingleTableMixin, FilterView):
     """
@@ -24,6 +86,22 @@ class BaseModelListView(SingleTableMixin, FilterView):
     PAGE_SIZE_CHOICES = (12, 20, 50, 100)  # варианты для селекта
     default_per_page = 12  # дефолт
     table_pagination = {"per_page": default_per_page}  # будет перебиваться get_table_pagination()
+    # keyset: листание курсором «вперёд/назад» без OFFSET и COUNT(*) — для больших таблиц
+    keyset_pagination = False
+    count_cache_timeout = 60  # сек; COUNT(*) по тем же фильтрам берётся из кэша
+
+    # --- выгрузка ?format=csv|xlsx: текущие фильтры/поиск/сортировка, потоком ---
+    export_formats = ("csv", "xlsx")
+    export_chunk_size = EXPORT_CHUNK_SIZE
+    export_map = None  # {колонка из list_fields: путь ORM}, напр. для свойств модели
+
+    # --- строки таблицы: select_related/only выводятся из list_fields (см. list_queryset_plan) ---
+    list_select_related = True  # False — не трогать queryset (всё делает get_queryset)
+    list_only = True  # False — грузить все колонки модели
+
+    # --- кэш HTML таблицы по версиям модели и её FK-справочников (для редко меняющихся списков) ---
+    fragment_cache = False
+    fragment_timeout = FRAGMENT_TIMEOUT
 
     # --- конфиг остального ---
     list_fields = ()
@@ -44,16 +122,24 @@ class BaseModelListView(SingleTableMixin, FilterView):
             n = 0
         return n if n in self.PAGE_SIZE_CHOICES else self.default_per_page
 
-    # Если где-то используешь обычную пагинацию ListView:
+    # Страницы режет таблица (get_table_pagination); пагинация ListView дала бы
+    # второй COUNT(*) + OFFSET на каждый запрос, а page_obj шаблоны не используют
     def get_paginate_by(self, queryset):
-        return self.get_per_page()
+        return None
 
     # Для django-tables2 (SingleTableMixin):
     def get_table_pagination(self, table):
-        return {"per_page": self.get_per_page()}
+        if self.keyset_pagination:
+            return {"paginator_class": KeysetPaginator, "per_page": self.get_per_page(),
+                    "cursor": self.request.GET.get(CURSOR_PARAM), "default_order_by": self.order_by}
+        return {"paginator_class": CachedCountPaginator, "per_page": self.get_per_page(),
+                "cache_timeout": self.count_cache_timeout}
 
     # ---- остальное как у тебя ----
     def get(self, request, *args, **kwargs):
+        fmt = request.GET.get("format")
+        if fmt and fmt in self.export_formats:
+            return self.export(fmt)
         try:
             return super().get(request, *args, **kwargs)
         except Http404 as e:
@@ -64,15 +150,68 @@ class BaseModelListView(SingleTableMixin, FilterView):
                 return redirect(f"{request.path}?{q.urlencode()}")
             raise
 
+    # ---- выгрузка ----
+    def get_export_columns(self):
+        """[(заголовок, путь ORM, подписи choices | None)] по list_fields; FK — через его name/title."""
+        verbose = self.get_verbose_map()
+        export_map = self.export_map or {}
+        columns = []
+        for name in self.list_fields:
+            path, labels = export_map.get(name), None
+            if path is None:
+                try:
+                    field = self.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    continue  # свойство без export_map — в выгрузку не попадает
+                if field.many_to_many or field.one_to_many:
+                    continue
+                if field.is_relation:
+                    display = display_field(field.related_model)
+                    path = f"{name}__{display}" if display else field.attname
+                else:
+                    path = name
+                    labels = dict(field.flatchoices) if field.choices else None
+            columns.append((str(verbose.get(name, name)), path, labels))
+        return columns
+
+    def get_export_queryset(self):
+        # те же фильтры и поиск, что и у страницы (strict: невалидная форма → пусто)…
+        filterset = self.get_filterset(self.get_filterset_class())
+        if not filterset.is_bound or filterset.is_valid() or not self.get_strict():
+            qs = filterset.qs
+        else:
+            qs = filterset.queryset.none()
+        # …и та же сортировка таблицы (?sort=, order_by_map)
+        table = self.get_table_class()(data=qs)
+        RequestConfig(self.request, paginate=False).configure(table)
+        return table.data.data
+
+    def export(self, fmt):
+        columns = self.get_export_columns()
+        rows = export_values(self.get_export_queryset(), columns, chunk_size=self.export_chunk_size)
+        filename = f"{self.model._meta.model_name}_{timezone.localdate():%Y%m%d}"
+        return export_response(fmt, filename, [title for title, _, _ in columns], rows)
+
+    def _generated(self, kind, config, build):
+        # классы строятся один раз на класс view + конфиг (+ язык: заголовки из verbose_name)
+        key = (kind, type(self), get_language(), _freeze(config))
+        cls = _generated_classes.get(key)
+        if cls is None:
+            cls = _generated_classes[key] = build()
+        return cls
+
     def get_table_class(self):
-        return make_table_class(
+        config = (self.model, self.list_fields, self.order_by, self.add_actions, self.verbose_map,
+                  self.order_by_map, self.keyset_pagination)
+        return self._generated("table", config, lambda: make_table_class(
             self.model,
             self.list_fields,
             order_by=self.order_by,
             add_actions=self.add_actions,
             verbose_map=self.get_verbose_map(),
             order_by_map=(self.order_by_map or {}),
-        )
+            **({"template_name": "common/_keyset_table.html"} if self.keyset_pagination else {}),
+        ))
 
     def get_verbose_map(self):
         if self.verbose_map is not None:
@@ -87,12 +226,13 @@ class BaseModelListView(SingleTableMixin, FilterView):
         return mapping
 
     def get_filterset_class(self):
-        return make_filterset_class(
+        config = (self.model, self.search_fields, self.fk_filters, self.extra_filters)
+        return self._generated("filterset", config, lambda: make_filterset_class(
             self.model,
             search_fields=self.search_fields,
             fk_filters=self.fk_filters,
             extra_filters=(self.extra_filters or {}),
-        )
+        ))
 
     @property
     def table_class(self):
@@ -105,6 +245,56 @@ class BaseModelListView(SingleTableMixin, FilterView):
     def get_queryset(self):
         return super().get_queryset()
 
+    # Строки для таблицы: после get_queryset() подклассов и фильтров — чтобы учесть их select_related
+    def get_table_data(self):
+        return self.optimize_queryset(super().get_table_data())
+
+    def optimize_queryset(self, qs):
+        if not self.list_select_related or not hasattr(qs, "query") or qs.query.values_select:
+            return qs
+        related, only = list_queryset_plan(qs.model, self.list_fields, self._row_paths())
+        if related:
+            qs = qs.select_related(*related)
+        query = qs.query
+        deferred = query.deferred_loading != (frozenset(), True)  # подкласс уже задал only()/defer()
+        if self.list_only and only and not deferred and query.select_related is not True:
+            # select_related из get_queryset() подкласса: его корни тоже должны загружаться
+            only = set(only) | set(query.select_related or {})
+            qs = qs.only(*only)
+        return qs
+
+    def _row_paths(self):
+        paths = list(self.order_by)
+        for value in (self.order_by_map or {}).values():
+            paths += [value] if isinstance(value, str) else list(value)
+        return paths + list((self.export_map or {}).values())
+
+    # ---- кэш фрагмента таблицы ----
+    def get_fragment_models(self):
+        """Модели, из которых собирается таблица: сама модель + связанные по FK-колонкам."""
+        models = [self.model]
+        related, _ = list_queryset_plan(self.model, self.list_fields, self._row_paths())
+        for path in related:
+            current = self.model
+            for part in path.split("__"):
+                current = current._meta.get_field(part).related_model
+                if current not in models:
+                    models.append(current)
+        return models
+
+    def get_fragment_key(self):
+        versions = [(m._meta.label_lower, model_version(m)) for m in self.get_fragment_models()]
+        return (get_language(), self.request.get_full_path(), self.get_per_page(), versions)
+
+    def render_table_fragment(self, ctx):
+        name = f"list:{self.model._meta.label_lower}"
+        keys = ("table", "create_url", "create_label")
+        return mark_safe(cached_fragment(
+            name, self.get_fragment_key(),
+            lambda: render_to_string("common/_list_table.html", {k: ctx.get(k) for k in keys}, self.request),
+            self.fragment_timeout,
+        ))
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         if self.create_url_name:
@@ -116,6 +306,11 @@ class BaseModelListView(SingleTableMixin, FilterView):
         # передаём в шаблон варианты и текущий выбор
         ctx["page_sizes"] = self.PAGE_SIZE_CHOICES
         ctx["per_page"] = self.get_per_page()
+        ctx["keyset_pagination"] = self.keyset_pagination
+        ctx["export_formats"] = self.export_formats
+        # keyset-страница выбирается сразу в пагинаторе — кэш таблицы запрос уже не сэкономит
+        if self.fragment_cache and not self.keyset_pagination:
+            ctx["table_html"] = self.render_table_fragment(ctx)
         return ctx
 
 
@@ -201,6 +396,7 @@ class BaseListCreateView(FormMixin, BaseModelListView):
 
         params = self.request.GET.copy()
         params.pop("page", None)
+        params.pop(CURSOR_PARAM, None)
         qs = f"?{urlencode(params, doseq=True)}" if params else ""
         return redirect(f"{self.request.path}{qs}")
 
@@ -1,11 +1,12 @@
 # core/widgets.py
 from django_select2.forms import ModelSelect2Widget
 
+from core.search import SearchSelect2Mixin
 from info.models import Material, Operation, Size, MaterialGroup, Color
 from sewing.models import ModelVariant
 
 
-class BaseAjaxSelect2(ModelSelect2Widget):
+class BaseAjaxSelect2(SearchSelect2Mixin, ModelSelect2Widget):
     search_fields = ()
     attrs = {
         "data-minimum-input-length": 1,
@@ -63,7 +64,7 @@ class ColorSelect2(BaseAjaxSelect2):
     search_fields = ("name__icontains", "code__icontains")
 
 
-class VariantSelect2(ModelSelect2Widget):
+class VariantSelect2(SearchSelect2Mixin, ModelSelect2Widget):
     model = ModelVariant
     search_fields = (
         "name__icontains",
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InfoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'info'
+
+    def ready(self):
+        from core import search
+        # поисковый индекс (SQLite: FTS5-таблица core.search.fts_table(), см. миграцию 0003)
+        search.register(self.get_model("Material"), ("code", "title", "type", "barcode", "accounting_code"))
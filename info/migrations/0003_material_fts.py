@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from core.search import create_fts, drop_fts
+
+# поля индекса на момент миграции (текущие — search.register() в info/apps.py)
+FIELDS = ("code", "title", "type", "barcode", "accounting_code")
+
+
+def create_material_fts(apps, schema_editor):
+    # только SQLite: теневая FTS5-таблица для поиска материалов (core/search.py, имя — fts_table());
+    # на PostgreSQL поиск идёт по trigram GIN-индексам из 0002
+    create_fts(schema_editor, apps.get_model("info", "Material"), FIELDS)
+
+
+def drop_material_fts(apps, schema_editor):
+    drop_fts(schema_editor, apps.get_model("info", "Material"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('info', '0002_material_mat_title_trgm_material_mat_code_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_material_fts, drop_material_fts),
+    ]
@@ -511,6 +511,14 @@ class Material(AuditUserSaveMixin, BaseModel):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # цена на момент загрузки — чтобы post_save мог понять, менялась ли planned_cost
+        # (models.DEFERRED — поле не загружалось: only()/defer())
+        instance._loaded_planned_cost = instance.__dict__.get("planned_cost", models.DEFERRED)
+        return instance
+
     @staticmethod
     def fromJson(jsondata):
         for data in jsondata:
@@ -17,6 +17,7 @@ class ColorListCreateView(BaseListCreateView):
     search_fields = ("code", "name",)
     fk_filters = ("group", "color_tone",)
     order_by = ("-id",)
+    fragment_cache = True
 
     create_fields = ("code", "name", "group", "color_tone",)
 
@@ -33,6 +34,7 @@ class OperationListCreateView(BaseListCreateView):
     search_fields = ("name",)
     fk_filters = ("is_active", )
     order_by = ("-id",)
+    fragment_cache = True
 
     create_fields = ("name", "default_price", "default_duration", "is_active", "notes")
 
@@ -49,6 +51,7 @@ class SizeListCreateView(BaseListCreateView):
     search_fields = ("name",)
     fk_filters = ( "is_active",)
     order_by = ("-id",)
+    fragment_cache = True
 
     create_fields = ("name", "is_active", "notes", )
 
@@ -66,6 +69,7 @@ class MaterialListView(BaseModelListView):
     fk_filters = ("group", "special_group")
     order_by = ("-id",)
     order_by_map = {"group": ("group__name",), "m_unit": ("m_unit__name",)}
+    keyset_pagination = True
 
     create_url_name = "info:material-create"
 
@@ -83,6 +87,7 @@ class MaterialGroupListCreateView(BaseListCreateView):
     search_fields = ("name", "code")
     fk_filters = ()
     order_by = ("-id",)
+    fragment_cache = True
 
     create_fields = ("name", "code")
 
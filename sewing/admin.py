@@ -1,8 +1,9 @@
 # sewing/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
 
 from . import models
+from .pricing import reprice_variants
 
 
 # ---------- Простые справочники ----------
@@ -138,6 +139,13 @@ class SewingProductModelAdmin(admin.ModelAdmin):
         }),
     )
 
+    actions = ("reprice_model_variants",)
+
+    @admin.action(description=_("Пересчитать цены вариантов"))
+    def reprice_model_variants(self, request, queryset):
+        changed = reprice_variants(models.ModelVariant.objects.filter(product_model__in=queryset))
+        self.message_user(request, _("Обновлено цен вариантов: %d") % changed, messages.SUCCESS)
+
     # безопасный вывод, даже если этих полей нет в модели
     @admin.display(description=_("Вес"))
     def weight_display(self, obj):
@@ -169,6 +177,12 @@ class ModelVariantAdmin(admin.ModelAdmin):
     inlines = (VariantMaterialInline, VariantAccessoryInline, VariantSizeInline, VariantOperationInline)
 
     readonly_fields = ("created_at", "updated_at")
+    actions = ("reprice",)
+
+    @admin.action(description=_("Пересчитать цены"))
+    def reprice(self, request, queryset):
+        changed = reprice_variants(queryset)
+        self.message_user(request, _("Обновлено цен вариантов: %d") % changed, messages.SUCCESS)
 
     # Поля для "Основное" есть почти всегда
     base_fieldsets = (
@@ -208,6 +222,37 @@ class ModelVariantAdmin(admin.ModelAdmin):
         return fieldsets
 
 
+@admin.register(models.VariantCostSnapshot)
+class VariantCostSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("variant", "materials", "accessories", "base", "profitability", "commission", "discount",
+                    "total", "calculated_at")
+    search_fields = ("variant__name", "variant__product_model__vendor_code")
+    list_select_related = ("variant__product_model",)
+    readonly_fields = [f.name for f in models.VariantCostSnapshot._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(models.VariantPriceHistory)
+class VariantPriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ("variant", "unit_price", "valid_from")
+    search_fields = ("variant__name", "variant__product_model__vendor_code")
+    list_select_related = ("variant__product_model",)
+    date_hierarchy = "valid_from"
+    readonly_fields = ("variant", "unit_price", "valid_from")
+
+    # история только дополняется
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # ---------- Отдельные регистраторы (если нужно работать поодиночке) ----------
 
 @admin.register(models.VariantMaterial)
@@ -289,6 +289,16 @@ class SewingOrderForm(forms.ModelForm):
         }
 
 
+class OrderImportForm(SmallWidgetMixin, forms.Form):
+    file = forms.FileField(label="Файл (CSV / XLSX)",
+                           widget=forms.ClearableFileInput(attrs={"accept": ".csv,.xlsx,.xlsm"}))
+    dry_run = forms.BooleanField(label="Только проверить", required=False, initial=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._smallify()
+
+
 class OrderItemForm(forms.ModelForm):
     class Meta:
         model = SewingOrderItem
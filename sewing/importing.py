@@ -0,0 +1,298 @@
+# sewing/importing.py
+"""
+Потоковый импорт заказа из CSV/XLSX: строка файла = позиция заказа.
+Колонки: артикул модели (vendor_code), вариант (name), дальше — по колонке на размер
+(заголовок = Size.name), опционально цена и примечание.
+
+Файл читается построчно (XLSX — openpyxl в режиме read_only), строки обрабатываются пачками:
+на пачку — один запрос вариантов по артикулам, один — их допустимых размеров (как в сетке
+размеров: VariantSize + активный Size), один bulk_create позиций и один bulk_create размеров.
+Справочник размеров — один запрос на весь файл. Память не зависит от длины файла.
+CSV — UTF-8 или cp1251; нечитаемый файл (кодировка, битый XLSX) — ImportFormatError.
+"""
+import codecs
+import csv
+import io
+import os
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from info.models import Size
+from .models import ModelVariant, SewingOrder, SewingOrderItem, SewingOrderSizeCount
+from .orders import allowed_sizes
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 200
+MAX_SIZE_QUANTITY = 1_000_000  # штук одного размера в позиции — больше только опечатка
+MAX_PRICE = Decimal("9999999999.99")  # DecimalField(max_digits=12, decimal_places=2)
+
+# заголовок колонки (в нижнем регистре) → поле
+COLUMN_ALIASES = {
+    "vendor_code": "vendor_code", "артикул": "vendor_code", "модель": "vendor_code",
+    "variant": "variant", "вариант": "variant",
+    "price": "price", "цена": "price", "unit_price": "price",
+    "notes": "notes", "примечание": "notes",
+    # итоговые колонки из клиентских таблиц пропускаем
+    "total": None, "итого": None, "всего": None,
+}
+
+
+class ImportFormatError(Exception):
+    """Файл не удаётся прочитать: неизвестный формат, нет обязательных колонок и т.п."""
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    lines: int = 0  # строк данных в файле
+    items: int = 0  # позиций (созданных или, при dry_run, готовых к созданию)
+    skipped: int = 0  # строк без единого количества — пропущены
+    pieces: int = 0  # штук по всем размерам
+    amount: Decimal = Decimal("0.00")
+    error_count: int = 0
+    errors: list = field(default_factory=list)  # (номер строки, текст) — первые MAX_REPORTED_ERRORS
+    order: SewingOrder = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error_count == 0
+
+    def error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+
+# ---------------------- Чтение файла ----------------------
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+CSV_ENCODINGS = ("utf-8-sig", "cp1251")  # cp1251 — выгрузка «CSV» из Excel на русской Windows
+
+
+def _csv_encoding(fileobj):
+    """Первая кодировка из CSV_ENCODINGS, в которой читается весь файл (проход кусками, без загрузки в память)."""
+    for encoding in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        fileobj.seek(0)
+        try:
+            for chunk in iter(lambda: fileobj.read(64 * 1024), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            fileobj.seek(0)
+        return encoding
+    raise ImportFormatError("Не удалось определить кодировку CSV. Сохраните файл в UTF-8.")
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding=_csv_encoding(fileobj), newline="")
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(text, dialect):
+            yield [_cell(v) for v in row]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"Не удалось прочитать CSV: {e}") from e
+    finally:
+        text.detach()  # не закрываем исходный файл вместе с обёрткой
+
+
+def _xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError as e:
+        raise ImportFormatError("Для импорта XLSX нужен пакет openpyxl.") from e
+
+    broken = (zipfile.BadZipFile, InvalidFileException, KeyError, zlib.error)
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except broken as e:
+        raise ImportFormatError("Файл не является корректным XLSX (повреждён или переименован).") from e
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield [_cell(v) for v in row]
+    except broken as e:
+        raise ImportFormatError("Файл XLSX повреждён.") from e
+    finally:
+        wb.close()
+
+
+def read_rows(fileobj, filename):
+    """Строки файла списками строк; формат — по расширению имени файла."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".csv":
+        return _csv_rows(fileobj)
+    if ext in {".xlsx", ".xlsm"}:
+        return _xlsx_rows(fileobj)
+    raise ImportFormatError(f"Неподдерживаемый формат файла: {ext or filename!r}. Нужен CSV или XLSX.")
+
+
+# ---------------------- Импорт ----------------------
+
+def _number(raw):
+    """Конечное Decimal из ячейки («2,5» тоже) или None — для мусора, NaN и бесконечностей."""
+    try:
+        number = Decimal(raw.replace(",", "."))
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+def _parse_header(header, sizes_by_name, report):
+    columns, size_columns = {}, {}
+    for idx, title in enumerate(header):
+        key = title.strip().lower()
+        if not key:
+            continue
+        if key in COLUMN_ALIASES:
+            if COLUMN_ALIASES[key]:
+                columns[COLUMN_ALIASES[key]] = idx
+        elif key in sizes_by_name:
+            size_columns[idx] = (sizes_by_name[key], title.strip())
+        else:
+            report.error(1, f"Колонка «{title}» не является размером из справочника.")
+    missing = {"vendor_code", "variant"} - set(columns)
+    if missing:
+        raise ImportFormatError(f"Нет обязательных колонок: {', '.join(sorted(missing))}.")
+    if not size_columns:
+        raise ImportFormatError("Нет ни одной колонки размеров.")
+    return columns, size_columns
+
+
+def import_order(fileobj, filename, order_fields: dict, dry_run=False, batch_size=IMPORT_BATCH_SIZE) -> ImportReport:
+    """
+    Создаёт SewingOrder по order_fields (customer, buyer, order_type, ...) и позиции из файла.
+    Всё в одной транзакции: при dry_run или любой ошибке в строках изменения откатываются,
+    отчёт при этом полный. ImportFormatError — если файл не удаётся разобрать вообще.
+    """
+    report = ImportReport(dry_run=dry_run)
+    rows = read_rows(fileobj, filename)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("Файл пустой.")
+    sizes_by_name = {name.strip().lower(): pk for pk, name in Size.objects.values_list("pk", "name")}
+    columns, size_columns = _parse_header(header, sizes_by_name, report)
+
+    with transaction.atomic():
+        order = SewingOrder.objects.create(**order_fields)
+        batch = []
+        for line_no, row in enumerate(rows, start=2):
+            if not any(row):
+                continue
+            report.lines += 1
+            batch.append((line_no, row))
+            if len(batch) >= batch_size:
+                _import_batch(order, batch, columns, size_columns, report)
+                batch = []
+        if batch:
+            _import_batch(order, batch, columns, size_columns, report)
+
+        if report.lines == 0:
+            report.error(None, "В файле нет строк с данными.")
+        if dry_run or not report.ok:
+            transaction.set_rollback(True)
+            return report
+
+        # позиции создавались bulk_create (без save()) — итоги заказа одним UPDATE
+        SewingOrder.apply_totals_delta(order.pk, report.pieces, report.amount)
+        order.total_qty, order.total_amount = report.pieces, report.amount
+        report.order = order
+    return report
+
+
+def _import_batch(order, batch, columns, size_columns, report):
+    def value(row, name):
+        idx = columns.get(name)
+        return row[idx] if idx is not None and idx < len(row) else ""
+
+    codes = {value(row, "vendor_code") for _, row in batch}
+    variants = {
+        (code, name.strip().lower()): (pk, price)
+        for pk, code, name, price in ModelVariant.objects
+        .filter(product_model__vendor_code__in=codes)
+        .values_list("pk", "product_model__vendor_code", "name", "unit_price")
+    }
+    # те же правила, что у сетки размеров (save_order_sizes): только активные размеры варианта
+    allowed = allowed_sizes({pk for pk, _price in variants.values()})
+
+    items, counts = [], []
+    for line_no, row in batch:
+        code, variant_name = value(row, "vendor_code"), value(row, "variant")
+        found = variants.get((code, variant_name.lower()))
+        if found is None:
+            report.error(line_no, f"Вариант «{code} / {variant_name}» не найден.")
+            continue
+        variant_id, price = found
+
+        raw_price = value(row, "price")
+        if raw_price:
+            price = _number(raw_price)
+            if price is None or not 0 <= price <= MAX_PRICE:
+                report.error(line_no, f"Некорректная цена «{raw_price}».")
+                continue
+            price = price.quantize(Decimal("0.01"))
+
+        quantities, bad = {}, False
+        for idx, (size_id, size_name) in size_columns.items():
+            raw = row[idx] if idx < len(row) else ""
+            if not raw:
+                continue
+            number = _number(raw)
+            if number is None or number != number.to_integral_value():
+                report.error(line_no, f"Некорректное количество «{raw}».")
+                bad = True
+                break
+            if number < 0:
+                report.error(line_no, f"Отрицательное количество «{raw}».")
+                bad = True
+                break
+            if number > MAX_SIZE_QUANTITY:
+                report.error(line_no, f"Слишком большое количество «{raw}».")
+                bad = True
+                break
+            qty = int(number)
+            if qty and size_id not in allowed.get(variant_id, ()):
+                report.error(line_no, f"Размер «{size_name}» недоступен для варианта «{code} / {variant_name}».")
+                bad = True
+                break
+            if qty:
+                quantities[size_id] = qty
+        if bad:
+            continue
+        if not quantities:
+            report.skipped += 1
+            continue
+
+        qty = sum(quantities.values())
+        report.items += 1
+        report.pieces += qty
+        report.amount += price * qty
+        items.append(SewingOrderItem(order=order, variant_id=variant_id, quantity=qty, unit_price=price,
+                                     notes=value(row, "notes")[:255]))
+        counts.append(quantities)
+
+    if report.ok and items and not report.dry_run:
+        SewingOrderItem.objects.bulk_create(items)
+        SewingOrderSizeCount.objects.bulk_create(
+            SewingOrderSizeCount(item_id=item.pk, size_id=size_id, quantity=qty)
+            for item, quantities in zip(items, counts)
+            for size_id, qty in quantities.items()
+        )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sewing.importing import import_order, ImportFormatError
+from sewing.models import SewingOrder
+
+
+class Command(BaseCommand):
+    help = ("Импорт заказа из CSV/XLSX: артикул, вариант и кол-во по колонкам размеров. "
+            "Пример: import_order order.xlsx --customer 5 --dry-run")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу .csv / .xlsx")
+        parser.add_argument("--customer", type=int, required=True, help="ID заказчика (info.Firm)")
+        parser.add_argument("--buyer", type=int, default=None, help="ID покупателя (info.Firm)")
+        parser.add_argument("--order-type", default=SewingOrder.OrderType.PRODUCTION,
+                            choices=SewingOrder.OrderType.values)
+        parser.add_argument("--shipment-date", default=None, help="Дата отгрузки, ГГГГ-ММ-ДД")
+        parser.add_argument("--dry-run", action="store_true", help="Только проверить файл, ничего не записывать")
+
+    def handle(self, *args, **options):
+        order_fields = {
+            "customer_id": options["customer"],
+            "buyer_id": options["buyer"],
+            "order_type": options["order_type"],
+            "shipment_date": options["shipment_date"],
+        }
+        try:
+            with open(options["path"], "rb") as f:
+                report = import_order(f, options["path"], order_fields, dry_run=options["dry_run"])
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for line_no, message in report.errors:
+            self.stdout.write(self.style.ERROR(f"Строка {line_no or '—'}: {message}"))
+        if report.error_count > len(report.errors):
+            self.stdout.write(self.style.ERROR(f"… и ещё ошибок: {report.error_count - len(report.errors)}"))
+
+        summary = (f"строк: {report.lines}, позиций: {report.items}, пропущено пустых: {report.skipped}, "
+                   f"штук: {report.pieces}, сумма: {report.amount}")
+        if not report.ok:
+            raise CommandError(f"Импорт не выполнен, ошибок: {report.error_count} ({summary}).")
+        if report.dry_run:
+            self.stdout.write(self.style.WARNING(f"Проверка пройдена, ничего не записано ({summary})."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Готово! Создан заказ #{report.order.pk} ({summary})."))
@@ -0,0 +1,42 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from sewing.models import SewingOrder
+from sewing.mrp import explode_orders, open_orders
+
+
+class Command(BaseCommand):
+    help = "Потребность в материалах и аксессуарах по заказам (по умолчанию — по всем открытым)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order", type=int, nargs="*", dest="orders", default=[], help="ID заказов")
+        parser.add_argument("--csv", action="store_true", help="Вывести результат в CSV")
+
+    def handle(self, *args, **options):
+        orders = SewingOrder.objects.filter(pk__in=options["orders"]) if options["orders"] else open_orders()
+        started = time.perf_counter()
+        mrp = explode_orders(orders)
+        elapsed = time.perf_counter() - started
+
+        if options["csv"]:
+            w = csv.writer(self.stdout)
+            w.writerow(["kind", "code", "title", "color", "quantity", "unit", "amount"])
+            for r in mrp.materials:
+                w.writerow(["material", r["code"], r["title"], r["color"] or "", r["quantity"], r["unit"], r["amount"]])
+            for r in mrp.accessories:
+                w.writerow(["accessory", r["code"], r["title"], "", r["quantity"], r["unit"], r["amount"]])
+            return
+
+        self.stdout.write("Материалы:")
+        for r in mrp.materials:
+            self.stdout.write(f"  {r['code']:<16} {r['title'][:40]:<40} {r['color'] or '—':<16} "
+                              f"{r['quantity']:>14} {r['unit']:<6} {r['amount']:>12}")
+        self.stdout.write("Аксессуары:")
+        for r in mrp.accessories:
+            self.stdout.write(f"  {r['code']:<16} {r['title'][:40]:<40} {'':<16} "
+                              f"{r['quantity']:>14} {r['unit']:<6} {r['amount']:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Изделий: {mrp.pieces}, стоимость материалов: {mrp.amount} ({elapsed:.3f} c)."
+        ))
@@ -0,0 +1,64 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sewing.models import ModelVariant
+from sewing.whatif import CostingFrame, PERCENT_FIELDS
+
+
+def _pairs(values, sep, key_type):
+    out = {}
+    for raw in values:
+        key, _, val = raw.partition(sep)
+        if not val:
+            raise CommandError(f"Ожидается KEY{sep}VALUE, получено: {raw}")
+        try:
+            key = key_type(key)
+            val = Decimal(val.replace(",", "."))
+        except (ValueError, InvalidOperation):
+            raise CommandError(f"Некорректное значение: {raw}")
+        if not val.is_finite():
+            raise CommandError(f"Некорректное значение: {raw}")
+        out[key] = val
+    return out
+
+
+class Command(BaseCommand):
+    help = ("What-if по ценам вариантов без записи в БД. Пример: "
+            "--group 12:8 --set commission=3 (группа 12 дороже на 8%, комиссия 3%).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--material", nargs="*", default=[], help="MATERIAL_ID:PCT — изменение цены материала, %")
+        parser.add_argument("--group", nargs="*", default=[], help="GROUP_ID:PCT — изменение цены группы материалов, %")
+        parser.add_argument("--price", nargs="*", default=[], help="MATERIAL_ID:PRICE — новая цена материала")
+        parser.add_argument("--set", nargs="*", default=[], dest="percents",
+                            help=f"FIELD=VALUE, FIELD из: {', '.join(PERCENT_FIELDS)}")
+        parser.add_argument("--model", type=int, nargs="*", dest="models", default=[], help="ID моделей одежды")
+        parser.add_argument("--top", type=int, default=20, help="Сколько вариантов с наибольшим изменением показать")
+
+    def handle(self, *args, **options):
+        qs = ModelVariant.objects.all()
+        if options["models"]:
+            qs = qs.filter(product_model_id__in=options["models"])
+
+        frame = CostingFrame(qs)
+        try:
+            result = frame.simulate(
+                material_pct=_pairs(options["material"], ":", int),
+                group_pct=_pairs(options["group"], ":", int),
+                material_prices=_pairs(options["price"], ":", int),
+                percents=_pairs(options["percents"], "=", str),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        s = result.summary()
+        self.stdout.write(
+            f"Вариантов: {s['variants']}, изменится: {s['changed']}. "
+            f"Сумма цен: {s['baseline_total']} → {s['simulated_total']} ({s['delta_total']:+})"
+        )
+
+        rows = sorted(result.rows(), key=lambda r: abs(r[3]), reverse=True)[:options["top"]]
+        for vid, base, new, delta in rows:
+            if delta:
+                self.stdout.write(f"  #{vid}: {base} → {new} ({delta:+})")
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from sewing.models import SewingOrder, SewingOrderItem
+
+
+def _orders_with_calc_totals(qs):
+    items = SewingOrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    return qs.order_by("pk").annotate(
+        calc_qty=Coalesce(Subquery(items.annotate(s=Sum("quantity")).values("s")), 0,
+                          output_field=IntegerField()),
+        calc_amount=Coalesce(Subquery(items.annotate(s=Sum(F("quantity") * F("unit_price"))).values("s")),
+                             Decimal("0.00"), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+
+
+class Command(BaseCommand):
+    help = ("Сверяет total_qty/total_amount заказов с позициями и исправляет расхождения "
+            "(итоги обычно ведутся дельтами при сохранении/удалении позиций).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order", type=int, nargs="*", dest="orders", default=[],
+                            help="ID заказов (по умолчанию — все)")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только показать расхождения, ничего не менять")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        qs = SewingOrder.objects.all()
+        if options["orders"]:
+            qs = qs.filter(pk__in=options["orders"])
+
+        checked, fixed = 0, []
+        with transaction.atomic():
+            batch = []
+            for order in _orders_with_calc_totals(qs).iterator(chunk_size=options["batch_size"]):
+                checked += 1
+                order.calc_amount = Decimal(order.calc_amount).quantize(Decimal("0.01"))
+                if order.total_qty == order.calc_qty and order.total_amount == order.calc_amount:
+                    continue
+                self.stdout.write(f"Заказ #{order.pk}: кол-во {order.total_qty} → {order.calc_qty}, "
+                                  f"сумма {order.total_amount} → {order.calc_amount}")
+                order.total_qty, order.total_amount = order.calc_qty, order.calc_amount
+                order.updated_at = timezone.now()
+                batch.append(order)
+                if len(batch) >= options["batch_size"]:
+                    fixed += self._save(batch, options["dry_run"])
+                    batch = []
+            fixed += self._save(batch, options["dry_run"])
+
+            if not options["dry_run"] and fixed:
+                # проверка: после записи расхождений быть не должно
+                left = [o.pk for o in _orders_with_calc_totals(qs.filter(pk__in=[o.pk for o in fixed]))
+                        if o.total_qty != o.calc_qty or o.total_amount != o.calc_amount]
+                if left:
+                    raise CommandError(f"Итоги не сошлись после пересборки: {left}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Проверено заказов: {checked}, расхождений: {len(fixed)}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Готово! Проверено заказов: {checked}, исправлено: {len(fixed)}."))
+
+    @staticmethod
+    def _save(batch, dry_run):
+        if batch and not dry_run:
+            SewingOrder.objects.bulk_update(batch, ["total_qty", "total_amount", "updated_at"])
+        return batch
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sewing.models import ModelVariant
+from sewing.pricing import reprice_variants
+
+
+class Command(BaseCommand):
+    help = "Массово пересчитывает unit_price вариантов (все или по указанным моделям/вариантам)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", type=int, nargs="*", dest="models", default=[],
+                            help="ID моделей одежды (SewingProductModel)")
+        parser.add_argument("--variant", type=int, nargs="*", dest="variants", default=[],
+                            help="ID вариантов")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        qs = ModelVariant.objects.all()
+        if options["models"]:
+            qs = qs.filter(product_model_id__in=options["models"])
+        if options["variants"]:
+            qs = qs.filter(pk__in=options["variants"])
+
+        changed = reprice_variants(qs)
+        self.stdout.write(self.style.SUCCESS(f"Готово! Обновлено цен: {changed}."))
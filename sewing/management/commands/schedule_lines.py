@@ -0,0 +1,42 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sewing.scheduling import build_schedule, schedule_params, SHIFT_SECONDS
+
+
+class Command(BaseCommand):
+    help = "План пошива открытых заказов по активным линиям (по трудоёмкости операций и числу рабочих)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", default=None, help="Дата начала, ГГГГ-ММ-ДД (по умолчанию — сегодня)")
+        parser.add_argument("--hours", type=float, default=SHIFT_SECONDS / 3600, help="Длина смены, ч")
+        parser.add_argument("--efficiency", type=int, default=100, help="Выработка, %%")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else date.today()
+        except ValueError:
+            raise CommandError("--start: нужна дата ГГГГ-ММ-ДД")
+        try:
+            shift_seconds, factor = schedule_params(options["hours"], options["efficiency"])
+        except ValueError as e:
+            raise CommandError(f"--hours/--efficiency: {e}")
+
+        started = time.perf_counter()
+        schedule = build_schedule(start=start, shift_seconds=shift_seconds, efficiency=factor)
+        elapsed = time.perf_counter() - started
+
+        for r in schedule.line_summary():
+            self.stdout.write(f"{str(r['line'])[:40]:<40} заказов: {r['orders']:>4}  часов: {r['hours']:>9}  "
+                              f"дней: {r['days']:>4}  загрузка: {r['utilization']:>3}%  занята до {r['busy_until']}")
+        for a in schedule.late:
+            self.stdout.write(self.style.WARNING(
+                f"Заказ #{a.order.pk}: окончание {a.finish}, отгрузка {a.order.shipment_date} (+{a.late_days} дн.)"
+            ))
+        for order, reason in schedule.unplanned:
+            self.stdout.write(self.style.WARNING(f"Заказ #{order.pk} не запланирован: {reason}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Запланировано заказов: {len(schedule.assignments)}, с опозданием: {len(schedule.late)} ({elapsed:.3f} c)."
+        ))
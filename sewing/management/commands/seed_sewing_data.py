@@ -291,8 +291,7 @@ class Command(BaseCommand):
 
         # === Пересчитать unit_price у вариантов после добавления материалов/аксессуаров ===
         if ModelVariant:
-            for v in ModelVariant.objects.all():
-                v.unit_price = v.recalc_price()
-                v.save(update_fields=["unit_price"])
+            from sewing.pricing import reprice_variants
+            reprice_variants(ModelVariant.objects.all())
 
         self.stdout.write(self.style.SUCCESS(f"Готово! Создано/дозаполнено ~{created_total} объектов."))
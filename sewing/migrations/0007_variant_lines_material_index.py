@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('info', '0002_material_mat_title_trgm_material_mat_code_trgm'),
+        ('sewing', '0006_sewingordersizecount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='variantaccessory',
+            index=models.Index(fields=['accessory', 'variant'], name='va_accessory_variant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variantmaterial',
+            index=models.Index(fields=['material', 'variant'], name='vm_material_variant_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sewing', '0007_variant_lines_material_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantCostSnapshot',
+            fields=[
+                ('variant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cost_snapshot', serialize=False, to='sewing.modelvariant', verbose_name='Вариант')),
+                ('materials', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Материалы')),
+                ('accessories', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Аксессуары')),
+                ('cutting_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Крой')),
+                ('transfer_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Трансфер')),
+                ('print_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Печать')),
+                ('embroidery_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Вышивка')),
+                ('base', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Себестоимость')),
+                ('sewing_loss', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Потеря швейки')),
+                ('other_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Прочие расходы')),
+                ('profitability', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Рентабельность')),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Комиссия')),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Скидка')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Цена за изделие')),
+                ('calculated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Разбивка цены варианта',
+                'verbose_name_plural': 'Разбивки цен вариантов',
+                'db_table': 'sewing_variant_cost_snapshot',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_price_history(apps, schema_editor):
+    # стартовая точка истории — текущие цены вариантов на момент миграции
+    ModelVariant = apps.get_model("sewing", "ModelVariant")
+    VariantPriceHistory = apps.get_model("sewing", "VariantPriceHistory")
+    now = django.utils.timezone.now()
+    rows = ModelVariant.objects.order_by().values_list("pk", "unit_price").iterator(chunk_size=2000)
+    batch = []
+    for pk, price in rows:
+        batch.append(VariantPriceHistory(variant_id=pk, unit_price=price, valid_from=now))
+        if len(batch) >= 2000:
+            VariantPriceHistory.objects.bulk_create(batch)
+            batch = []
+    VariantPriceHistory.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sewing', '0008_variantcostsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Цена за изделие')),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Действует с')),
+                ('variant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='sewing.modelvariant', verbose_name='Вариант')),
+            ],
+            options={
+                'verbose_name': 'История цены варианта',
+                'verbose_name_plural': 'История цен вариантов',
+                'db_table': 'sewing_variant_price_history',
+                'indexes': [models.Index(fields=['variant', 'valid_from'], name='vph_variant_valid_from_idx')],
+            },
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
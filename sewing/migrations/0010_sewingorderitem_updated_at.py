@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sewing', '0009_variantpricehistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sewingorderitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Обновлено'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+AMOUNT_FIELDS = ("materials", "accessories", "cutting_price", "transfer_price", "print_price", "embroidery_price",
+                 "base", "sewing_loss", "other_expenses", "profitability", "commission", "discount", "total")
+
+
+def backfill_cost_snapshots(apps, schema_editor):
+    # разбивка для вариантов, которые ещё не пересчитывались после 0008 — по той же формуле,
+    # что reprice_variants() (цену варианта не трогаем: только снимок)
+    from sewing.models import calc_cost_breakdown
+
+    ModelVariant = apps.get_model("sewing", "ModelVariant")
+    VariantMaterial = apps.get_model("sewing", "VariantMaterial")
+    VariantAccessory = apps.get_model("sewing", "VariantAccessory")
+    VariantCostSnapshot = apps.get_model("sewing", "VariantCostSnapshot")
+
+    variants = (ModelVariant.objects
+                .filter(cost_snapshot__isnull=True)
+                .select_related("product_model")
+                .order_by("pk"))
+    batch = []
+    for variant in variants.iterator(chunk_size=BATCH_SIZE):
+        batch.append(variant)
+        if len(batch) >= BATCH_SIZE:
+            _write_batch(batch, VariantMaterial, VariantAccessory, VariantCostSnapshot, calc_cost_breakdown)
+            batch = []
+    if batch:
+        _write_batch(batch, VariantMaterial, VariantAccessory, VariantCostSnapshot, calc_cost_breakdown)
+
+
+def _write_batch(variants, VariantMaterial, VariantAccessory, VariantCostSnapshot, calc_cost_breakdown):
+    ids = [v.pk for v in variants]
+    materials, accessories = defaultdict(Decimal), defaultdict(Decimal)
+    for variant_id, price, count, loss in (VariantMaterial.objects.filter(variant_id__in=ids)
+                                           .values_list("variant_id", "price", "count", "loss")):
+        materials[variant_id] += Decimal(price or 0) * Decimal(count or 0) * (1 + Decimal(loss or 0) / 100)
+    for variant_id, price, count in (VariantAccessory.objects.filter(variant_id__in=ids)
+                                     .values_list("variant_id", "price", "count")):
+        accessories[variant_id] += Decimal(price or 0) * Decimal(count or 0)
+
+    snapshots = []
+    for v in variants:
+        breakdown = calc_cost_breakdown(v.product_model, materials[v.pk], accessories[v.pk])
+        amounts = {f: Decimal(breakdown[f]).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) for f in AMOUNT_FIELDS}
+        snapshots.append(VariantCostSnapshot(variant_id=v.pk, **amounts))
+    VariantCostSnapshot.objects.bulk_create(snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sewing', '0010_sewingorderitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_cost_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.db import models
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Subquery
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from core.models import BaseModel
@@ -50,6 +51,10 @@ class OrderStatus(models.IntegerChoices):
     ACCEPTED = 10, _("Принят")
 
 
+# заказы в этих статусах не планируются и не требуют материалов
+CLOSED_ORDER_STATUSES = (OrderStatus.DONE, OrderStatus.CANCELED, OrderStatus.ABORTED)
+
+
 class SewingFabricType(models.Model):
     name = models.CharField(_('Тип полотна'), max_length=128)
 
@@ -163,6 +168,47 @@ def D(x) -> Decimal:
     return x if isinstance(x, Decimal) else Decimal(str(x))
 
 
+def calc_cost_breakdown(spm, materials_cost, accessories_cost) -> dict:
+    """
+    Разбивка цены за изделие по готовым суммам материалов/аксессуаров и накруткам модели.
+    Общая формула для ModelVariant.recalc_price() и массового пересчёта (sewing.pricing).
+    """
+    # 1) Считаем реальную «себестоимость» варианта
+    parts = {
+        "materials": D(materials_cost),
+        "accessories": D(accessories_cost),
+        # 2) Базовые составляющие из модели
+        "cutting_price": D(spm.cutting_price or 0),
+        "transfer_price": D(spm.transfer_price or 0),
+        "print_price": D(spm.print_price or 0),
+        "embroidery_price": D(spm.embroidery_price or 0),
+    }
+    base = sum(parts.values(), D("0"))
+
+    # 3) Накрутки и скидка
+    def pct(p):
+        return base * (D(p or 0) / D("100"))
+
+    parts["base"] = base
+    parts["sewing_loss"] = pct(spm.sewing_loss_percent)  # потери пошива
+    parts["other_expenses"] = pct(spm.other_expenses_percent)  # прочие расходы
+    parts["profitability"] = pct(spm.profitability)  # рентабельность
+    parts["commission"] = pct(spm.commission)  # комиссия
+
+    total = base + parts["sewing_loss"] + parts["other_expenses"] + parts["profitability"] + parts["commission"]
+
+    # скидка в %
+    parts["discount"] = total * (D(spm.discount or 0) / D("100"))
+    total -= parts["discount"]
+
+    parts["total"] = total.quantize(DEC2, rounding=ROUND_HALF_UP)
+    return parts
+
+
+def calc_unit_price(spm, materials_cost, accessories_cost) -> Decimal:
+    return calc_cost_breakdown(spm, materials_cost, accessories_cost)["total"]
+
+
 class SewingProductModel(BaseModel):
     name = models.CharField(_("Наименование модели"), max_length=128)
     vendor_code = models.CharField(_("Артикул"), max_length=128)
@@ -258,33 +304,18 @@ class ModelVariant(BaseModel):
             total += price_per_item * qty_per_item
         return total
 
-    def recalc_price(self) -> Decimal:
-        spm = self.product_model
-        # 1) Считаем реальную «себестоимость» варианта
-        base = D("0")
-        base += self._materials_cost()
-        base += self._accessories_cost()
-
-        # 2) Базовые составляющие из модели
-        base += D(spm.cutting_price or 0)
-        base += D(spm.transfer_price or 0)
-        base += D(spm.print_price or 0)
-        base += D(spm.embroidery_price or 0)
-
-        # 3) Накрутки и скидка
-        def pct(p):
-            return base * (D(p or 0) / D("100"))
-
-        total = base
-        total += pct(spm.sewing_loss_percent)  # потери пошива
-        total += pct(spm.other_expenses_percent)  # прочие расходы
-        total += pct(spm.profitability)  # рентабельность
-        total += pct(spm.commission)  # комиссия
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # цена на момент загрузки — чтобы писать в историю только реальные изменения
+        instance._loaded_unit_price = instance.__dict__.get("unit_price")
+        return instance
 
-        # скидка в %
-        total -= total * (D(spm.discount or 0) / D("100"))
+    def recalc_breakdown(self) -> dict:
+        return calc_cost_breakdown(self.product_model, self._materials_cost(), self._accessories_cost())
 
-        return total.quantize(DEC2, rounding=ROUND_HALF_UP)
+    def recalc_price(self) -> Decimal:
+        return self.recalc_breakdown()["total"]
 
     def save(self, *args, **kwargs):
         # автоподстановка имени для образца при создании
@@ -295,14 +326,109 @@ class ModelVariant(BaseModel):
         # если сохраняют только unit_price — не пересчитываем
         update_fields = kwargs.get("update_fields")
         if update_fields and set(update_fields) <= {"unit_price"}:
-            return super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+            if self.unit_price != getattr(self, "_loaded_unit_price", None):
+                VariantPriceHistory.record({self.pk: self.unit_price})
+            self._loaded_unit_price = self.unit_price
+            return
 
         # обычный путь: сохраняем, потом пересчитываем и обновляем единичным UPDATE
         super().save(*args, **kwargs)
-        new_price = self.recalc_price()
+        breakdown = self.recalc_breakdown()
+        new_price = breakdown["total"]
         if new_price != self.unit_price:
             type(self).objects.filter(pk=self.pk).update(unit_price=new_price)
             self.unit_price = new_price
+        if is_create or new_price != getattr(self, "_loaded_unit_price", None):
+            VariantPriceHistory.record({self.pk: new_price})
+        self._loaded_unit_price = new_price
+        VariantCostSnapshot.objects.update_or_create(
+            variant_id=self.pk, defaults=VariantCostSnapshot.fields_from_breakdown(breakdown)
+        )
+
+
+class VariantCostSnapshot(models.Model):
+    """
+    Разбивка последнего пересчёта цены варианта (перезаписывается при каждом пересчёте).
+    Списки/отчёты читают её одним join вместо recalc_price() по каждой строке.
+    """
+    variant = models.OneToOneField(ModelVariant, on_delete=models.CASCADE, primary_key=True,
+                                   related_name="cost_snapshot", verbose_name=_("Вариант"))
+    materials = models.DecimalField(_("Материалы"), max_digits=12, decimal_places=2, default=0)
+    accessories = models.DecimalField(_("Аксессуары"), max_digits=12, decimal_places=2, default=0)
+    cutting_price = models.DecimalField(_("Крой"), max_digits=12, decimal_places=2, default=0)
+    transfer_price = models.DecimalField(_("Трансфер"), max_digits=12, decimal_places=2, default=0)
+    print_price = models.DecimalField(_("Печать"), max_digits=12, decimal_places=2, default=0)
+    embroidery_price = models.DecimalField(_("Вышивка"), max_digits=12, decimal_places=2, default=0)
+    base = models.DecimalField(_("Себестоимость"), max_digits=12, decimal_places=2, default=0)
+    sewing_loss = models.DecimalField(_("Потеря швейки"), max_digits=12, decimal_places=2, default=0)
+    other_expenses = models.DecimalField(_("Прочие расходы"), max_digits=12, decimal_places=2, default=0)
+    profitability = models.DecimalField(_("Рентабельность"), max_digits=12, decimal_places=2, default=0)
+    commission = models.DecimalField(_("Комиссия"), max_digits=12, decimal_places=2, default=0)
+    discount = models.DecimalField(_("Скидка"), max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(_("Цена за изделие"), max_digits=12, decimal_places=2, default=0)
+    calculated_at = models.DateTimeField(_("Пересчитано"), auto_now=True)
+
+    AMOUNT_FIELDS = ("materials", "accessories", "cutting_price", "transfer_price", "print_price", "embroidery_price",
+                     "base", "sewing_loss", "other_expenses", "profitability", "commission", "discount", "total")
+
+    class Meta:
+        db_table = "sewing_variant_cost_snapshot"
+        verbose_name = _("Разбивка цены варианта")
+        verbose_name_plural = _("Разбивки цен вариантов")
+
+    def __str__(self):
+        return f"{self.variant_id}: {self.total}"
+
+    @classmethod
+    def fields_from_breakdown(cls, breakdown: dict) -> dict:
+        return {f: D(breakdown[f]).quantize(DEC2, rounding=ROUND_HALF_UP) for f in cls.AMOUNT_FIELDS}
+
+
+class VariantPriceHistory(models.Model):
+    """
+    История цен варианта: только добавление, одна строка на реальное изменение unit_price.
+    Без BaseModel — строк много, аудит-поля здесь не нужны.
+    """
+    variant = models.ForeignKey(ModelVariant, on_delete=models.CASCADE, related_name="price_history",
+                                verbose_name=_("Вариант"), db_index=False)  # покрыт индексом (variant, valid_from)
+    unit_price = models.DecimalField(_("Цена за изделие"), max_digits=12, decimal_places=2)
+    valid_from = models.DateTimeField(_("Действует с"), default=timezone.now)
+
+    class Meta:
+        db_table = "sewing_variant_price_history"
+        verbose_name = _("История цены варианта")
+        verbose_name_plural = _("История цен вариантов")
+        indexes = [
+            models.Index(fields=["variant", "valid_from"], name="vph_variant_valid_from_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id}: {self.unit_price} с {self.valid_from:%d.%m.%Y %H:%M}"
+
+    @classmethod
+    def record(cls, prices: dict, valid_from=None):
+        """{variant_id: новая цена} → одна вставка. Вызывающий отвечает за то, что цена реально изменилась."""
+        if not prices:
+            return
+        valid_from = valid_from or timezone.now()
+        cls.objects.bulk_create(
+            cls(variant_id=pk, unit_price=price, valid_from=valid_from) for pk, price in prices.items()
+        )
+
+    @staticmethod
+    def price_at(variant_ref, when_ref):
+        """
+        Подзапрос «цена варианта на момент» (as-of) для annotate(), одним запросом на весь список:
+            VariantPriceHistory.price_at(OuterRef("variant"), OuterRef("order__created_at"))
+        """
+        return Subquery(
+            VariantPriceHistory.objects
+            .filter(variant=variant_ref, valid_from__lte=when_ref)
+            .order_by("-valid_from", "-pk")
+            .values("unit_price")[:1],
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
 
 
 class VariantMaterial(BaseModel):
@@ -328,6 +454,10 @@ class VariantMaterial(BaseModel):
         db_table = "sewing_variant_materials"
         verbose_name = _("Материал варианта")
         verbose_name_plural = _("Материалы варианта")
+        indexes = [
+            # обратный индекс материал → варианты (пересчёт при смене цены материала)
+            models.Index(fields=("material", "variant"), name="vm_material_variant_idx"),
+        ]
 
     def __str__(self):
         return f"{self.variant.product_model.vendor_code} - {self.variant.name} - {self.material.title}"
@@ -347,6 +477,9 @@ class VariantAccessory(BaseModel):
         db_table = "sewing_variant_accessories"
         verbose_name = _("Аксессуар варианта")
         verbose_name_plural = _("Аксессуары варианта")
+        indexes = [
+            models.Index(fields=("accessory", "variant"), name="va_accessory_variant_idx"),
+        ]
 
     def __str__(self):
         return f"{self.accessory.title} — {self.count}"
@@ -458,7 +591,7 @@ class SewingOrder(BaseModel):
     def __str__(self):
         return f"Заказ #{self.pk or '—'} от {self.customer}"
 
-    # пересчёт итогов из позиций
+    # пересчёт итогов из позиций (полный — для сверки, см. rebuild_order_totals)
     def recompute_totals(self, save=True):
         agg = self.items.aggregate(
             qty=Sum("quantity"),
@@ -469,6 +602,17 @@ class SewingOrder(BaseModel):
         if save:
             super().save(update_fields=("total_qty", "total_amount", "updated_at"))
 
+    @classmethod
+    def apply_totals_delta(cls, order_id, qty, amount):
+        """Атомарный сдвиг итогов заказа одним UPDATE с F(), без перечитывания позиций."""
+        if not order_id or (not qty and not amount):
+            return
+        cls.objects.filter(pk=order_id).update(
+            total_qty=F("total_qty") + qty,
+            total_amount=F("total_amount") + amount,
+            updated_at=timezone.now(),
+        )
+
     # легкий guard: не даём пересохранять заказ с отрицательными итогами
     def clean(self):
         super().clean()
@@ -496,6 +640,8 @@ class SewingOrderItem(models.Model):
     )
 
     notes = models.CharField(_("Примечание"), max_length=255, blank=True)
+    # для условных GET списка позиций (ETag/Last-Modified); bulk_update/save(update_fields) — передавать явно
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Обновлено")
 
     class Meta:
         verbose_name = _("Позиция заказа")
@@ -525,6 +671,21 @@ class SewingOrderItem(models.Model):
             from django.core.exceptions import ValidationError
             raise ValidationError({"variant": _("Укажите вариант модели.")})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_totals()
+        return instance
+
+    def _remember_totals(self):
+        # вклад позиции в итоги заказа, каким он записан в БД
+        d = self.__dict__
+        self._loaded_totals = (d.get("order_id"), d.get("quantity"), d.get("unit_price"))
+
+    @property
+    def totals_contribution(self):
+        return self.quantity or 0, (self.unit_price or Decimal("0.00")) * (self.quantity or 0)
+
     def save(self, *args, **kwargs):
         # если цена не задана — берём текущую цену варианта (если есть)
         if (self.unit_price is None or self.unit_price == 0) and getattr(self, "variant", None):
@@ -533,8 +694,27 @@ class SewingOrderItem(models.Model):
             if price is not None:
                 self.unit_price = price
         super().save(*args, **kwargs)
-        # после сохранения позиции — пересчитаем итоги заказа
-        self.order.recompute_totals(save=True)
+
+        # итоги заказа двигаем на разницу: O(1) вместо агрегата по всем позициям
+        qty, amount = self.totals_contribution
+        old_order_id, old_qty, old_price = getattr(self, "_loaded_totals", (None, None, None))
+        if old_qty is None or old_price is None:
+            # новая позиция либо загружена через only()/defer() — старый вклад неизвестен
+            if old_order_id is not None:
+                self.order.recompute_totals(save=True)
+                self._remember_totals()
+                return
+            old_qty, old_price = 0, Decimal("0.00")
+        old_amount = old_price * old_qty
+        if old_order_id and old_order_id != self.order_id:
+            SewingOrder.apply_totals_delta(old_order_id, -old_qty, -old_amount)
+            old_qty, old_amount = 0, Decimal("0.00")
+        SewingOrder.apply_totals_delta(self.order_id, qty - old_qty, amount - old_amount)
+        if type(self).order.is_cached(self):
+            # держим в памяти то же, что в БД, чтобы последующий order.save() не затёр итоги
+            self.order.total_qty += qty - old_qty
+            self.order.total_amount += amount - old_amount
+        self._remember_totals()
 
 
 class SewingOrderSizeCount(models.Model):
@@ -0,0 +1,87 @@
+# sewing/mrp.py
+"""
+Потребность в материалах (MRP) по заказам: сколько кг каждого материала (в разрезе цвета)
+и сколько штук каждого аксессуара уходит на набор заказов.
+
+Кол-во изделий берётся из сетки размеров (SewingOrderSizeCount); у позиции без размеров —
+её quantity. Расчёт — два сгруппированных запроса (материалы и аксессуары): строки
+спецификации соединяются с позициями заказов и их размерами, сумма считается в БД.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import SewingOrder, SewingOrderItem, SewingOrderSizeCount, VariantMaterial, VariantAccessory, \
+    CLOSED_ORDER_STATUSES
+
+_SQL_DEC = DecimalField(max_digits=20, decimal_places=6)
+_QTY = Decimal("0.001")
+
+
+@dataclass
+class MRPResult:
+    pieces: int = 0  # изделий во всех заказах
+    materials: list = field(default_factory=list)  # dict: material_id, code, title, unit, color, quantity, amount
+    accessories: list = field(default_factory=list)  # dict: material_id, code, title, unit, quantity, amount
+
+    @property
+    def amount(self) -> Decimal:
+        return sum((r["amount"] for r in self.materials + self.accessories), Decimal("0.00"))
+
+
+def open_orders():
+    return SewingOrder.objects.exclude(status__in=CLOSED_ORDER_STATUSES)
+
+
+def _rows(qs, group_by, names, line_qty):
+    """Группировка строк спецификации: кол-во на изделие × кол-во изделий по заказам."""
+    pieces = Coalesce(F("variant__order_items__size_counts__quantity"), F("variant__order_items__quantity"))
+    rows = (qs
+            .order_by()
+            .values(*group_by)
+            .annotate(quantity=Sum(line_qty * pieces, output_field=_SQL_DEC),
+                      amount=Sum(line_qty * pieces * F("price"), output_field=_SQL_DEC))
+            .order_by(*group_by))
+    out = []
+    for row in rows:
+        item = {name: row[key] for name, key in names.items()}
+        item["quantity"] = Decimal(row["quantity"] or 0).quantize(_QTY, rounding=ROUND_HALF_UP)
+        item["amount"] = Decimal(row["amount"] or 0).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        out.append(item)
+    return out
+
+
+def explode_orders(orders) -> MRPResult:
+    """
+    orders — queryset SewingOrder (или список id). Возвращает MRPResult
+    с материалами (по материалу и цвету) и аксессуарами, отсортированными по коду.
+    """
+    order_ids = orders.values("pk") if hasattr(orders, "values") else list(orders)
+    result = MRPResult()
+
+    # изделий всего: размеры позиций + quantity позиций без размеров
+    sized = SewingOrderSizeCount.objects.filter(item__order__in=order_ids).aggregate(s=Sum("quantity"))["s"] or 0
+    unsized = (SewingOrderItem.objects
+               .filter(order__in=order_ids, size_counts__isnull=True)
+               .aggregate(s=Sum("quantity"))["s"] or 0)
+    result.pieces = sized + unsized
+
+    # потеря материала в %: умножаем на 0.01, а не делим на 100 (в SQLite int/int — целочисленное деление)
+    loss = Value(Decimal("1")) + F("loss") * Value(Decimal("0.01"))
+    result.materials = _rows(
+        VariantMaterial.objects.filter(variant__order_items__order__in=order_ids),
+        ("material", "material__code", "material__title", "material__m_unit__name", "color", "color__name"),
+        {"material_id": "material", "code": "material__code", "title": "material__title",
+         "unit": "material__m_unit__name", "color_id": "color", "color": "color__name"},
+        F("count") * loss,
+    )
+    result.accessories = _rows(
+        VariantAccessory.objects.filter(variant__order_items__order__in=order_ids),
+        ("accessory", "accessory__code", "accessory__title", "accessory__m_unit__name"),
+        {"material_id": "accessory", "code": "accessory__code", "title": "accessory__title",
+         "unit": "accessory__m_unit__name"},
+        F("count"),
+    )
+    return result
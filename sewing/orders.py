@@ -0,0 +1,148 @@
+# sewing/orders.py
+"""
+Сохранение сетки размеров по позициям заказа (одной позиции или всего заказа сразу):
+один upsert по uniq_item_size плюс один DELETE обнулённых размеров — вместо
+get_or_create/save/delete по каждому размеру.
+
+order_lines() / order_lines_totals() — позиции и итоги заказа так, как их показывает таблица
+позиций (кол-во = сумма по размерам); ими же отвечают AJAX-сохранения сетки размеров.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import SewingOrder, SewingOrderItem, SewingOrderSizeCount, VariantPriceHistory, VariantSize
+from .pricing import live_price_expression
+
+
+def order_lines(order, prices=False):
+    """
+    Позиции заказа с qty (сумма по размерам) и line_total = qty * unit_price.
+    prices=True — ещё live_price (по текущей калькуляции) и order_date_price (цена варианта
+    по истории цен на момент создания заказа) — подзапросами в том же SELECT.
+    """
+    qs = (
+        order.items
+        .select_related("variant", "variant__product_model")
+        .annotate(qty=Coalesce(Sum("size_counts__quantity"), 0, output_field=IntegerField()))
+        .annotate(line_total=ExpressionWrapper(F("qty") * F("unit_price"),
+                                               output_field=DecimalField(max_digits=12, decimal_places=2)))
+        .order_by("variant__product_model__vendor_code", "variant__name", "id")
+    )
+    if prices:
+        qs = qs.annotate(
+            live_price=live_price_expression("variant__"),
+            order_date_price=VariantPriceHistory.price_at(OuterRef("variant_id"), OuterRef("order__created_at")),
+        )
+    return qs
+
+
+def order_lines_totals(order) -> tuple:
+    """(кол-во, сумма) по order_lines() — итог в подвале таблицы позиций."""
+    totals = order_lines(order).aggregate(
+        total_qty=Coalesce(Sum("qty"), 0, output_field=IntegerField()),
+        total_sum=Coalesce(Sum("line_total"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    return totals["total_qty"], totals["total_sum"]
+
+
+def _write_counts(kept, zeroed):
+    """kept — {(item_id, size_id): кол-во}, zeroed — [(item_id, size_id)]; не больше двух запросов."""
+    if kept:
+        SewingOrderSizeCount.objects.bulk_create(
+            [SewingOrderSizeCount(item_id=item_id, size_id=size_id, quantity=qty)
+             for (item_id, size_id), qty in kept.items()],
+            update_conflicts=True, unique_fields=["item", "size"], update_fields=["quantity"],
+        )
+    if zeroed:
+        by_item = {}
+        for item_id, size_id in zeroed:
+            by_item.setdefault(item_id, []).append(size_id)
+        cond = Q()
+        for item_id, size_ids in by_item.items():
+            cond |= Q(item_id=item_id, size_id__in=size_ids)
+        SewingOrderSizeCount.objects.filter(cond).delete()
+
+
+def save_item_sizes(item, quantities: dict) -> int:
+    """
+    quantities — {size_id: кол-во} по допустимым размерам варианта; нули и отрицательные удаляются.
+    Синхронизирует item.quantity с суммой по размерам (итоги заказа двигаются дельтой в item.save()).
+    updated_at позиции обновляется и при той же сумме (перенос между размерами) — по нему строится
+    ETag списка позиций. Возвращает новое кол-во позиции.
+    """
+    kept = {(item.pk, size_id): qty for size_id, qty in quantities.items() if qty > 0}
+    _write_counts(kept, [(item.pk, size_id) for size_id, qty in quantities.items() if qty <= 0])
+
+    item.quantity = sum(kept.values())
+    item.save(update_fields=["quantity", "updated_at"])
+    return item.quantity
+
+
+def allowed_sizes(variant_ids) -> dict:
+    """{variant_id: {size_id, ...}} — активные размеры вариантов одним запросом."""
+    out = {}
+    rows = (VariantSize.objects
+            .filter(variant_id__in=variant_ids, size__is_active=True)
+            .values_list("variant_id", "size_id"))
+    for variant_id, size_id in rows:
+        out.setdefault(variant_id, set()).add(size_id)
+    return out
+
+
+def save_order_sizes(order: SewingOrder, matrix: dict) -> dict:
+    """
+    Сетка «позиция × размер» всего заказа за один раз.
+    matrix — {item_id: {size_id: кол-во}}; позиции, которых нет в matrix, не трогаются.
+    Проверка по VariantSize — один запрос на весь заказ; запись — upsert + delete + bulk_update кол-ва
+    позиций + один UPDATE итогов заказа. Возвращает {item_id: позиция} с обновлённым quantity.
+    Ошибки (чужая позиция, недопустимый размер, отрицательное кол-во) — ValidationError, ничего не пишется.
+    """
+    items = {it.pk: it for it in SewingOrderItem.objects
+             .filter(order=order, pk__in=list(matrix))
+             .only("pk", "order_id", "variant_id", "quantity", "unit_price")}
+    allowed = allowed_sizes({it.variant_id for it in items.values()})
+
+    errors = []
+    for item_id, sizes in matrix.items():
+        item = items.get(item_id)
+        if item is None:
+            errors.append(f"Позиция {item_id} не относится к заказу #{order.pk}.")
+            continue
+        bad = set(sizes) - allowed.get(item.variant_id, set())
+        if bad:
+            errors.append(f"Позиция {item_id}: размеры {sorted(bad)} не заданы для варианта.")
+        if any(qty < 0 for qty in sizes.values()):
+            errors.append(f"Позиция {item_id}: количество не может быть отрицательным.")
+    if errors:
+        raise ValidationError(errors)
+
+    kept, zeroed = {}, []
+    for item_id, sizes in matrix.items():
+        for size_id, qty in sizes.items():
+            if qty > 0:
+                kept[(item_id, size_id)] = qty
+            else:
+                zeroed.append((item_id, size_id))
+    _write_counts(kept, zeroed)
+
+    # кол-во позиции = сумма по её размерам; итоги заказа сдвигаем одной дельтой на всех.
+    # updated_at — у всех записанных позиций, даже при той же сумме: по нему строится ETag списка
+    d_qty, d_amount, now = 0, Decimal("0.00"), timezone.now()
+    for item_id, sizes in matrix.items():
+        item = items[item_id]
+        total = sum(qty for qty in sizes.values() if qty > 0)
+        d_qty += total - item.quantity
+        d_amount += (item.unit_price or Decimal("0.00")) * (total - item.quantity)
+        item.quantity = total
+        item.updated_at = now
+    if items:
+        SewingOrderItem.objects.bulk_update(items.values(), ["quantity", "updated_at"])
+    if d_qty or d_amount:
+        SewingOrder.apply_totals_delta(order.pk, d_qty, d_amount)
+        order.total_qty += d_qty
+        order.total_amount += d_amount
+    return items
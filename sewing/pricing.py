@@ -0,0 +1,193 @@
+# sewing/pricing.py
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Case, When, Value, DecimalField, F, Func, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+
+from core.db import on_commit_once
+from info.models import Material
+from .models import (
+    ModelVariant, VariantMaterial, VariantAccessory, VariantCostSnapshot, VariantPriceHistory, D, DEC2,
+    calc_cost_breakdown
+)
+
+REPRICE_BATCH_SIZE = 500
+
+
+def _lines_cost(variant_ids):
+    """
+    Суммы материалов и аксессуаров сразу для пачки вариантов — два запроса на всю пачку.
+    Формулы те же, что в ModelVariant._materials_cost / _accessories_cost.
+    """
+    materials = defaultdict(Decimal)
+    rows = (VariantMaterial.objects
+            .filter(variant_id__in=variant_ids)
+            .values_list("variant_id", "price", "count", "loss"))
+    for variant_id, price, count, loss in rows:
+        materials[variant_id] += D(price or 0) * D(count or 0) * (D("1") + D(loss or 0) / D("100"))
+
+    accessories = defaultdict(Decimal)
+    rows = (VariantAccessory.objects
+            .filter(variant_id__in=variant_ids)
+            .values_list("variant_id", "price", "count"))
+    for variant_id, price, count in rows:
+        accessories[variant_id] += D(price or 0) * D(count or 0)
+
+    return materials, accessories
+
+
+def reprice_variants(queryset, batch_size=REPRICE_BATCH_SIZE) -> int:
+    """
+    Массовый пересчёт unit_price для вариантов из queryset.
+    На пачку вариантов: 1 запрос вариантов+моделей, 2 запроса строк, 1 bulk_update изменившихся цен,
+    1 вставка в историю цен (только изменившиеся) и 1 upsert разбивки (VariantCostSnapshot).
+    Возвращает количество вариантов, у которых цена поменялась.
+    """
+    variants = (queryset
+                .select_related("product_model")
+                .only("pk", "unit_price", "product_model__cutting_price", "product_model__transfer_price",
+                      "product_model__print_price", "product_model__embroidery_price",
+                      "product_model__sewing_loss_percent", "product_model__other_expenses_percent",
+                      "product_model__profitability", "product_model__commission",
+                      "product_model__discount")
+                .order_by("pk"))
+
+    changed_total = 0
+    batch = []
+    for v in variants.iterator(chunk_size=batch_size):
+        batch.append(v)
+        if len(batch) >= batch_size:
+            changed_total += _reprice_batch(batch)
+            batch = []
+    if batch:
+        changed_total += _reprice_batch(batch)
+    return changed_total
+
+
+def _reprice_batch(variants) -> int:
+    materials, accessories = _lines_cost([v.pk for v in variants])
+    changed, snapshots = [], []
+    for v in variants:
+        breakdown = calc_cost_breakdown(v.product_model, materials.get(v.pk, 0), accessories.get(v.pk, 0))
+        snapshots.append(VariantCostSnapshot(variant_id=v.pk, **VariantCostSnapshot.fields_from_breakdown(breakdown)))
+        if breakdown["total"] != v.unit_price:
+            v.unit_price = breakdown["total"]
+            changed.append(v)
+    if changed:
+        # прямой UPDATE без вызова save() => без повторных сигналов/логики в save()
+        ModelVariant.objects.bulk_update(changed, ["unit_price"])
+        VariantPriceHistory.record({v.pk: v.unit_price for v in changed})
+    # разбивка перезаписывается целиком одним upsert на пачку
+    VariantCostSnapshot.objects.bulk_create(
+        snapshots, update_conflicts=True, unique_fields=["variant"],
+        update_fields=[*VariantCostSnapshot.AMOUNT_FIELDS, "calculated_at"],
+    )
+    return len(changed)
+
+
+# ---------------------- Отложенный пересчёт (один раз на транзакцию) ----------------------
+
+def mark_variants_dirty(variant_ids, using=None):
+    """
+    Регистрирует варианты на пересчёт цены. Все отметки внутри одной транзакции копятся
+    в общем наборе и пересчитываются одним reprice_variants() через transaction.on_commit.
+    Вне atomic-блока on_commit срабатывает сразу.
+    """
+    ids = {pk for pk in variant_ids if pk}
+    if not ids:
+        return
+
+    on_commit_once("sewing.reprice_variants", _flush_dirty, ids, using=using)
+
+
+def _flush_dirty(ids):
+    if ids:
+        reprice_variants(ModelVariant.objects.filter(pk__in=ids))
+
+
+# ---------------------- Смена цены материала → строки → варианты ----------------------
+
+def propagate_material_costs(material_ids, batch_size=REPRICE_BATCH_SIZE) -> set:
+    """
+    Переносит Material.planned_cost в цены строк VariantMaterial/VariantAccessory, где этот
+    материал используется, и ставит на пересчёт только затронутые варианты.
+    Строки ищутся по индексам (material, variant) / (accessory, variant) — работа пропорциональна
+    числу затронутых вариантов, а не всему каталогу. Возвращает id затронутых вариантов.
+    """
+    material_ids = list(material_ids)
+    affected = set()
+    for i in range(0, len(material_ids), batch_size):
+        costs = dict(Material.objects.filter(pk__in=material_ids[i:i + batch_size])
+                     .values_list("pk", "planned_cost"))
+        if not costs:
+            continue
+        prices = {pk: D(cost or 0).quantize(DEC2, rounding=ROUND_HALF_UP) for pk, cost in costs.items()}
+        affected |= _refresh_lines(VariantMaterial, "material_id", prices)
+        affected |= _refresh_lines(VariantAccessory, "accessory_id", prices)
+
+    mark_variants_dirty(affected)
+    return affected
+
+
+def _refresh_lines(model, fk, prices) -> set:
+    lines = model.objects.filter(**{f"{fk}__in": list(prices)})
+    variant_ids = set(lines.values_list("variant_id", flat=True).distinct())
+    if variant_ids:
+        lines.update(
+            price=Case(*(When(**{fk: pk}, then=Value(price)) for pk, price in prices.items()),
+                       output_field=DecimalField(max_digits=12, decimal_places=2)),
+            updated_at=Now(),
+        )
+    return variant_ids
+
+
+# ---------------------- Та же формула в виде ORM-выражения ----------------------
+
+_SQL_DEC = DecimalField(max_digits=20, decimal_places=6)
+_PCT = Value(Decimal("0.01"))  # умножаем на 0.01 вместо деления на 100: в SQLite int/int — целочисленное деление
+_ONE = Value(Decimal("1"))
+
+
+class RoundMoney(Func):
+    """ROUND(x, 2) — в PostgreSQL для numeric это ROUND_HALF_UP, как quantize в recalc_price."""
+    function = "ROUND"
+    template = "%(function)s(%(expressions)s, 2)"
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite считает в double: 1.005 хранится как 1.00499…, поэтому сдвигаем на эпсилон (цены ≥ 0)
+        return self.as_sql(compiler, connection, template="%(function)s(%(expressions)s + 1e-9, 2)",
+                           **extra_context)
+
+
+def _lines_sum(model, outer, line_cost):
+    lines = (model.objects
+             .filter(variant=outer)
+             .order_by()  # без сортировки по умолчанию, иначе она попадёт в GROUP BY
+             .values("variant")
+             .annotate(s=Sum(line_cost, output_field=_SQL_DEC))
+             .values("s"))
+    return Coalesce(Subquery(lines, output_field=_SQL_DEC), Value(Decimal("0")), output_field=_SQL_DEC)
+
+
+def live_price_expression(prefix=""):
+    """
+    Цена за изделие по текущим строкам и накруткам модели — для annotate()/order_by()/filter().
+    prefix — путь до варианта от модели queryset'а, например "variant__" для SewingOrderItem:
+        SewingOrderItem.objects.annotate(live_price=live_price_expression("variant__"))
+    Совпадает с ModelVariant.recalc_price() (см. общий набор кейсов в sewing/tests.py).
+    """
+    outer = OuterRef(f"{prefix}pk")
+    spm = f"{prefix}product_model__"
+
+    materials = _lines_sum(VariantMaterial, outer, F("price") * F("count") * (_ONE + F("loss") * _PCT))
+    accessories = _lines_sum(VariantAccessory, outer, F("price") * F("count"))
+
+    base = (materials + accessories
+            + F(f"{spm}cutting_price") + F(f"{spm}transfer_price")
+            + F(f"{spm}print_price") + F(f"{spm}embroidery_price"))
+    markup = (F(f"{spm}sewing_loss_percent") + F(f"{spm}other_expenses_percent")
+              + F(f"{spm}profitability") + F(f"{spm}commission"))
+    total = base * (_ONE + markup * _PCT) * (_ONE - F(f"{spm}discount") * _PCT)
+    return RoundMoney(total)
@@ -0,0 +1,183 @@
+# sewing/scheduling.py
+"""
+Планирование открытых заказов по швейным линиям с учётом мощности.
+
+Трудоёмкость изделия (SAM, сек) — сумма VariantOperation.seconds по варианту, считается одним
+сгруппированным запросом. Трудоёмкость заказа = Σ (кол-во изделий позиции × SAM варианта).
+Мощность линии в день = worker_count × длина смены × коэффициент выработки.
+
+Заказы идут по сроку отгрузки (без даты — в конце) и целиком ставятся на линию,
+где они закончатся раньше всего. Дальше — только арифметика в памяти: сотни заказов
+на десятках линий считаются за миллисекунды.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db.models import IntegerField, Sum
+from django.db.models.functions import Coalesce
+
+from .models import SewingLine, SewingOrder, SewingOrderItem, VariantOperation
+from .mrp import open_orders
+
+SHIFT_SECONDS = 8 * 3600
+DAYS_OFF = (6,)  # воскресенье
+MAX_SHIFT_HOURS = 24
+MAX_EFFICIENCY = 200  # %
+
+
+def schedule_params(hours, efficiency) -> tuple:
+    """
+    Длина смены (ч) и выработка (%) из запроса/командной строки → (shift_seconds, коэффициент).
+    ValueError — вне 0 < hours ≤ 24 (и меньше секунды), 0 < efficiency ≤ 200.
+    """
+    shift_seconds = int(hours * 3600) if 0 < hours <= MAX_SHIFT_HOURS else 0
+    if shift_seconds < 1 or not 0 < efficiency <= MAX_EFFICIENCY:
+        raise ValueError(f"Нужно 0 < hours ≤ {MAX_SHIFT_HOURS} и 0 < efficiency ≤ {MAX_EFFICIENCY}.")
+    return shift_seconds, efficiency / 100
+
+
+@dataclass
+class Assignment:
+    order: SewingOrder
+    line: SewingLine
+    seconds: int  # трудоёмкость заказа
+    start: date
+    finish: date  # плановая дата окончания пошива
+
+    @property
+    def hours(self) -> float:
+        return round(self.seconds / 3600, 1)
+
+    @property
+    def late_days(self) -> int:
+        ship = self.order.shipment_date
+        return max((self.finish - ship).days, 0) if ship else 0
+
+
+@dataclass
+class Schedule:
+    start: date
+    assignments: list = field(default_factory=list)
+    unplanned: list = field(default_factory=list)  # (order, причина)
+    load: dict = field(default_factory=dict)  # {line_id: {дата: секунды}}
+    capacity: dict = field(default_factory=dict)  # {line_id: секунд в день}
+
+    @property
+    def late(self):
+        return [a for a in self.assignments if a.late_days]
+
+    def line_summary(self):
+        """По каждой загруженной линии: заказов, часов, рабочих дней, загрузка %, до какой даты занята."""
+        by_line = {}
+        for a in self.assignments:
+            by_line.setdefault(a.line.pk, []).append(a)
+        for line_id, items in by_line.items():
+            seconds = sum(a.seconds for a in items)
+            days = len(self.load.get(line_id, {}))
+            yield {
+                "line": items[0].line,
+                "orders": len(items),
+                "hours": round(seconds / 3600, 1),
+                "days": days,
+                "utilization": round(100 * seconds / (self.capacity[line_id] * days)) if days else 0,
+                "busy_until": max(a.finish for a in items),
+            }
+
+
+class WorkCalendar:
+    """Рабочие дни начиная со start; индекс → дата, без выходных из days_off."""
+
+    def __init__(self, start: date, days_off=DAYS_OFF):
+        self.days_off = set(days_off)
+        self._days = []
+        self._next = start
+
+    def __getitem__(self, index: int) -> date:
+        while len(self._days) <= index:
+            if self._next.weekday() not in self.days_off:
+                self._days.append(self._next)
+            self._next += timedelta(days=1)
+        return self._days[index]
+
+
+def variant_sam(variant_ids) -> dict:
+    """{variant_id: секунд на изделие} — одним запросом."""
+    return dict(VariantOperation.objects
+                .filter(variant_id__in=variant_ids)
+                .order_by()
+                .values("variant")
+                .annotate(s=Sum("seconds"))
+                .values_list("variant", "s"))
+
+
+def order_loads(orders) -> dict:
+    """{order_id: трудоёмкость, сек}. Кол-во изделий — по сетке размеров, без неё — quantity позиции."""
+    rows = list(SewingOrderItem.objects
+                .filter(order__in=orders)
+                .order_by()
+                .values("pk", "order_id", "variant_id", "quantity")
+                .annotate(pieces=Coalesce(Sum("size_counts__quantity"), "quantity", output_field=IntegerField()))
+                .values_list("order_id", "variant_id", "pieces"))
+    sam = variant_sam({variant_id for _, variant_id, _ in rows})
+    loads = {}
+    for order_id, variant_id, pieces in rows:
+        loads[order_id] = loads.get(order_id, 0) + (pieces or 0) * (sam.get(variant_id) or 0)
+    return loads
+
+
+def build_schedule(orders=None, lines=None, start=None, shift_seconds=SHIFT_SECONDS, efficiency=1.0,
+                   days_off=DAYS_OFF) -> Schedule:
+    """
+    orders — queryset заказов (по умолчанию все открытые), lines — queryset линий (по умолчанию активные).
+    Ничего не пишет в БД; результат — Schedule с датами начала/окончания по каждому заказу
+    и загрузкой линий по дням.
+    """
+    if orders is None:
+        orders = open_orders()
+    if lines is None:
+        lines = SewingLine.objects.filter(status=True)
+    start = start or date.today()
+    schedule = Schedule(start=start)
+    calendar = WorkCalendar(start, days_off)
+
+    lines = [ln for ln in lines.select_related("factory").order_by("ordering", "pk") if ln.worker_count > 0]
+    orders = list(orders.select_related("customer"))
+    loads = order_loads([o.pk for o in orders])
+    orders.sort(key=lambda o: (o.shipment_date is None, o.shipment_date or date.max, o.pk))
+
+    if not lines:
+        schedule.unplanned = [(o, "Нет активных линий") for o in orders]
+        return schedule
+
+    capacity = {ln.pk: ln.worker_count * shift_seconds * efficiency for ln in lines}
+    free_at = {ln.pk: 0.0 for ln in lines}  # занятость линии, в рабочих днях от start
+    schedule.capacity = {pk: int(c) for pk, c in capacity.items()}
+
+    for order in orders:
+        seconds = loads.get(order.pk, 0)
+        if not seconds:
+            schedule.unplanned.append((order, "Нет операций или количеств"))
+            continue
+        # линия, на которой заказ закончится раньше всего
+        line = min(lines, key=lambda ln: (free_at[ln.pk] + seconds / capacity[ln.pk], ln.ordering, ln.pk))
+        begin = free_at[line.pk]
+        end = begin + seconds / capacity[line.pk]
+        free_at[line.pk] = end
+
+        _spread_load(schedule.load.setdefault(line.pk, {}), calendar, begin, end, capacity[line.pk])
+        schedule.assignments.append(Assignment(
+            order=order, line=line, seconds=seconds,
+            start=calendar[int(begin)],
+            finish=calendar[max(int(end - 1e-9), int(begin))],
+        ))
+    return schedule
+
+
+def _spread_load(day_load, calendar, begin, end, per_day):
+    """Раскладывает интервал [begin, end) в рабочих днях на секунды по датам."""
+    day = int(begin)
+    while day < end:
+        part = min(end, day + 1) - max(begin, day)
+        when = calendar[day]
+        day_load[when] = day_load.get(when, 0) + int(round(part * per_day))
+        day += 1
@@ -1,28 +1,74 @@
 # sewing/signals.py
+from django.db.models import DEFERRED
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from .models import VariantMaterial, VariantAccessory, ModelVariant, SewingProductModel
-
-
-def _recalc_direct(variant: ModelVariant):
-    # прямой UPDATE без вызова save() => без повторных сигналов/логики в save()
-    ModelVariant.objects.filter(pk=variant.pk).update(unit_price=variant.recalc_price())
+from core.fragments import touch_objects
+from info.models import Material
+from .models import (
+    ModelVariant, VariantMaterial, VariantAccessory, VariantOperation, VariantSize,
+    SewingProductModel, SewingOrder, SewingOrderItem,
+)
+from .pricing import reprice_variants, mark_variants_dirty, propagate_material_costs
 
 
+# строки материалов/аксессуаров: только отмечаем вариант, пересчёт — один раз на транзакцию (on_commit)
 @receiver([post_save, post_delete], sender=VariantMaterial)
 def _vm_changed(sender, instance, **kwargs):
-    _recalc_direct(instance.variant)
+    mark_variants_dirty([instance.variant_id])
 
 
 @receiver([post_save, post_delete], sender=VariantAccessory)
 def _va_changed(sender, instance, **kwargs):
-    _recalc_direct(instance.variant)
+    mark_variants_dirty([instance.variant_id])
+
+
+# модалки варианта кэшируются по версии варианта (core/fragments.py) — любая его строка её меняет
+@receiver([post_save, post_delete], sender=VariantMaterial)
+@receiver([post_save, post_delete], sender=VariantAccessory)
+@receiver([post_save, post_delete], sender=VariantOperation)
+@receiver([post_save, post_delete], sender=VariantSize)
+def _variant_rows_changed(sender, instance, using=None, raw=False, **kwargs):
+    if not raw:
+        touch_objects(ModelVariant, [instance.variant_id], using=using)
+
+
+@receiver([post_save, post_delete], sender=ModelVariant)
+def _variant_changed(sender, instance, using=None, raw=False, **kwargs):
+    if not raw:
+        touch_objects(ModelVariant, [instance.pk], using=using)
 
 
 # (необязательно, но полезно) — если изменились базовые цены/проценты у модели,
 # пересчитать ВСЕ её варианты.
 @receiver(post_save, sender=SewingProductModel)
 def _spm_prices_changed(sender, instance: SewingProductModel, **kwargs):
-    for v in instance.variants.all():
-        _recalc_direct(v)
+    reprice_variants(instance.variants.all())
+
+
+# плановая цена материала поменялась — обновить строки вариантов с этим материалом и их цены
+@receiver(post_save, sender=Material)
+def _material_cost_changed(sender, instance: Material, created=False, update_fields=None, raw=False, **kwargs):
+    if raw or created or (update_fields and "planned_cost" not in update_fields):
+        return  # загрузка фикстур, новый материал или цена не сохранялась
+    old = getattr(instance, "_loaded_planned_cost", None)  # None — объект собран не из БД, сравнить не с чем
+    if old is DEFERRED:
+        # цену не загружали (only()/defer()): пересчёт, только если её записали явно
+        if not update_fields:
+            return
+    elif old is not None and old == instance.planned_cost:
+        return
+    propagate_material_costs([instance.pk])
+    instance._loaded_planned_cost = instance.planned_cost
+
+
+# удалённая позиция — вычесть её вклад из итогов заказа (при удалении самого заказа UPDATE просто ничего не найдёт)
+@receiver(post_delete, sender=SewingOrderItem)
+def _order_item_deleted(sender, instance: SewingOrderItem, **kwargs):
+    order_id, qty, price = getattr(instance, "_loaded_totals", (None, None, None))
+    if qty is None or price is None:
+        order_id = instance.order_id
+        qty, amount = instance.totals_contribution
+    else:
+        amount = price * qty
+    SewingOrder.apply_totals_delta(order_id, -qty, -amount)
@@ -1,3 +1,656 @@
-from django.test import TestCase
+import importlib
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.shortcuts import get_object_or_404
+from django.template.defaultfilters import floatformat
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse, set_script_prefix
+
+from hr.models import Department
+from core import routes
+from info.models import Factory, Firm, Material, MeasurementUnit, Operation, Process, Size
+from .importing import ImportFormatError, import_order
+from .mrp import explode_orders
+from .orders import order_lines, save_item_sizes, save_order_sizes
+from .models import (
+    SewingProductModel, ModelVariant, VariantMaterial, VariantAccessory, VariantSize,
+    SewingOrder, SewingOrderItem, SewingOrderSizeCount, SewingLine, VariantOperation, VariantPriceHistory,
+    VariantCostSnapshot,
+)
+from .pricing import live_price_expression, reprice_variants
+from .scheduling import build_schedule
+from .whatif import CostingFrame
+
+# Общий набор кейсов для всех путей расчёта цены:
+# (накрутки модели, материалы [(цена, кол-во, потеря%)], аксессуары [(цена, кол-во)])
+PRICE_MATRIX = [
+    ({}, [], []),
+    ({"cutting_price": "12.50"}, [], []),
+    ({}, [("10.00", "0.250", "0")], []),
+    ({}, [("2.35", "1.500", "0")], []),  # 3.525 → ровно полкопейки
+    ({}, [("1.01", "0.500", "0")], []),  # 0.505
+    ({}, [("100.10", "0.105", "0")], []),  # 10.5105
+    ({}, [("7.77", "0.333", "1.75")], [("0.33", "2")]),
+    ({"sewing_loss_percent": "2.50", "commission": "3.00"}, [("45.00", "0.420", "1.50")], [("1.20", "4")]),
+    ({"profitability": "10.00", "discount": "5.00"}, [("99.99", "1.250", "2.25")], [("0.05", "12")]),
+    ({"cutting_price": "1.15", "transfer_price": "0.85", "print_price": "2.10", "embroidery_price": "3.00",
+      "sewing_loss_percent": "2.50", "other_expenses_percent": "1.50", "profitability": "10.00",
+      "commission": "3.33", "discount": "1.25"},
+     [("12.34", "0.777", "3.00"), ("5.55", "0.125", "0.50")], [("0.99", "3"), ("2.50", "1")]),
+    ({"discount": "100.00"}, [("10.00", "1.000", "0")], []),
+    ({"commission": "0.50"}, [("0.01", "0.001", "0")], [("0.01", "1")]),
+    ({"profitability": "15.00", "commission": "4.00"}, [("12345.67", "2.500", "5.00")], [("250.00", "10")]),
+]
+
+
+class PriceMatrixTests(TestCase):
+    """recalc_price(), reprice_variants(), live_price_expression() и CostingFrame считают одинаково."""
+
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        material = Material.objects.create(code="MAT-1", title="Материал", m_unit=mu)
+        cls.variants = []
+        for i, (spm_fields, materials, accessories) in enumerate(PRICE_MATRIX):
+            spm = SewingProductModel.objects.create(
+                name=f"Модель {i}", vendor_code=f"ART{i:03d}",
+                **{k: Decimal(v) for k, v in spm_fields.items()},
+            )
+            variant = ModelVariant.objects.create(product_model=spm, name=f"Вариант {i}")
+            VariantMaterial.objects.bulk_create(
+                VariantMaterial(variant=variant, material=material, price=Decimal(p), count=Decimal(c),
+                                loss=Decimal(loss))
+                for p, c, loss in materials
+            )
+            VariantAccessory.objects.bulk_create(
+                VariantAccessory(variant=variant, accessory=material, price=Decimal(p), count=Decimal(c))
+                for p, c in accessories
+            )
+            cls.variants.append(variant)
+
+    def expected(self):
+        return {v.pk: ModelVariant.objects.get(pk=v.pk).recalc_price() for v in self.variants}
+
+    def test_reprice_variants_matches_recalc_price(self):
+        expected = self.expected()
+        ModelVariant.objects.update(unit_price=0)
+        reprice_variants(ModelVariant.objects.all())
+        self.assertEqual(dict(ModelVariant.objects.values_list("pk", "unit_price")), expected)
+
+    def test_reprice_writes_cost_snapshot(self):
+        expected = self.expected()
+        reprice_variants(ModelVariant.objects.all())
+        self.assertEqual(dict(VariantCostSnapshot.objects.values_list("variant_id", "total")), expected)
+        variant = self.variants[-1]
+        snapshot = VariantCostSnapshot.objects.get(variant=variant)
+        response = self.client.get(reverse("sewing:model-edit", args=[variant.product_model_id]))
+        self.assertContains(response, f"себест. {floatformat(snapshot.base, 2)}")
+
+    def test_migration_backfills_missing_snapshots(self):
+        reprice_variants(ModelVariant.objects.all())
+        repriced = {s.pk: [getattr(s, f) for f in VariantCostSnapshot.AMOUNT_FIELDS]
+                    for s in VariantCostSnapshot.objects.all()}
+        VariantCostSnapshot.objects.filter(pk__in=[v.pk for v in self.variants[1:]]).delete()
+        migration = importlib.import_module("sewing.migrations.0011_backfill_variant_cost_snapshot")
+        migration.backfill_cost_snapshots(apps, None)
+        backfilled = {s.pk: [getattr(s, f) for f in VariantCostSnapshot.AMOUNT_FIELDS]
+                      for s in VariantCostSnapshot.objects.all()}
+        self.assertEqual(backfilled, repriced)
+
+    def test_live_price_expression_matches_recalc_price(self):
+        live = dict(ModelVariant.objects.annotate(live=live_price_expression()).values_list("pk", "live"))
+        self.assertEqual(live, self.expected())
+
+    def test_costing_frame_matches_recalc_price(self):
+        result = CostingFrame().simulate()
+        self.assertEqual({vid: base for vid, base, _new, _delta in result.rows()}, self.expected())
+
+
+class ModelRepriceTests(TestCase):
+    """Сохранение модели пересчитывает все её варианты набором запросов, не зависящим от их числа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        material = Material.objects.create(code="MAT-1", title="Материал", m_unit=mu)
+        cls.models = []
+        with cls.captureOnCommitCallbacks(execute=True):
+            for n in (2, 12):
+                spm = SewingProductModel.objects.create(name=f"Модель {n}", vendor_code=f"ART{n}")
+                for i in range(n):
+                    variant = ModelVariant.objects.create(product_model=spm, name=f"Вариант {i}")
+                    VariantMaterial.objects.create(variant=variant, material=material, price=Decimal("10.00"),
+                                                   count=Decimal("1.500"), loss=Decimal("1.00"))
+                cls.models.append(spm)
+
+    def save_with_new_cutting_price(self, spm):
+        spm.cutting_price = Decimal("3.40")
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            spm.save()
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_variant_count(self):
+        small, large = (self.save_with_new_cutting_price(spm) for spm in self.models)
+        self.assertEqual(small, large)
+        for variant in ModelVariant.objects.all():
+            self.assertEqual(variant.unit_price, variant.recalc_price())
+
+
+class RepriceQueueTests(TestCase):
+    """Изменения строк вариантов копятся и пересчитываются одним проходом после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        cls.material = Material.objects.create(code="MAT-1", title="Материал", m_unit=mu)
+        spm = SewingProductModel.objects.create(name="Модель", vendor_code="ART1")
+        cls.variants = [ModelVariant.objects.create(product_model=spm, name=f"Вариант {i}") for i in range(2)]
+
+    def add_line(self, variant, price="10.00"):
+        return VariantMaterial.objects.create(variant=variant, material=self.material, price=Decimal(price),
+                                              count=Decimal("1.000"), loss=Decimal("0"))
+
+    def test_row_changes_in_one_transaction_reprice_once(self):
+        with mock.patch("sewing.pricing.reprice_variants", wraps=reprice_variants) as reprice, \
+                self.captureOnCommitCallbacks(execute=True):
+            for variant in self.variants:
+                for price in ("1.00", "2.00", "3.00"):
+                    self.add_line(variant, price)
+            reprice.assert_not_called()  # до коммита — ничего
+        reprice.assert_called_once()
+        self.assertEqual(set(reprice.call_args.args[0].values_list("pk", flat=True)), {v.pk for v in self.variants})
+        for variant in ModelVariant.objects.filter(pk__in=[v.pk for v in self.variants]):
+            self.assertEqual(variant.unit_price, variant.recalc_price())
+
+    def test_clone_reprices_bulk_created_variant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_line(self.variants[0], "12.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("sewing:variant-clone", args=[self.variants[0].pk]))
+        clone = ModelVariant.objects.get(cloned=True)
+        self.assertEqual(clone.unit_price, clone.recalc_price())
+        self.assertEqual(clone.unit_price, ModelVariant.objects.get(pk=self.variants[0].pk).unit_price)
+
+
+class OrderTotalsTests(TestCase):
+    """Итоги заказа ведутся дельтами при добавлении/изменении/удалении позиций."""
+
+    @classmethod
+    def setUpTestData(cls):
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        cls.firm = Firm.objects.create(code="F1", name="Заказчик")
+
+    def totals(self, order):
+        order = SewingOrder.objects.get(pk=order.pk)
+        return order.total_qty, order.total_amount
+
+    def test_insert_update_delete_move_totals(self):
+        order = SewingOrder.objects.create(customer=self.firm)
+        first = SewingOrderItem.objects.create(order=order, variant=self.variant, quantity=3, unit_price=Decimal("2.50"))
+        second = SewingOrderItem.objects.create(order=order, variant=self.variant, quantity=2, unit_price=Decimal("4.00"))
+        self.assertEqual(self.totals(order), (5, Decimal("15.50")))
+
+        first.quantity = 10
+        first.save()
+        self.assertEqual(self.totals(order), (12, Decimal("33.00")))
+
+        second.delete()
+        self.assertEqual(self.totals(order), (10, Decimal("25.00")))
+
+    def test_adding_a_line_does_not_reaggregate(self):
+        order = SewingOrder.objects.create(customer=self.firm)
+        for _ in range(5):
+            SewingOrderItem.objects.create(order=order, variant=self.variant, quantity=1, unit_price=Decimal("1.00"))
+        with CaptureQueriesContext(connection) as queries:
+            SewingOrderItem.objects.create(order=order, variant=self.variant, quantity=1, unit_price=Decimal("1.00"))
+        self.assertFalse([q for q in queries if "SUM(" in q["sql"].upper()])
+
+    def test_rebuild_command_fixes_drift(self):
+        order = SewingOrder.objects.create(customer=self.firm)
+        SewingOrderItem.objects.create(order=order, variant=self.variant, quantity=4, unit_price=Decimal("5.00"))
+        SewingOrder.objects.filter(pk=order.pk).update(total_qty=99, total_amount=Decimal("1.00"))
+        call_command("rebuild_order_totals", stdout=io.StringIO())
+        self.assertEqual(self.totals(order), (4, Decimal("20.00")))
+
+
+class OrderSizeSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        cls.sizes = [Size.objects.create(name=name) for name in ("S", "M", "L")]
+        for size in cls.sizes[:2]:
+            VariantSize.objects.create(variant=cls.variant, size=size)
+        cls.order = SewingOrder.objects.create(customer=Firm.objects.create(code="F1", name="Заказчик"))
+        cls.item = SewingOrderItem.objects.create(order=cls.order, variant=cls.variant, unit_price=Decimal("2.00"))
+
+    def counts(self, item=None):
+        return dict(SewingOrderSizeCount.objects.filter(item=item or self.item).values_list("size_id", "quantity"))
+
+    def test_item_sizes_upsert_and_delete(self):
+        s, m, _l = self.sizes
+        save_item_sizes(self.item, {s.pk: 3, m.pk: 4})
+        with CaptureQueriesContext(connection) as queries:
+            qty = save_item_sizes(self.item, {s.pk: 5, m.pk: 0})
+        self.assertEqual(qty, 5)
+        self.assertEqual(self.counts(), {s.pk: 5})
+        # upsert, delete (с post_delete-сигналами — SELECT + DELETE пачкой), позиция, итоги заказа
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(SewingOrder.objects.get(pk=self.order.pk).total_amount, Decimal("10.00"))
+
+    def test_item_sizes_endpoint_ignores_sizes_outside_variant(self):
+        s, _m, l = self.sizes
+        data = self.client.post(reverse("sewing:order-item-sizes-save", args=[self.item.pk]),
+                                {f"qty_{s.pk}": "2", f"qty_{l.pk}": "7"}).json()
+        self.assertEqual((data["line_qty"], data["line_total"]), (2, "4.00"))
+        self.assertEqual(self.counts(), {s.pk: 2})
+
+    def test_order_matrix_saves_all_lines(self):
+        s, m, _l = self.sizes
+        other = SewingOrderItem.objects.create(order=self.order, variant=self.variant, unit_price=Decimal("1.00"))
+        items = save_order_sizes(self.order, {self.item.pk: {s.pk: 2, m.pk: 1}, other.pk: {m.pk: 4}})
+        self.assertEqual({pk: it.quantity for pk, it in items.items()}, {self.item.pk: 3, other.pk: 4})
+        self.assertEqual(self.counts(), {s.pk: 2, m.pk: 1})
+        self.assertEqual(self.counts(other), {m.pk: 4})
+
+    def test_order_matrix_rejects_invalid_input_without_writing(self):
+        s, _m, l = self.sizes
+        foreign = SewingOrderItem.objects.create(
+            order=SewingOrder.objects.create(customer=self.order.customer), variant=self.variant)
+        for matrix in ({self.item.pk: {l.pk: 1}},  # размера нет у варианта
+                       {self.item.pk: {s.pk: -1}},
+                       {self.item.pk: {s.pk: 1}, foreign.pk: {s.pk: 1}}):
+            with self.subTest(matrix=matrix), self.assertRaises(ValidationError):
+                save_order_sizes(self.order, matrix)
+        self.assertFalse(SewingOrderSizeCount.objects.exists())
+
+        Size.objects.filter(pk=s.pk).update(is_active=False)
+        response = self.client.post(reverse("sewing:order-sizes-matrix", args=[self.order.pk]),
+                                    {f"qty_{self.item.pk}_{s.pk}": "1"})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.firm = Firm.objects.create(code="F1", name="Заказчик")
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        cls.size_s = Size.objects.create(name="S")
+        cls.size_m = Size.objects.create(name="M")
+        VariantSize.objects.create(variant=cls.variant, size=cls.size_s)
+
+    def run_import(self, content: bytes, filename="order.csv", dry_run=False):
+        return import_order(io.BytesIO(content), filename, {"customer": self.firm}, dry_run=dry_run)
+
+    def test_csv_creates_order_with_sizes_and_totals(self):
+        report = self.run_import("Артикул;Вариант;Цена;S\nD-1;Синее;10,00;3\n".encode())
+        self.assertTrue(report.ok, report.errors)
+        order = SewingOrder.objects.get(pk=report.order.pk)
+        self.assertEqual((order.total_qty, order.total_amount), (3, Decimal("30.00")))
+        self.assertEqual(list(SewingOrderSizeCount.objects.values_list("size_id", "quantity")), [(self.size_s.pk, 3)])
+
+    def test_cp1251_csv(self):
+        report = self.run_import("Артикул;Вариант;S\nD-1;Синее;2\n".encode("cp1251"), dry_run=True)
+        self.assertTrue(report.ok, report.errors)
+        self.assertEqual(report.pieces, 2)
+
+    def test_broken_files_raise_format_error(self):
+        with self.assertRaises(ImportFormatError):
+            self.run_import(b"\x98\x98\xff;\n")  # ни UTF-8, ни cp1251
+        with self.assertRaises(ImportFormatError):
+            self.run_import(b"not a zip", filename="order.xlsx")
+
+    def test_size_outside_variant_is_rejected(self):
+        report = self.run_import("Артикул;Вариант;S;M\nD-1;Синее;1;2\n".encode())
+        self.assertFalse(report.ok)
+        self.assertEqual(report.errors[0][0], 2)
+        self.assertFalse(SewingOrder.objects.exists())
+        self.assertFalse(SewingOrderSizeCount.objects.exists())
+
+    def test_bad_quantities_and_prices_are_reported(self):
+        rows = ["2,5", "Infinity", "NaN", "1e30", "-1"]
+        prices = ["NaN", "-5", "Infinity", "1e30"]
+        lines = [f"D-1;Синее;10;{qty}" for qty in rows] + [f"D-1;Синее;{price};1" for price in prices]
+        report = self.run_import(("Артикул;Вариант;Цена;S\n" + "\n".join(lines) + "\n").encode(), dry_run=True)
+        self.assertEqual([line for line, _text in report.errors], list(range(2, 2 + len(lines))))
+        self.assertEqual(report.items, 0)
+
+        report = self.run_import("Артикул;Вариант;Цена;S\nD-1;Синее;0;2,0\n".encode(), dry_run=True)
+        self.assertTrue(report.ok, report.errors)  # целое в виде «2,0» и нулевая цена допустимы
+        self.assertEqual(report.pieces, 2)
+
+    def test_inactive_size_is_rejected(self):
+        Size.objects.filter(pk=self.size_s.pk).update(is_active=False)
+        report = self.run_import("Артикул;Вариант;S\nD-1;Синее;1\n".encode(), dry_run=True)
+        self.assertFalse(report.ok)
+
+
+class OrderSizeTotalsTests(TestCase):
+    """AJAX-сохранение сетки размеров отдаёт те же итоги заказа, что и подвал таблицы позиций."""
+
+    @classmethod
+    def setUpTestData(cls):
+        firm = Firm.objects.create(code="F1", name="Заказчик")
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        cls.size = Size.objects.create(name="S")
+        VariantSize.objects.create(variant=cls.variant, size=cls.size)
+        cls.order = SewingOrder.objects.create(customer=firm)
+        cls.item = SewingOrderItem.objects.create(order=cls.order, variant=cls.variant, unit_price=Decimal("10.00"))
+        # позиция без размеров: quantity=1 по умолчанию, в таблице — 0
+        SewingOrderItem.objects.create(order=cls.order, variant=cls.variant, unit_price=Decimal("7.00"))
+
+    def footer(self):
+        ctx = self.client.get(reverse("sewing:order-items-list", args=[self.order.pk])).context
+        return ctx["total_qty"], f"{ctx['total_sum']:.2f}"
+
+    def test_item_sizes_save_matches_footer(self):
+        data = self.client.post(reverse("sewing:order-item-sizes-save", args=[self.item.pk]),
+                                {f"qty_{self.size.pk}": "4"}).json()
+        self.assertEqual((data["order_total_qty"], data["order_total_amount"]), (4, "40.00"))
+        self.assertEqual(self.footer(), (4, "40.00"))
+
+    def test_matrix_save_matches_footer(self):
+        data = self.client.post(reverse("sewing:order-sizes-matrix", args=[self.order.pk]),
+                                {f"qty_{self.item.pk}_{self.size.pk}": "2"}).json()
+        self.assertEqual((data["order_total_qty"], data["order_total_amount"]), self.footer())
+
+
+class PriceWhatIfCommandTests(TestCase):
+    def test_bad_tokens_raise_command_error(self):
+        for args in (["--group", "abc"], ["--group", "abc:5"], ["--material", "1:x"], ["--set", "commission=NaN"]):
+            with self.subTest(args=args), self.assertRaisesMessage(CommandError, args[1]):
+                call_command("price_whatif", *args, stdout=io.StringIO())
+
+
+class ScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        factory = Factory.objects.create(name="Фабрика")
+        department = Department.objects.create(name="Пошив", factory=factory)
+        SewingLine.objects.create(name="Линия 1", factory=factory, department=department, worker_count=2)
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        VariantOperation.objects.create(variant=variant, operation=Operation.objects.create(name="Стачать"), seconds=60)
+        cls.order = SewingOrder.objects.create(customer=Firm.objects.create(code="F1", name="Заказчик"))
+        # 1920 шт. × 60 с = 2 смены линии из 2 человек по 8 ч
+        SewingOrderItem.objects.create(order=cls.order, variant=variant, quantity=1920)
+
+    def test_order_spans_working_days_only(self):
+        schedule = build_schedule(start=date(2026, 10, 24))  # суббота, воскресенье — выходной
+        (assignment,) = schedule.assignments
+        self.assertEqual(assignment.seconds, 1920 * 60)
+        self.assertEqual((assignment.start, assignment.finish), (date(2026, 10, 24), date(2026, 10, 26)))
+
+    def test_command_rejects_out_of_range_parameters(self):
+        for args in (["--efficiency", "0"], ["--efficiency", "201"], ["--hours", "0.0001"], ["--hours", "25"]):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command("schedule_lines", *args, stdout=io.StringIO())
+
+
+class MaterialCostPropagationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="m")
+        cls.material = Material.objects.create(code="MAT-1", title="Ткань", m_unit=mu, planned_cost=10)
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        with cls.captureOnCommitCallbacks(execute=True):  # пересчёт от создания строк — сразу, а не в конце теста
+            cls.line = VariantMaterial.objects.create(variant=cls.variant, material=cls.material,
+                                                      price=Decimal("10.00"), count=Decimal("2.000"), loss=Decimal("0"))
+
+    def test_changed_cost_reprices_lines_and_variant(self):
+        material = Material.objects.get(pk=self.material.pk)
+        material.planned_cost = 12.5
+        with self.captureOnCommitCallbacks(execute=True):
+            material.save()
+        self.line.refresh_from_db()
+        self.assertEqual(self.line.price, Decimal("12.50"))
+        variant = ModelVariant.objects.get(pk=self.variant.pk)
+        self.assertEqual(variant.unit_price, variant.recalc_price())
+
+    def test_saves_without_a_cost_change_do_not_propagate(self):
+        with mock.patch("sewing.signals.propagate_material_costs") as propagate:
+            Material.objects.get(pk=self.material.pk).save()  # цена не менялась
+            Material.objects.only("pk", "title").get(pk=self.material.pk).save()  # цена не загружалась
+            Material.objects.defer("planned_cost").get(pk=self.material.pk).save(update_fields=["title"])
+            material = Material.objects.get(pk=self.material.pk)
+            post_save.send(Material, instance=material, created=False, raw=True, using="default", update_fields=None)
+        propagate.assert_not_called()
+
+    def test_deferred_cost_written_explicitly_propagates(self):
+        material = Material.objects.defer("planned_cost").get(pk=self.material.pk)
+        material.planned_cost = 11
+        with mock.patch("sewing.signals.propagate_material_costs") as propagate:
+            material.save(update_fields=["planned_cost"])
+        propagate.assert_called_once_with([self.material.pk])
+
+
+class PriceHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="m")
+        cls.material = Material.objects.create(code="MAT-1", title="Ткань", m_unit=mu)
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        VariantMaterial.objects.create(variant=cls.variant, material=cls.material, price=Decimal("5.00"),
+                                       count=Decimal("1.000"), loss=Decimal("0"))
+        cls.order = SewingOrder.objects.create(customer=Firm.objects.create(code="F1", name="Заказчик"))
+        SewingOrderItem.objects.create(order=cls.order, variant=cls.variant, unit_price=Decimal("9.00"))
+
+    def test_noop_reprice_adds_no_history(self):
+        reprice_variants(ModelVariant.objects.filter(pk=self.variant.pk))
+        count = VariantPriceHistory.objects.filter(variant=self.variant).count()
+        self.assertEqual(reprice_variants(ModelVariant.objects.filter(pk=self.variant.pk)), 0)
+        self.assertEqual(VariantPriceHistory.objects.filter(variant=self.variant).count(), count)
+
+    def test_order_lines_show_price_on_order_date(self):
+        VariantPriceHistory.objects.all().delete()
+        created = SewingOrder.objects.get(pk=self.order.pk).created_at
+        VariantPriceHistory.record({self.variant.pk: Decimal("7.00")}, valid_from=created - timedelta(days=2))
+        VariantPriceHistory.record({self.variant.pk: Decimal("8.00")}, valid_from=created - timedelta(days=1))
+        VariantPriceHistory.record({self.variant.pk: Decimal("12.00")}, valid_from=timezone.now() + timedelta(days=1))
+        (line,) = order_lines(self.order, prices=True)
+        self.assertEqual(line.order_date_price, Decimal("8.00"))
+
+
+class MRPTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        mu = MeasurementUnit.objects.create(name="kg")
+        cls.fabric = Material.objects.create(code="FAB", title="Ткань", m_unit=mu)
+        cls.button = Material.objects.create(code="BTN", title="Пуговица", m_unit=mu)
+        spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+        variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+        VariantMaterial.objects.create(variant=variant, material=cls.fabric, price=Decimal("4.00"),
+                                       count=Decimal("0.500"), loss=Decimal("10.00"))
+        VariantAccessory.objects.create(variant=variant, accessory=cls.button, price=Decimal("1.00"), count=2)
+        s, m = Size.objects.create(name="S"), Size.objects.create(name="M")
+        firm = Firm.objects.create(code="F1", name="Заказчик")
+
+        cls.order = SewingOrder.objects.create(customer=firm)
+        sized = SewingOrderItem.objects.create(order=cls.order, variant=variant, unit_price=Decimal("1.00"))
+        save_item_sizes(sized, {s.pk: 3, m.pk: 1})
+        SewingOrderItem.objects.create(order=cls.order, variant=variant, quantity=2)  # без размеров
+        other = SewingOrder.objects.create(customer=firm)
+        SewingOrderItem.objects.create(order=other, variant=variant, quantity=100)
+
+    def test_explode_selected_order(self):
+        with self.assertNumQueries(4):
+            result = explode_orders(SewingOrder.objects.filter(pk=self.order.pk))
+        self.assertEqual(result.pieces, 6)
+        (fabric,) = result.materials
+        self.assertEqual((fabric["material_id"], fabric["quantity"], fabric["amount"]),
+                         (self.fabric.pk, Decimal("3.300"), Decimal("13.20")))
+        (button,) = result.accessories
+        self.assertEqual((button["material_id"], button["quantity"], button["amount"]),
+                         (self.button.pk, Decimal("12.000"), Decimal("12.00")))
+        self.assertEqual(result.amount, Decimal("25.20"))
+
+
+@override_settings(SHARED_CACHE=True)  # процесс тестов один — LocMem общий
+class VariantModalCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # всё — с выполнением on_commit: иначе отложенные версии фикстуры поглотят изменения тестов
+        with cls.captureOnCommitCallbacks(execute=True):
+            mu = MeasurementUnit.objects.create(name="m")
+            cls.material = Material.objects.create(code="FAB", title="Ткань", m_unit=mu)
+            spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+            cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+            cls.line = VariantMaterial.objects.create(variant=cls.variant, material=cls.material, price=Decimal("4.00"),
+                                                      count=Decimal("1.000"), loss=Decimal("0"), notes="первая")
+
+    def setUp(self):
+        cache.clear()
+
+    def modal(self):
+        return self.client.get(reverse("sewing:variant-materials", args=[self.variant.pk])).content.decode()
+
+    def test_repeat_is_served_from_cache(self):
+        self.modal()
+        with mock.patch("sewing.views.get_object_or_404") as load:
+            self.assertIn("первая", self.modal())
+        load.assert_not_called()  # контекст не собирался — HTML из кэша
+
+    @override_settings(SHARED_CACHE=None)
+    def test_process_local_cache_renders_every_time(self):
+        self.modal()
+        with mock.patch("sewing.views.get_object_or_404", wraps=get_object_or_404) as load:
+            self.assertIn("первая", self.modal())
+        load.assert_called_once()
+        out = io.StringIO()
+        call_command("fragment_cache_stats", stdout=out)
+        self.assertIn("Кэш фрагментов выключен", out.getvalue())
+
+    def test_row_change_renders_new_html(self):
+        self.assertIn("первая", self.modal())
+        self.line.notes = "вторая"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.line.save()
+        self.assertIn("вторая", self.modal())
+
+    def test_reference_change_renders_new_html(self):
+        self.assertIn("Ткань", self.modal())
+        with self.captureOnCommitCallbacks(execute=True):
+            Material.objects.filter(pk=self.material.pk).update(title="Трикотаж")  # без сигналов
+            self.assertNotIn("Трикотаж", self.modal())
+            Material.objects.get(pk=self.material.pk).save()
+        self.assertIn("Трикотаж", self.modal())
+
+
+@override_settings(SHARED_CACHE=True)  # процесс тестов один — LocMem общий
+class ConditionalListTests(TestCase):
+    """Неизменившийся список позиций заказа — 304 по ETag; любая правка строк — снова 200."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            firm = Firm.objects.create(code="F1", name="Заказчик")
+            spm = SewingProductModel.objects.create(name="Платье", vendor_code="D-1")
+            cls.variant = ModelVariant.objects.create(product_model=spm, name="Синее")
+            cls.sizes = [Size.objects.create(name=name) for name in ("S", "M")]
+            for size in cls.sizes:
+                VariantSize.objects.create(variant=cls.variant, size=size)
+            cls.order = SewingOrder.objects.create(customer=firm)
+            cls.items = [SewingOrderItem.objects.create(order=cls.order, variant=cls.variant, quantity=n)
+                         for n in (1, 2)]
+
+    def get(self, **headers):
+        return self.client.get(reverse("sewing:order-items-list", args=[self.order.pk]), headers=headers)
+
+    def etag(self):
+        self.get()  # первый ответ ставит csrf-cookie, а она входит в ETag
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.etag()
+        with self.assertNumQueries(1):  # только агрегат состояния
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_changed_or_deleted_rows_render_again(self):
+        etag = self.etag()
+        item = self.items[0]
+        item.quantity = 5
+        item.save()
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[1].delete()
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+
+    def assert_renders_again(self, etag, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_size_edits_render_again(self):
+        s, m = self.sizes
+        item = SewingOrderItem.objects.get(pk=self.items[1].pk)
+        save_item_sizes(item, {s.pk: 2, m.pk: 0})
+        etag = self.etag()
+        # перенос между размерами — сумма и число позиций те же
+        etag = self.assert_renders_again(etag, lambda: save_item_sizes(item, {s.pk: 1, m.pk: 1}))
+        etag = self.assert_renders_again(
+            etag, lambda: save_order_sizes(self.order, {item.pk: {s.pk: 0, m.pk: 2}}))
+        # новая позиция (quantity=1 по умолчанию) получает размеры на ту же сумму: в таблице 0 → 1
+        new = SewingOrderItem.objects.create(order=self.order, variant=self.variant)
+        etag = self.etag()
+        self.assert_renders_again(etag, lambda: save_item_sizes(new, {s.pk: 1}))
+
+    @override_settings(SHARED_CACHE=None)
+    def test_process_local_cache_never_answers_304(self):
+        etag = self.etag()
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+
+
+class RouteRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        firm = Firm.objects.create(code="F1", name="Заказчик")
+        cls.orders = [SewingOrder.objects.create(customer=firm) for _ in range(3)]
+
+    def test_object_and_list_urls(self):
+        order = self.orders[0]
+        self.assertEqual(routes.object_url(order, "edit"), reverse("sewing:orders-edit", args=[order.pk]))
+        self.assertEqual(routes.object_url(order, "delete"), "#")
+        self.assertEqual(routes.object_url(SewingOrder(), "edit"), "#")  # без pk
+        self.assertEqual(routes.list_url(Firm), reverse("info:firm-list"))
+        self.assertEqual(routes.list_url(Process), reverse("info:process-list"))
+
+    def test_rows_do_not_reverse(self):
+        routes.object_url(self.orders[0], "edit")  # реестр строится при первом обращении
+        with mock.patch("core.routes.reverse", wraps=reverse) as rev:
+            urls = [routes.object_url(order, "edit") for order in self.orders]
+        rev.assert_not_called()
+        self.assertEqual(urls, [f"/sewing/orders/{order.pk}/edit/" for order in self.orders])
+
+    def test_script_prefix_is_applied_per_call(self):
+        routes.object_url(self.orders[0], "edit")
+        set_script_prefix("/erp/")
+        self.addCleanup(set_script_prefix, "/")
+        self.assertEqual(routes.object_url(self.orders[0], "edit"), f"/erp/sewing/orders/{self.orders[0].pk}/edit/")
+        self.assertEqual(routes.list_url(Firm), reverse("info:firm-list"))  # reverse() тоже с префиксом
+        self.assertTrue(routes.list_url(Firm).startswith("/erp/"))
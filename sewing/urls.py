@@ -51,6 +51,9 @@ urlpatterns = [
     path('orders/', views.SewingOrderListView.as_view(), name='orders-list'),
 
     path("order-create", views.SewingOrderCreateView.as_view(), name="order-create"),
+    path("orders/import/", views.SewingOrderImportView.as_view(), name="order-import"),
+    path("orders/mrp/", views.orders_mrp, name="orders-mrp"),
+    path("orders/schedule/", views.orders_schedule, name="orders-schedule"),
     path("orders/<int:pk>/edit/", views.SewingOrderEditView.as_view(), name="order-edit"),
 
     # AJAX-модалки для строк
@@ -63,5 +66,6 @@ urlpatterns = [
 
     path("order-items/<int:item_id>/sizes/", views.order_item_sizes_modal, name="order-item-sizes"),
     path("order-items/<int:item_id>/sizes/save/", views.order_item_sizes_save, name="order-item-sizes-save"),
+    path("orders/<int:pk>/sizes/", views.order_sizes_matrix, name="order-sizes-matrix"),
 
 ]
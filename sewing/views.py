@@ -1,32 +1,39 @@
 # sewing/views.py
 # helpers (можешь вынести повыше в файл)
 from base64 import b64encode
+from datetime import date
 
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Case, When, IntegerField, Sum, F, DecimalField
-from django.db.models.expressions import ExpressionWrapper
+from django.db.models import Case, When, IntegerField
 # sewing/views.py
-from django.db.models.functions import Coalesce
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
 from django.views import View
 from django.views.decorators.http import require_POST
 from django.views.generic import UpdateView
 
+from core.conditional import conditional_response, queryset_state
+from core.fragments import model_version, object_version, render_cached, touch_objects
 from core.mixins import AjaxMessageMixin
 from core.views import BaseModelListView
-from info.models import UploadedImage, Size
+from info.models import UploadedImage, Size, Material, Color, Operation
 from sewing import models
 from .forms import (
     SewingProductModelForm, ModelVariantForm,
     VariantSizeFormSet, VariantOperationFormSet, VariantAccessoryForm, VariantOperationForm, VariantSizeForm,
-    FillFromVariantForm, OrderItemForm, SewingOrderForm
+    FillFromVariantForm, OrderItemForm, SewingOrderForm, OrderImportForm
 )
 from .forms import VariantMaterialForm
 from .models import ModelVariant, VariantMaterial
 from .models import SewingProductModel
+from .importing import import_order, ImportFormatError
+from .mrp import explode_orders, open_orders
+from .orders import save_item_sizes, save_order_sizes, allowed_sizes, order_lines, order_lines_totals
+from .pricing import mark_variants_dirty
+from .scheduling import build_schedule, schedule_params, SHIFT_SECONDS
 from .utils import make_clone_name
 
 
@@ -101,7 +108,7 @@ class SewingProductModelEditView(View):
     def _group_variants(self, spm):
         """Возвращает сгруппированные и отсортированные варианты."""
         variants_qs = (
-            spm.variants.select_related("work_type")
+            spm.variants.select_related("work_type", "cost_snapshot")  # разбивка цены — тем же запросом
             .prefetch_related("materials", "accessories")
             .order_by(
                 Case(
@@ -320,6 +327,8 @@ class VariantCloneView(View):
                 for va in variant.accessories.all()
             ]
             models.VariantAccessory.objects.bulk_create(accs_to_create)
+            # bulk_create не шлёт сигналы — цену нового варианта пересчитаем явно (on_commit)
+            mark_variants_dirty([new_variant.pk])
 
             # --- размеры ---
             sizes_to_create = [
@@ -345,6 +354,8 @@ class VariantCloneView(View):
                 for o in variant.operations.select_related("operation").all()
             ]
             models.VariantOperation.objects.bulk_create(ops_to_create)
+            # строки созданы bulk_create (без сигналов) — новая версия модалок варианта
+            touch_objects(ModelVariant, [new_variant.pk])
 
         messages.success(request, f"Вариант «{variant.name}» клонирован как «{new_name}».")
         return redirect(
@@ -378,13 +389,19 @@ class ModelsListView(BaseModelListView):
 # ------------------ Variant Materials ----------------- #
 
 class VariantMaterialsListView(View):
+    # модалки списков варианта — из кэша фрагментов, пока не поменялись вариант/его строки/справочники
     def get(self, request, pk):
-        variant = get_object_or_404(ModelVariant, pk=pk)
-        materials = variant.materials.select_related("material", "color")
-        return render(request, "sewing/_modal_variant_materials_list.html", {
-            "variant": variant,
-            "materials": materials,
-        })
+        def context():
+            variant = get_object_or_404(ModelVariant, pk=pk)
+            materials = variant.materials.select_related("material", "color")
+            return {"variant": variant, "materials": materials}
+
+        parts = (pk, object_version(ModelVariant, pk), model_version(Material), model_version(Color))
+        return conditional_response(
+            request, queryset_state(models.VariantMaterial.objects.filter(variant_id=pk)),
+            lambda: render_cached(request, "variant-materials", parts, "sewing/_modal_variant_materials_list.html", context),
+            *parts,
+        )
 
 
 class VariantMaterialCreateView(AjaxMessageMixin, View):
@@ -467,12 +484,17 @@ class VariantMaterialDeleteView(AjaxMessageMixin, View):
 
 class VariantAccessoriesListView(View):
     def get(self, request, pk):
-        variant = get_object_or_404(ModelVariant, pk=pk)
-        accessories = variant.accessories.select_related("accessory").all()
-        return render(request, "sewing/_modal_variant_accessories_list.html", {
-            "variant": variant,
-            "accessories": accessories,
-        })
+        def context():
+            variant = get_object_or_404(ModelVariant, pk=pk)
+            accessories = variant.accessories.select_related("accessory").all()
+            return {"variant": variant, "accessories": accessories}
+
+        parts = (pk, object_version(ModelVariant, pk), model_version(Material))
+        return conditional_response(
+            request, queryset_state(models.VariantAccessory.objects.filter(variant_id=pk)),
+            lambda: render_cached(request, "variant-accessories", parts, "sewing/_modal_variant_accessories_list.html", context),
+            *parts,
+        )
 
 
 class VariantAccessoryCreateView(AjaxMessageMixin, View):
@@ -554,16 +576,20 @@ class VariantAccessoryDeleteView(AjaxMessageMixin, View):
 
 class VariantOperationsListView(View):
     def get(self, request, pk):
-        variant = get_object_or_404(ModelVariant, pk=pk)
-        operations = (
-            variant.operations
-            .select_related("operation")  # справочник info.Operation
-            .all()
-        )
-        return render(
-            request,
-            "sewing/_modal_variant_operations_list.html",
-            {"variant": variant, "operations": operations},
+        def context():
+            variant = get_object_or_404(ModelVariant, pk=pk)
+            operations = (
+                variant.operations
+                .select_related("operation")  # справочник info.Operation
+                .all()
+            )
+            return {"variant": variant, "operations": operations}
+
+        parts = (pk, object_version(ModelVariant, pk), model_version(Operation))
+        return conditional_response(
+            request, queryset_state(models.VariantOperation.objects.filter(variant_id=pk)),
+            lambda: render_cached(request, "variant-operations", parts, "sewing/_modal_variant_operations_list.html", context),
+            *parts,
         )
 
 
@@ -646,12 +672,17 @@ class VariantSizesListView(View):
     """Список размеров (для первой модалки)"""
 
     def get(self, request, pk):
-        variant = get_object_or_404(ModelVariant, pk=pk)
-        sizes = variant.sizes.select_related("size").all()
-        return render(request, "sewing/_modal_variant_sizes_list.html", {
-            "variant": variant,
-            "sizes": sizes,
-        })
+        def context():
+            variant = get_object_or_404(ModelVariant, pk=pk)
+            sizes = variant.sizes.select_related("size").all()
+            return {"variant": variant, "sizes": sizes}
+
+        parts = (pk, object_version(ModelVariant, pk), model_version(Size))
+        return conditional_response(
+            request, queryset_state(models.VariantSize.objects.filter(variant_id=pk)),
+            lambda: render_cached(request, "variant-sizes", parts, "sewing/_modal_variant_sizes_list.html", context),
+            *parts,
+        )
 
 
 # views.py
@@ -759,19 +790,22 @@ class VariantFillFromView(View):
         # ---- ACCESSORIES ----
         if self.kind == "accessories":
             if replace:
-                models.VariantAccessory.objects.filter(variant=target).delete()
-                objs = [
-                    models.VariantAccessory(
-                        variant=target,
-                        accessory=a.accessory,
-                        count=a.count,
-                        price=a.price,
-                        notes=a.notes,
-                        local_produce=a.local_produce,
-                    )
-                    for a in src.accessories.all()
-                ]
-                created = models.VariantAccessory.objects.bulk_create(objs)
+                with transaction.atomic():
+                    models.VariantAccessory.objects.filter(variant=target).delete()
+                    objs = [
+                        models.VariantAccessory(
+                            variant=target,
+                            accessory=a.accessory,
+                            count=a.count,
+                            price=a.price,
+                            notes=a.notes,
+                            local_produce=a.local_produce,
+                        )
+                        for a in src.accessories.all()
+                    ]
+                    created = models.VariantAccessory.objects.bulk_create(objs)
+                    mark_variants_dirty([target.pk])
+                    touch_objects(ModelVariant, [target.pk])
                 resp = HttpResponse(status=204)
                 return _msg_headers(resp, f"Скопировано аксессуаров: {len(created)}.", "success")
 
@@ -796,6 +830,9 @@ class VariantFillFromView(View):
                 ))
             created = models.VariantAccessory.objects.bulk_create(to_create)
             created_n = len(created)
+            if created_n:
+                mark_variants_dirty([target.pk])
+                touch_objects(ModelVariant, [target.pk])
 
             if created_n == 0 and skipped > 0:
                 # всё оказалось дубликатами
@@ -823,6 +860,7 @@ class VariantFillFromView(View):
                     for o in src.operations.select_related("operation").all()
                 ]
                 created = models.VariantOperation.objects.bulk_create(objs)
+                touch_objects(ModelVariant, [target.pk])
                 resp = HttpResponse(status=204)
                 return _msg_headers(resp, f"Скопировано операций: {len(created)}.", "success")
 
@@ -846,6 +884,8 @@ class VariantFillFromView(View):
                 ))
             created = models.VariantOperation.objects.bulk_create(to_create)
             created_n = len(created)
+            if created_n:
+                touch_objects(ModelVariant, [target.pk])
 
             if created_n == 0 and skipped > 0:
                 resp = HttpResponse(status=409)
@@ -874,6 +914,8 @@ class SewingOrderListView(BaseModelListView):
     fk_filters = ("customer", "buyer", "order_type", "shipment_date", "status")
     order_by = ("-id",)
     order_by_map = {}
+    keyset_pagination = True
+    export_map = {"manager": "created_by__username"}
 
     create_url_name = "sewing:order-create"
 
@@ -912,29 +954,80 @@ class SewingOrderCreateView(View):
         return redirect(reverse("sewing:orders-edit", args=[order.pk]))
 
 
+class SewingOrderImportView(View):
+    """Заказ из файла клиента: реквизиты заказа + CSV/XLSX со строками и размерами."""
+    template_name = "sewing/order_import.html"
+
+    def get(self, request):
+        return render(request, self.template_name, {
+            "form_order": SewingOrderForm(prefix="order"),
+            "form_file": OrderImportForm(prefix="import"),
+        })
+
+    def post(self, request):
+        form_order = SewingOrderForm(request.POST, prefix="order")
+        form_file = OrderImportForm(request.POST, request.FILES, prefix="import")
+        ctx = {"form_order": form_order, "form_file": form_file}
+        if not (form_order.is_valid() and form_file.is_valid()):
+            messages.error(request, "Проверьте поля формы.")
+            return render(request, self.template_name, ctx)
+
+        order_fields = {name: form_order.cleaned_data[name] for name in SewingOrderForm.Meta.fields}
+        order_fields["created_by"] = request.user if request.user.is_authenticated else None
+        upload = form_file.cleaned_data["file"]
+        try:
+            report = import_order(upload.file, upload.name, order_fields,
+                                  dry_run=form_file.cleaned_data["dry_run"])
+        except ImportFormatError as e:
+            messages.error(request, str(e))
+            return render(request, self.template_name, ctx)
+
+        if report.ok and not report.dry_run:
+            messages.success(request, f"Заказ импортирован: позиций {report.items}, штук {report.pieces}.")
+            return redirect(reverse("sewing:orders-edit", args=[report.order.pk]))
+        ctx["report"] = report
+        return render(request, self.template_name, ctx)
+
+
+def orders_mrp(request):
+    """Потребность в материалах: ?order=1&order=2 — по выбранным заказам, без параметров — по всем открытым."""
+    try:
+        order_ids = [int(x) for x in request.GET.getlist("order") if x.strip()]
+    except ValueError:
+        return HttpResponseBadRequest("order должен быть числом")
+
+    orders = models.SewingOrder.objects.filter(pk__in=order_ids) if order_ids else open_orders()
+    return render(request, "sewing/orders_mrp.html", {
+        "orders": orders.select_related("customer").order_by("pk"),
+        "selected": bool(order_ids),
+        "mrp": explode_orders(orders),
+    })
+
+
+def orders_schedule(request):
+    """План пошива открытых заказов по активным линиям: ?start=ГГГГ-ММ-ДД&hours=8&efficiency=85."""
+    try:
+        start = date.fromisoformat(request.GET["start"]) if request.GET.get("start") else date.today()
+        hours = float(request.GET.get("hours") or SHIFT_SECONDS / 3600)
+        efficiency = int(request.GET.get("efficiency") or 100)
+        shift_seconds, factor = schedule_params(hours, efficiency)
+    except ValueError:
+        return HttpResponseBadRequest("Некорректные параметры плана")
+
+    schedule = build_schedule(start=start, shift_seconds=shift_seconds, efficiency=factor)
+    return render(request, "sewing/orders_schedule.html", {
+        "schedule": schedule,
+        "lines": list(schedule.line_summary()),
+        "params": {"start": start, "hours": hours, "efficiency": efficiency},
+    })
+
+
 class SewingOrderEditView(UpdateView):
     model = models.SewingOrder
     form_class = SewingOrderForm
     template_name = "sewing/order_edit.html"
     context_object_name = "order"
 
-    def _items_qs(self, order):
-        # qty = сумма по связанным размерам; line_total = qty * unit_price
-        return (
-            order.items
-            .select_related("variant", "variant__product_model")
-            .annotate(
-                qty=Coalesce(Sum("size_counts__quantity"), 0, output_field=IntegerField()),
-            )
-            .annotate(
-                line_total=ExpressionWrapper(
-                    F("qty") * F("unit_price"),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
-            .order_by("variant__product_model__vendor_code", "variant__name", "id")
-        )
-
     def get_success_url(self):
         # остаёмся на этой же странице редактирования
         return reverse("sewing:orders-edit", args=[self.object.pk])
@@ -942,16 +1035,10 @@ class SewingOrderEditView(UpdateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         o = self.object
-        items_qs = self._items_qs(o)
-
-        totals = items_qs.aggregate(
-            total_qty=Coalesce(Sum("qty"), 0, output_field=IntegerField()),
-            total_sum=Coalesce(Sum("line_total"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-        )
-
-        ctx["order_items"] = items_qs
-        ctx["total_qty"] = totals["total_qty"]
-        ctx["total_sum"] = totals["total_sum"]
+        # qty = сумма по связанным размерам; line_total = qty * unit_price
+        # актуальная цена и цена на дату заказа — тем же запросом, без N+1
+        ctx["order_items"] = order_lines(o, prices=True)
+        ctx["total_qty"], ctx["total_sum"] = order_lines_totals(o)
         # URL для AJAX-перерисовки таблицы:
         ctx["items_partial_url"] = reverse("sewing:order-items-list", args=[o.pk])
         return ctx
@@ -961,25 +1048,23 @@ class SewingOrderEditView(UpdateView):
 
 
 def order_items_partial(request, pk):
-    order = get_object_or_404(models.SewingOrder, pk=pk)
-    items = (
-        order.items
-        .select_related("variant", "variant__product_model")
-        .annotate(qty=Coalesce(Sum("size_counts__quantity"), 0, output_field=IntegerField()))
-        .annotate(line_total=ExpressionWrapper(F("qty") * F("unit_price"),
-                                               output_field=DecimalField(max_digits=12, decimal_places=2)))
-        .order_by("variant__product_model__vendor_code", "variant__name", "id")
-    )
-    totals = items.aggregate(
-        total_qty=Coalesce(Sum("qty"), 0, output_field=IntegerField()),
-        total_sum=Coalesce(Sum("line_total"), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
-    )
-    return render(request, "sewing/_order_items_list.html", {
-        "order": order,
-        "items": items,
-        "total_qty": totals["total_qty"],
-        "total_sum": totals["total_sum"],
-    })
+    # после каждого AJAX-действия список перезапрашивается: неизменившийся — 304 по одному агрегату.
+    # Позиции показывают вариант/модель и живую цену (строки и материалы) — их версии тоже в ETag
+    versions = tuple(model_version(m) for m in (ModelVariant, SewingProductModel, VariantMaterial,
+                                                  models.VariantAccessory, Material))
+
+    def render_items():
+        order = get_object_or_404(models.SewingOrder, pk=pk)
+        total_qty, total_sum = order_lines_totals(order)
+        return render(request, "sewing/_order_items_list.html", {
+            "order": order,
+            "items": order_lines(order, prices=True),
+            "total_qty": total_qty,
+            "total_sum": total_sum,
+        })
+
+    state = queryset_state(models.SewingOrderItem.objects.filter(order_id=pk))
+    return conditional_response(request, state, render_items, pk, *versions)
 
 
 def order_item_form(request, pk=None, item_id=None):
@@ -1056,34 +1141,85 @@ def order_item_sizes_save(request, item_id):
     if request.method != "POST":
         return HttpResponseBadRequest("Only POST")
 
-    item = get_object_or_404(models.SewingOrderItem.objects.select_related("variant"), pk=item_id)
-    var_sizes = _variant_sizes_qs(item.variant)
+    item = get_object_or_404(models.SewingOrderItem.objects.select_related("variant", "order"), pk=item_id)
 
-    # Пройдёмся по всем допустимым размерам и снимем значения из POST
-    kept_any = False
-    for vs in var_sizes:
+    # снимаем значения из POST по всем допустимым размерам варианта
+    quantities = {}
+    for vs in _variant_sizes_qs(item.variant):
         size = getattr(vs, "size", vs)  # vs может быть Size, если VariantSize нет
         raw = request.POST.get(f"qty_{size.id}", "").strip()
         try:
-            qty = int(raw or "0")
+            quantities[size.id] = int(raw or "0")
         except ValueError:
-            qty = 0
+            quantities[size.id] = 0
+
+    # один upsert + один delete; item.quantity и итоги заказа обновляются там же
+    qty = save_item_sizes(item, quantities)
+    # итоги заказа — те же, что в подвале таблицы позиций (order_lines_totals)
+    total_qty, total_sum = order_lines_totals(item.order)
+
+    # новые итоги строки и заказа — фронту не нужен повторный рендер списка
+    return JsonResponse({
+        "item_id": item.pk,
+        "line_qty": qty,
+        "line_total": f"{item.unit_price * qty:.2f}",
+        "order_total_qty": total_qty,
+        "order_total_amount": f"{total_sum:.2f}",
+    })
 
-        obj, _created = models.SewingOrderSizeCount.objects.get_or_create(item=item, size=size)
-        if qty > 0:
-            obj.quantity = qty
-            obj.save(update_fields=["quantity"])
-            kept_any = True
-        else:
-            # нули не храним — удаляем (если был)
-            if obj.pk:
-                obj.delete()
-
-    # (опционально) можно суммировать qty по размерам и синхронизировать item.quantity
-    # total = item.size_counts.aggregate(s=Sum('quantity'))['s'] or 0
-    # if total:
-    #     item.quantity = total
-    #     item.save(update_fields=['quantity'])
-
-    # ответ для твоего fetch: просто успешно
-    return HttpResponse(status=204)
+
+def order_sizes_matrix(request, pk):
+    """
+    Сетка «позиция × размер» всего заказа: GET — модалка, POST — сохранить всё одним запросом.
+    Поля формы: qty_<item_id>_<size_id>. Ответ POST — JSON с итогами строк и заказа.
+    """
+    order = get_object_or_404(models.SewingOrder, pk=pk)
+    if request.method == "POST":
+        return _order_sizes_matrix_save(request, order)
+
+    items = list(order.items.select_related("variant", "variant__product_model")
+                 .order_by("variant__product_model__vendor_code", "variant__name", "id"))
+    allowed = allowed_sizes({it.variant_id for it in items})
+    sizes = list(Size.objects.filter(pk__in={s for ids in allowed.values() for s in ids}).order_by("name"))
+    existing = {
+        (item_id, size_id): qty for item_id, size_id, qty in models.SewingOrderSizeCount.objects
+        .filter(item__order=order).values_list("item_id", "size_id", "quantity")
+    }
+    rows = [
+        (it, [(s, s.id in allowed.get(it.variant_id, ()), existing.get((it.pk, s.id), 0)) for s in sizes])
+        for it in items
+    ]
+    return render(request, "sewing/_modal_order_sizes_matrix.html", {
+        "order": order,
+        "sizes": sizes,
+        "rows": rows,
+    })
+
+
+@transaction.atomic
+def _order_sizes_matrix_save(request, order):
+    matrix = {}
+    for key, raw in request.POST.items():
+        if not key.startswith("qty_"):
+            continue
+        try:
+            item_id, size_id = (int(x) for x in key[4:].split("_", 1))
+            qty = int(raw.strip() or "0")
+        except ValueError:
+            return JsonResponse({"errors": [f"Некорректное значение поля {key}."]}, status=400)
+        matrix.setdefault(item_id, {})[size_id] = qty
+
+    try:
+        items = save_order_sizes(order, matrix)
+    except ValidationError as e:
+        return JsonResponse({"errors": e.messages}, status=400)
+
+    total_qty, total_sum = order_lines_totals(order)
+    return JsonResponse({
+        "lines": [
+            {"item_id": it.pk, "line_qty": it.quantity, "line_total": f"{it.unit_price * it.quantity:.2f}"}
+            for it in items.values()
+        ],
+        "order_total_qty": total_qty,
+        "order_total_amount": f"{total_sum:.2f}",
+    })
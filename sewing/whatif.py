@@ -0,0 +1,205 @@
+# sewing/whatif.py
+"""
+Векторный what-if расчёт цен: «что будет, если пряжа подорожает на 8%, а комиссия станет 3%?».
+Все строки материалов/аксессуаров грузятся один раз в колонки NumPy, сценарии считаются
+операциями над массивами. Формула и округление (ROUND_HALF_UP до копейки) — как в recalc_price.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+
+from .models import ModelVariant, VariantMaterial, VariantAccessory, D, calc_unit_price
+
+OVERHEAD_FIELDS = ("cutting_price", "transfer_price", "print_price", "embroidery_price")
+MARKUP_FIELDS = ("sewing_loss_percent", "other_expenses_percent", "profitability", "commission")
+PERCENT_FIELDS = MARKUP_FIELDS + ("discount",)
+
+HUNDRED = D("100")
+
+
+def _dec_array(values):
+    return np.array([D(v or 0) for v in values], dtype=object)
+
+
+def _money(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _lookup(keys, mapping, default):
+    """Векторный dict.get: для каждого ключа из keys — mapping[key] или default."""
+    out = np.full(len(keys), default, dtype=np.float64)
+    if not mapping:
+        return out
+    mk = np.array(sorted(mapping), dtype=np.int64)
+    mv = np.array([float(mapping[k]) for k in mk], dtype=np.float64)
+    pos = np.clip(np.searchsorted(mk, keys), 0, len(mk) - 1)
+    hit = mk[pos] == keys
+    out[hit] = mv[pos[hit]]
+    return out
+
+
+@dataclass
+class WhatIfResult:
+    variant_ids: np.ndarray  # id вариантов
+    stored: np.ndarray  # текущий unit_price из БД, копейки
+    baseline: np.ndarray  # пересчёт по текущим данным, копейки
+    simulated: np.ndarray  # пересчёт по сценарию, копейки
+
+    @property
+    def delta(self) -> np.ndarray:
+        return self.simulated - self.baseline
+
+    def rows(self):
+        """(variant_id, базовая цена, цена по сценарию, разница) — в Decimal."""
+        for vid, base, new in zip(self.variant_ids.tolist(), self.baseline.tolist(), self.simulated.tolist()):
+            yield vid, _money(base), _money(new), _money(new - base)
+
+    def summary(self) -> dict:
+        delta = self.delta
+        return {
+            "variants": int(len(self.variant_ids)),
+            "changed": int(np.count_nonzero(delta)),
+            "baseline_total": _money(self.baseline.sum()),
+            "simulated_total": _money(self.simulated.sum()),
+            "delta_total": _money(delta.sum()),
+        }
+
+
+class CostingFrame:
+    """
+    Колоночный снимок вариантов и их строк. Загружается тремя запросами, дальше — только NumPy.
+    Для каждой колонки держим float64 (быстрый путь) и Decimal (точный пересчёт спорных округлений).
+    """
+
+    def __init__(self, queryset=None):
+        variants = (queryset if queryset is not None else ModelVariant.objects.all()).order_by("pk")
+        spm_fields = [f"product_model__{f}" for f in OVERHEAD_FIELDS + PERCENT_FIELDS]
+        rows = list(variants.values_list("pk", "unit_price", *spm_fields))
+
+        self.variant_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.stored = np.array([int(D(r[1]) * HUNDRED) for r in rows], dtype=np.int64)
+        self.overhead_d = np.array([sum((D(x) for x in r[2:6]), D("0")) for r in rows], dtype=object)
+        self.overhead = self.overhead_d.astype(np.float64)
+        self.percents_d = {f: _dec_array(r[6 + i] for r in rows) for i, f in enumerate(PERCENT_FIELDS)}
+        self.percents = {f: arr.astype(np.float64) for f, arr in self.percents_d.items()}
+
+        lines = (VariantMaterial.objects
+                 .filter(variant__in=variants.values("pk"))
+                 .order_by("variant_id")
+                 .values_list("variant_id", "material_id", "material__group_id", "price", "count", "loss"))
+        self.mat = self._columns(lines, ("variant", "material", "group", "price", "count", "loss"))
+
+        lines = (VariantAccessory.objects
+                 .filter(variant__in=variants.values("pk"))
+                 .order_by("variant_id")
+                 .values_list("variant_id", "accessory_id", "accessory__group_id", "price", "count"))
+        self.acc = self._columns(lines, ("variant", "material", "group", "price", "count"))
+
+    def __len__(self):
+        return len(self.variant_ids)
+
+    def _columns(self, lines, names):
+        cols = list(zip(*lines)) or [()] * len(names)
+        data = dict(zip(names, cols))
+        out = {
+            "idx": np.searchsorted(self.variant_ids, np.array(data["variant"], dtype=np.int64)),
+            "material": np.array(data["material"], dtype=np.int64),
+            "group": np.array([g or -1 for g in data["group"]], dtype=np.int64),
+        }
+        for name in ("price", "count", "loss"):
+            if name in data:
+                out[name + "_d"] = _dec_array(data[name])
+                out[name] = out[name + "_d"].astype(np.float64)
+        return out
+
+    # ---------------- сценарий ----------------
+
+    def simulate(self, *, material_pct=None, group_pct=None, material_prices=None, percents=None) -> WhatIfResult:
+        """
+        material_pct   — {material_id: +-% к цене строки}, группы и материалы перемножаются
+        group_pct      — {material_group_id: +-%}
+        material_prices — {material_id: новая цена}, перекрывает цену строки до применения %
+        percents       — {"commission": 3, ...}: новые проценты модели для всех вариантов
+        """
+        scenario = {
+            "material_pct": {k: D(v) for k, v in (material_pct or {}).items()},
+            "group_pct": {k: D(v) for k, v in (group_pct or {}).items()},
+            "material_prices": {k: D(v) for k, v in (material_prices or {}).items()},
+            "percents": {k: D(v) for k, v in (percents or {}).items()},
+        }
+        unknown = set(scenario["percents"]) - set(PERCENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Неизвестные проценты: {', '.join(sorted(unknown))}")
+
+        return WhatIfResult(
+            variant_ids=self.variant_ids,
+            stored=self.stored,
+            baseline=self._price_cents({}),
+            simulated=self._price_cents(scenario),
+        )
+
+    def _line_factors(self, cols, scenario):
+        price = cols["price"].copy()
+        if scenario.get("material_prices"):
+            new_price = _lookup(cols["material"], scenario["material_prices"], np.nan)
+            price = np.where(np.isnan(new_price), price, new_price)
+        factor = np.ones(len(price))
+        if scenario.get("group_pct"):
+            factor *= 1 + _lookup(cols["group"], scenario["group_pct"], 0) / 100
+        if scenario.get("material_pct"):
+            factor *= 1 + _lookup(cols["material"], scenario["material_pct"], 0) / 100
+        return price * factor
+
+    def _price_cents(self, scenario) -> np.ndarray:
+        n = len(self)
+        mat = self._line_factors(self.mat, scenario) * self.mat["count"] * (1 + self.mat["loss"] / 100)
+        acc = self._line_factors(self.acc, scenario) * self.acc["count"]
+        base = (np.bincount(self.mat["idx"], weights=mat, minlength=n)
+                + np.bincount(self.acc["idx"], weights=acc, minlength=n)
+                + self.overhead)
+
+        overrides = scenario.get("percents", {})
+        markup = sum(np.full(n, float(overrides[f])) if f in overrides else self.percents[f] for f in MARKUP_FIELDS)
+        discount = np.full(n, float(overrides["discount"])) if "discount" in overrides else self.percents["discount"]
+
+        total = base * (1 + markup / 100)
+        total -= total * (discount / 100)
+
+        # ROUND_HALF_UP: от нуля на половине копейки
+        scaled = np.abs(total) * 100
+        cents = np.floor(scaled + 0.5)
+        # Спорные (почти ровно полкопейки) — пересчитываем точно в Decimal, как recalc_price
+        frac = scaled - np.floor(scaled)
+        doubtful = np.flatnonzero(np.abs(frac - 0.5) < np.maximum(1e-7, scaled * 1e-11))
+        cents = (np.sign(total) * cents).astype(np.int64)
+        for i in doubtful:
+            cents[i] = int(self._exact_price(int(i), scenario) * HUNDRED)
+        return cents
+
+    def _exact_price(self, i, scenario) -> Decimal:
+        """Точный пересчёт одного варианта в Decimal через общую формулу calc_unit_price."""
+        mat_total = sum((self._exact_line(self.mat, j, scenario) * (D("1") + self.mat["loss_d"][j] / HUNDRED)
+                         for j in self._line_range(self.mat, i)), D("0"))
+        acc_total = sum((self._exact_line(self.acc, j, scenario) for j in self._line_range(self.acc, i)), D("0"))
+        overrides = scenario.get("percents", {})
+        spm = SimpleNamespace(
+            **{f: D("0") for f in OVERHEAD_FIELDS},
+            **{f: overrides.get(f, self.percents_d[f][i]) for f in PERCENT_FIELDS},
+        )
+        spm.cutting_price = self.overhead_d[i]
+        return calc_unit_price(spm, mat_total, acc_total)
+
+    @staticmethod
+    def _line_range(cols, i):
+        # строки отсортированы по варианту — диапазон ищем бинарным поиском
+        return range(np.searchsorted(cols["idx"], i, "left"), np.searchsorted(cols["idx"], i, "right"))
+
+    @staticmethod
+    def _exact_line(cols, j, scenario) -> Decimal:
+        material, group = int(cols["material"][j]), int(cols["group"][j])
+        price = scenario.get("material_prices", {}).get(material, cols["price_d"][j])
+        price *= D("1") + scenario.get("group_pct", {}).get(group, D("0")) / HUNDRED
+        price *= D("1") + scenario.get("material_pct", {}).get(material, D("0")) / HUNDRED
+        return price * cols["count_d"][j]